@@ -34,16 +34,13 @@ for sid in sids:
     n = numpy.empty(nsteps)
     coordinationnumber = numpy.empty(nsteps)
     nkept = numpy.empty(nsteps)
+    history = sphere.ContactHistory()
 
     for i in numpy.arange(nsteps):
         sim.readstep(i+1)
         t[i] = sim.currentTime()
         #n[i] = countLoadedContacts(sim, threshold)
 
-        if i > 0:
-            loaded_contacts_prev = numpy.copy(loaded_contacts)
-            pairs_prev = numpy.copy(sim.pairs)
-
         loaded_contacts = sim.findLoadedContacts(
                 threshold = sim.currentNormalStress()*2.)
                 #sim.currentNormalStress()/1000.)
@@ -52,12 +49,8 @@ for sid in sids:
         sim.findCoordinationNumber()
         coordinationnumber[i] = sim.findMeanCoordinationNumber()
 
-        nfound = 0
-        if i > 0:
-            for a in loaded_contacts[0]:
-                for b in loaded_contacts_prev[0]:
-                    if (sim.pairs[:,a] == pairs_prev[:,b]).all():
-                        nfound += 1;
+        history.update(sim.pairs[:,loaded_contacts[0]], i+1)
+        nfound = history.ncontacts[-1] - history.nbirths[-1]
 
         nkept[i] = nfound
 
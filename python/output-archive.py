@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+'''
+Pack the output files of a simulation into a compressed archive, or restore
+them from the archive, see :class:`sphere.OutputArchive`.
+
+Usage: python output-archive.py pack <sid> [zlib|lzma] [--remove]
+       python output-archive.py unpack <sid> [step ...]
+'''
+import sys
+import sphere
+
+if len(sys.argv) < 3 or sys.argv[1] not in ['pack', 'unpack']:
+    print(__doc__)
+    sys.exit(1)
+
+sid = sys.argv[2]
+if sys.argv[1] == 'pack':
+    arguments = sys.argv[3:]
+    remove = '--remove' in arguments
+    if remove:
+        arguments.remove('--remove')
+    compression = 'zlib'
+    if len(arguments) > 0:
+        compression = arguments[0]
+    archive = sphere.OutputArchive(sid, compression=compression)
+    added = archive.pack(remove=remove)
+    print('{0} output files added to {1}'.format(added, archive.archivefile))
+else:
+    steps = None
+    if len(sys.argv) > 3:
+        steps = [int(step) for step in sys.argv[3:]]
+    sphere.OutputArchive(sid).unpack(steps)
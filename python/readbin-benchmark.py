@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+'''
+Benchmark of the binary reader in :func:`sphere.sim.readbin()`.
+
+Synthetic binary files are written in the layout of a range of ``sphere`` file
+versions, for a dry granular simulation and for simulations with the
+Navier-Stokes and Darcy fluid solvers. Each file is read with the bulk reader
+in ``sphere.py`` and with a copy of the previous per-element reader, the
+resulting arrays are checked for equality, and the read times are reported.
+
+Usage: python readbin-benchmark.py [np] [nx] [repetitions]
+'''
+import os
+import sys
+import time
+import tempfile
+import numpy
+import sphere
+from sphere import VERSION
+
+def readbin_legacy(self, targetbin, verbose = True, bonds = True, sigma0mod = True,
+        esysparticle = False):
+    '''
+    Reference copy of the per-element reader that preceded the bulk reader in
+    :func:`sphere.sim.readbin()`. Only used for comparison.
+    '''
+
+    fh = None
+    try:
+        if verbose:
+            print("Input file: {0}".format(targetbin))
+        fh = open(targetbin, "rb")
+
+        # Read the file version
+        self.version = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+        # Read the number of dimensions and particles
+        self.nd = numpy.fromfile(fh, dtype=numpy.int32, count=1)
+        self.np = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+
+        # Read the time variables
+        self.time_dt = \
+                numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.time_current =\
+                numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.time_total =\
+                numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.time_file_dt =\
+                numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.time_step_count =\
+                numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+
+        # Allocate array memory for particles
+        self.x       = numpy.empty((self.np[0], self.nd[0]), dtype=numpy.float64)
+        self.radius  = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.xyzsum  = numpy.empty((self.np[0], 3), dtype=numpy.float64)
+        self.vel     = numpy.empty((self.np[0], self.nd[0]), dtype=numpy.float64)
+        self.fixvel  = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.es_dot  = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.es      = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.ev_dot  = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.ev      = numpy.empty(self.np[0], dtype=numpy.float64)
+        self.p       = numpy.empty(self.np[0], dtype=numpy.float64)
+
+        # Read remaining data from binary
+        self.origo = numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+        self.L = numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+        self.num = numpy.fromfile(fh, dtype=numpy.uint32, count=self.nd[0])
+        self.periodic = numpy.fromfile(fh, dtype=numpy.int32, count=1)
+
+        if self.version >= 2.14:
+            self.adaptive = numpy.fromfile(fh, dtype=numpy.int32, count=1)
+        else:
+            self.adaptive = numpy.zeros(1, dtype=numpy.float64)
+
+        # Per-particle vectors
+        for i in numpy.arange(self.np):
+            self.x[i,:] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+            self.radius[i] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+        if self.version >= 1.03:
+            self.xyzsum = numpy.fromfile(fh, dtype=numpy.float64,\
+                    count=int(self.np[0])*3).reshape(self.np[0],3)
+        else:
+            self.xyzsum = numpy.fromfile(fh, dtype=numpy.float64,\
+                    count=int(self.np[0])*2).reshape(self.np[0],2)
+
+        for i in numpy.arange(self.np):
+            self.vel[i,:] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+            self.fixvel[i] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+        self.force = numpy.fromfile(fh, dtype=numpy.float64,\
+                count=int(self.np[0])*int(self.nd[0])).reshape(self.np[0], self.nd[0])
+
+        self.angpos = numpy.fromfile(fh, dtype=numpy.float64,\
+                count=int(self.np[0])*int(self.nd[0])).reshape(self.np[0], self.nd[0])
+        self.angvel = numpy.fromfile(fh, dtype=numpy.float64,\
+                count=int(self.np[0])*int(self.nd[0])).reshape(self.np[0], self.nd[0])
+        self.torque = numpy.fromfile(fh, dtype=numpy.float64,\
+                count=int(self.np[0])*int(self.nd[0])).reshape(self.np[0], self.nd[0])
+
+        if esysparticle:
+            return
+
+        # Per-particle single-value parameters
+        self.es_dot = numpy.fromfile(fh, dtype=numpy.float64, count=int(self.np[0]))
+        self.es     = numpy.fromfile(fh, dtype=numpy.float64, count=int(self.np[0]))
+        self.ev_dot = numpy.fromfile(fh, dtype=numpy.float64, count=int(self.np[0]))
+        self.ev     = numpy.fromfile(fh, dtype=numpy.float64, count=int(self.np[0]))
+        self.p      = numpy.fromfile(fh, dtype=numpy.float64, count=int(self.np[0]))
+
+        # Constant, global physical parameters
+        self.g      = numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+        self.k_n          = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.k_t          = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.k_r          = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        if self.version >= 2.13:
+            self.E = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        else:
+            self.E = numpy.zeros(1, dtype=numpy.float64)
+        self.gamma_n      = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.gamma_t      = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.gamma_r      = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.mu_s         = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.mu_d         = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.mu_r         = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.gamma_wn     = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.gamma_wt     = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.mu_ws        = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.mu_wd        = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.rho          = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.contactmodel = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+        self.kappa        = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.db           = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        self.V_b          = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+        # Wall data
+        self.nw      = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+        self.wmode   = numpy.empty(self.nw[0], dtype=numpy.int32)
+        self.w_n     = numpy.empty(int(self.nw[0])*int(self.nd[0]), dtype=numpy.float64)\
+                .reshape(self.nw[0],self.nd[0])
+        self.w_x     = numpy.empty(self.nw[0], dtype=numpy.float64)
+        self.w_m     = numpy.empty(self.nw[0], dtype=numpy.float64)
+        self.w_vel   = numpy.empty(self.nw[0], dtype=numpy.float64)
+        self.w_force = numpy.empty(self.nw[0], dtype=numpy.float64)
+        self.w_sigma0  = numpy.empty(self.nw[0], dtype=numpy.float64)
+
+        self.wmode   = numpy.fromfile(fh, dtype=numpy.int32, count=self.nw[0])
+        for i in numpy.arange(self.nw[0]):
+            self.w_n[i,:] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
+            self.w_x[i]   = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        for i in numpy.arange(self.nw[0]):
+            self.w_m[i]   = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.w_vel[i] = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.w_force[i] =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.w_sigma0[i]= numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        if sigma0mod:
+            self.w_sigma0_A = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.w_sigma0_f = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        if self.version >= 2.1:
+            self.w_tau_x = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+        else:
+            self.w_tau_x = numpy.zeros(1, dtype=numpy.float64)
+
+        if bonds:
+            # Inter-particle bonds
+            self.lambda_bar =\
+                    numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.nb0 = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+            self.sigma_b = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.tau_b = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            self.bonds = numpy.empty((self.nb0[0], 2), dtype=numpy.uint32)
+            for i in numpy.arange(self.nb0[0]):
+                self.bonds[i,0] = numpy.fromfile(fh, dtype=numpy.uint32,
+                        count=1)
+                self.bonds[i,1] = numpy.fromfile(fh, dtype=numpy.uint32,
+                        count=1)
+            self.bonds_delta_n = numpy.fromfile(fh, dtype=numpy.float64,
+                    count=self.nb0[0])
+            self.bonds_delta_t = numpy.fromfile(fh, dtype=numpy.float64,
+                    count=int(self.nb0[0])*int(self.nd[0])).reshape(self.nb0[0], self.nd[0])
+            self.bonds_omega_n = numpy.fromfile(fh, dtype=numpy.float64,
+                    count=self.nb0[0])
+            self.bonds_omega_t = numpy.fromfile(fh, dtype=numpy.float64,
+                    count=int(self.nb0[0])*int(self.nd[0])).reshape(self.nb0[0], self.nd[0])
+        else:
+            self.nb0 = numpy.zeros(1, dtype=numpy.uint32)
+
+        if self.fluid:
+
+            if self.version >= 2.0:
+                self.cfd_solver = numpy.fromfile(fh, dtype=numpy.int32,
+                        count=1)
+            else:
+                self.cfd_solver = numpy.zeros(1, dtype=numpy.int32)
+
+            self.mu = numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+            self.v_f = numpy.empty(
+                    (self.num[0], self.num[1], self.num[2], self.nd[0]),
+                    dtype=numpy.float64)
+            self.p_f = \
+                    numpy.empty((self.num[0],self.num[1],self.num[2]),
+                    dtype=numpy.float64)
+            self.phi = \
+                    numpy.empty((self.num[0],self.num[1],self.num[2]),
+                    dtype=numpy.float64)
+            self.dphi = \
+                    numpy.empty((self.num[0],self.num[1],self.num[2]),
+                    dtype=numpy.float64)
+
+            for z in numpy.arange(self.num[2]):
+                for y in numpy.arange(self.num[1]):
+                    for x in numpy.arange(self.num[0]):
+                        self.v_f[x,y,z,0] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)
+                        self.v_f[x,y,z,1] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)
+                        self.v_f[x,y,z,2] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)
+                        self.p_f[x,y,z] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)
+                        self.phi[x,y,z] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)
+                        self.dphi[x,y,z] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,\
+                                count=1)/(self.time_dt*self.ndem)
+
+            if self.version >= 0.36:
+                self.rho_f =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.p_mod_A =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.p_mod_f =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.p_mod_phi =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+                if self.version >= 2.12 and self.cfd_solver[0] == 1:
+                    self.bc_xn =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                    self.bc_xp =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                    self.bc_yn =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                    self.bc_yp =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+
+                self.bc_bot =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                self.bc_top =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                self.free_slip_bot =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                self.free_slip_top =\
+                        numpy.fromfile(fh, dtype=numpy.int32, count=1)
+                if self.version >= 2.11:
+                    self.bc_bot_flux =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                    self.bc_top_flux =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                else:
+                    self.bc_bot_flux = numpy.zeros(1, dtype=numpy.float64)
+                    self.bc_top_flux = numpy.zeros(1, dtype=numpy.float64)
+
+                if self.version >= 2.15:
+                    self.p_f_constant = \
+                        numpy.empty((self.num[0],self.num[1],self.num[2]),
+                                    dtype=numpy.int32)
+
+                    for z in numpy.arange(self.num[2]):
+                        for y in numpy.arange(self.num[1]):
+                            for x in numpy.arange(self.num[0]):
+                                self.p_f_constant[x,y,z] = \
+                                    numpy.fromfile(fh,
+                                                dtype=numpy.int32,
+                                                count=1)
+                else:
+                    self.p_f_constant = numpy.zeros(
+                        (self.num[0], self.num[1], self.num[2]),
+                        dtype=numpy.int32)
+
+            if self.version >= 2.0 and self.cfd_solver == 0:
+                self.gamma = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.theta = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.beta  = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.tolerance =\
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.maxiter = \
+                        numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+                if self.version >= 1.01:
+                    self.ndem = \
+                            numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+                else:
+                    self.ndem = 1
+
+                if self.version >= 1.04:
+                    self.c_phi = \
+                            numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                    self.c_v =\
+                      numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                    if self.version == 1.06:
+                        self.c_a =\
+                                numpy.fromfile(fh, \
+                                dtype=numpy.float64, count=1)
+                    elif self.version >= 1.07:
+                        self.dt_dem_fac =\
+                                numpy.fromfile(fh, \
+                                dtype=numpy.float64, count=1)
+                    else:
+                        self.c_a = numpy.ones(1, dtype=numpy.float64)
+                else:
+                    self.c_phi = numpy.ones(1, dtype=numpy.float64)
+                    self.c_v = numpy.ones(1, dtype=numpy.float64)
+
+                if self.version >= 1.05:
+                    self.f_d = numpy.empty_like(self.x)
+                    self.f_p = numpy.empty_like(self.x)
+                    self.f_v = numpy.empty_like(self.x)
+                    self.f_sum = numpy.empty_like(self.x)
+
+                    for i in numpy.arange(self.np[0]):
+                        self.f_d[i,:] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,
+                                        count=self.nd[0])
+                    for i in numpy.arange(self.np[0]):
+                        self.f_p[i,:] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,
+                                        count=self.nd[0])
+                    for i in numpy.arange(self.np[0]):
+                        self.f_v[i,:] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,
+                                        count=self.nd[0])
+                    for i in numpy.arange(self.np[0]):
+                        self.f_sum[i,:] = \
+                                numpy.fromfile(fh, dtype=numpy.float64,
+                                        count=self.nd[0])
+                else:
+                    self.f_d = numpy.zeros((self.np[0], self.nd[0]),
+                            dtype=numpy.float64)
+                    self.f_p = numpy.zeros((self.np[0], self.nd[0]),
+                            dtype=numpy.float64)
+                    self.f_v = numpy.zeros((self.np[0], self.nd[0]),
+                            dtype=numpy.float64)
+                    self.f_sum = numpy.zeros((self.np[0], self.nd[0]),
+                            dtype=numpy.float64)
+
+            elif self.version >= 2.0 and self.cfd_solver == 1:
+
+                self.tolerance = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.maxiter = \
+                        numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+                self.ndem = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
+                self.c_phi = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+                self.f_p = numpy.empty_like(self.x)
+                for i in numpy.arange(self.np[0]):
+                    self.f_p[i,:] = \
+                            numpy.fromfile(fh, dtype=numpy.float64,
+                                    count=self.nd[0])
+                self.beta_f = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+                self.k_c = \
+                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+
+        if self.version >= 1.02:
+            self.color =\
+              numpy.fromfile(fh, dtype=numpy.int32, count=int(self.np[0]))
+        else:
+            self.color = numpy.zeros(self.np[0], dtype=numpy.int32)
+
+    finally:
+        self.version[0] = VERSION
+        if fh is not None:
+            fh.close()
+
+def writeSynthetic(path, version, np, num, fluid=False, cfd_solver=0, nb0=0,
+        nw=1, seed=0):
+    '''
+    Write a binary file with random content in the layout of the given file
+    version.
+
+    :param path: The path of the output file
+    :type path: str
+    :param version: The file version to emulate
+    :type version: float
+    :param np: The number of particles
+    :type np: int
+    :param num: The number of fluid cells along each axis
+    :type num: list of int
+    :param fluid: Write the fluid section
+    :type fluid: bool
+    :param cfd_solver: The fluid solver (0: Navier-Stokes, 1: Darcy)
+    :type cfd_solver: int
+    :param nb0: The number of bonds
+    :type nb0: int
+    :param nw: The number of dynamic walls
+    :type nw: int
+    :param seed: The random number generator seed
+    :type seed: int
+    '''
+    rng = numpy.random.RandomState(seed)
+    nd = 3
+    ncells = num[0]*num[1]*num[2]
+
+    def f8(n=1):
+        return rng.random_sample(n).astype(numpy.float64).tobytes()
+
+    def i4(values):
+        return numpy.asarray(values, dtype=numpy.int32).tobytes()
+
+    def u4(values):
+        return numpy.asarray(values, dtype=numpy.uint32).tobytes()
+
+    parts = [numpy.array(version, dtype=numpy.float64).tobytes(),
+            i4(nd), u4(np), f8(4), u4(1), f8(nd), f8(nd), u4(num), i4(0)]
+    if version >= 2.14:
+        parts.append(i4(0))
+    parts.append(f8(np*(nd + 1)))                   # x, radius
+    parts.append(f8(np*(3 if version >= 1.03 else 2)))  # xyzsum
+    parts.append(f8(np*(nd + 1)))                   # vel, fixvel
+    parts.append(f8(4*np*nd))                       # force .. torque
+    parts.append(f8(5*np))                          # es_dot .. p
+    parts.append(f8(nd + 3))                        # g, k_n, k_t, k_r
+    if version >= 2.13:
+        parts.append(f8())                          # E
+    parts.append(f8(10))                            # gamma_n .. mu_wd
+    parts.append(f8() + u4(1) + f8(3))              # rho .. V_b
+    parts.append(u4(nw) + i4(rng.randint(0, 3, nw)))
+    parts.append(f8(nw*(nd + 1)) + f8(nw*4))        # walls
+    parts.append(f8(2))                             # w_sigma0_A, w_sigma0_f
+    if version >= 2.1:
+        parts.append(f8())                          # w_tau_x
+    parts.append(f8() + u4(nb0) + f8(2))            # lambda_bar .. tau_b
+    parts.append(u4(rng.randint(0, max(np, 1), 2*nb0)))
+    parts.append(f8(nb0*(1 + nd + 1 + nd)))         # bond deformations
+
+    if fluid:
+        if version >= 2.0:
+            parts.append(i4(cfd_solver))
+        parts.append(f8())                          # mu
+        parts.append(f8(ncells*6))                  # v_f, p_f, phi, dphi
+        if version >= 0.36:
+            parts.append(f8(4))                     # rho_f .. p_mod_phi
+            if version >= 2.12 and cfd_solver == 1:
+                parts.append(i4([0, 1, 0, 1]))
+            parts.append(i4([0, 1, 0, 1]))
+            if version >= 2.11:
+                parts.append(f8(2))
+            if version >= 2.15:
+                parts.append(i4(rng.randint(0, 2, ncells)))
+        if version >= 2.0 and cfd_solver == 0:
+            parts.append(f8(4) + u4(100))
+            if version >= 1.01:
+                parts.append(u4(10))
+            if version >= 1.04:
+                parts.append(f8(2))
+                if version >= 1.06:
+                    parts.append(f8())
+            if version >= 1.05:
+                parts.append(f8(4*np*nd))
+        elif version >= 2.0 and cfd_solver == 1:
+            parts.append(f8() + u4(100) + u4(10) + f8())
+            parts.append(f8(np*nd) + f8(2))
+
+    if version >= 1.02:
+        parts.append(i4(rng.randint(0, 10, np)))
+
+    with open(path, 'wb') as fh:
+        fh.write(b''.join(parts))
+
+def compareSims(a, b):
+    '''
+    Return the names of the array attributes that differ between two
+    :class:`sphere.sim` objects, comparing dtype, shape and raw bytes.
+    '''
+    differing = []
+    for key in sorted(set(vars(a)) | set(vars(b))):
+        va = getattr(a, key, None)
+        vb = getattr(b, key, None)
+        if isinstance(va, numpy.ndarray) or isinstance(vb, numpy.ndarray):
+            va = numpy.asarray(va)
+            vb = numpy.asarray(vb)
+            if va.dtype != vb.dtype or va.shape != vb.shape or \
+                    va.tobytes() != vb.tobytes():
+                differing.append(key)
+        elif va != vb:
+            differing.append(key)
+    return differing
+
+def timeRead(read, path, fluid, repetitions):
+    best = numpy.inf
+    for i in range(repetitions):
+        sb = sphere.sim(fluid=fluid)
+        t0 = time.time()
+        read(sb, path, verbose=False)
+        best = min(best, time.time() - t0)
+    return sb, best
+
+if __name__ == '__main__':
+    np = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    nx = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    repetitions = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    # (version, fluid, cfd_solver). Files older than 2.0 do not store the
+    # solver type and are always read as Navier-Stokes.
+    cases = [(0.36, True, 0), (1.01, True, 0), (1.02, True, 0),
+            (1.03, True, 0), (1.04, True, 0), (1.05, True, 0),
+            (1.06, True, 0), (1.07, True, 0),
+            (2.0, True, 0), (2.0, True, 1), (2.1, True, 1),
+            (2.11, True, 1), (2.12, True, 1), (2.13, False, 0),
+            (2.14, True, 0), (VERSION, False, 0), (VERSION, True, 0),
+            (VERSION, True, 1)]
+
+    tmpdir = tempfile.mkdtemp()
+    print('{0:>8s} {1:>6s} {2:>7s} {3:>12s} {4:>12s} {5:>8s}  {6}'.format(
+        'version', 'fluid', 'solver', 'legacy [s]', 'bulk [s]', 'speedup',
+        'identical'))
+    failed = False
+    for version, fluid, cfd_solver in cases:
+        path = os.path.join(tmpdir, 'synthetic-{0}-{1}-{2}.bin'.format(
+            version, int(fluid), cfd_solver))
+        writeSynthetic(path, version, np, [nx, nx, nx], fluid=fluid,
+                cfd_solver=cfd_solver, nb0=np//10)
+
+        sb_legacy, t_legacy = timeRead(readbin_legacy, path, fluid,
+                repetitions)
+        sb_bulk, t_bulk = timeRead(sphere.sim.readbin, path, fluid,
+                repetitions)
+        differing = compareSims(sb_legacy, sb_bulk)
+        failed = failed or len(differing) > 0
+        print('{0:8.2f} {1:6d} {2:7d} {3:12.4f} {4:12.4f} {5:8.1f}  {6}'
+                .format(version, int(fluid), cfd_solver, t_legacy, t_bulk,
+                    t_legacy/t_bulk,
+                    'yes' if not differing else 'NO: ' + ', '.join(differing)))
+        os.remove(path)
+    os.rmdir(tmpdir)
+
+    if failed:
+        sys.exit(1)
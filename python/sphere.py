@@ -1,5 +1,6 @@
 #!/usr/bin/env python2.7
 import math
+import os
 import numpy
 import matplotlib
 matplotlib.use('Agg')
@@ -10,7 +11,30 @@ matplotlib.rc('text', usetex=True)
 matplotlib.rcParams['text.latex.preamble'] = [r"\usepackage{amsmath}"]
 from matplotlib.font_manager import FontProperties
 import subprocess
+import functools
+import io
+import json
+import threading
+import zipfile
+import zlib
 import pickle as pl
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+try:
+    import concurrent.futures
+except ImportError:
+    py_futures = False
+else:
+    py_futures = True
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    py_arrow = False
+else:
+    py_arrow = True
 try:
     import vtk
 except ImportError:
@@ -453,6 +477,10 @@ class sim:
         # Particle color marker
         self.color = numpy.zeros(self.np[0], dtype=numpy.int32)
 
+        # Over-allocated storage behind the particle arrays, see
+        # reserveParticles()
+        self.particle_buffers = {}
+
     def __cmp__(self, other):
         '''
         Called when to sim objects are compared. Returns 0 if the values
@@ -866,28 +894,137 @@ class sim:
         :type p: float
         '''
 
-        self.np = self.np + 1
-
-        self.x      = numpy.append(self.x, [x], axis=0)
-        self.radius = numpy.append(self.radius, radius)
-        self.vel    = numpy.append(self.vel, [vel], axis=0)
-        self.xyzsum = numpy.append(self.xyzsum, [xyzsum], axis=0)
-        self.fixvel = numpy.append(self.fixvel, fixvel)
-        self.force  = numpy.append(self.force, [force], axis=0)
-        self.angpos = numpy.append(self.angpos, [angpos], axis=0)
-        self.angvel = numpy.append(self.angvel, [angvel], axis=0)
-        self.torque = numpy.append(self.torque, [torque], axis=0)
-        self.es_dot = numpy.append(self.es_dot, es_dot)
-        self.es     = numpy.append(self.es, es)
-        self.ev_dot = numpy.append(self.ev_dot, ev_dot)
-        self.ev     = numpy.append(self.ev, ev)
-        self.p      = numpy.append(self.p, p)
-        self.color  = numpy.append(self.color, color)
+        self.addParticles([x], radius, xyzsum=xyzsum, vel=vel, fixvel=fixvel,
+                force=force, angpos=angpos, angvel=angvel, torque=torque,
+                es_dot=es_dot, es=es, ev_dot=ev_dot, ev=ev, p=p, color=color)
+
+    def addParticles(self,
+            x,
+            radius,
+            xyzsum = 0.0,
+            vel = 0.0,
+            fixvel = 0.0,
+            force = 0.0,
+            angpos = 0.0,
+            angvel = 0.0,
+            torque = 0.0,
+            es_dot = 0.0,
+            es = 0.0,
+            ev_dot = 0.0,
+            ev = 0.0,
+            p = 0.0,
+            color = 0):
+        '''
+        Add several particles to the simulation object. The only required
+        parameters are the positions (x) and the radii (radius). The other
+        values are either given per particle, or as a single value or vector
+        shared by all the new particles.
+
+        The particle arrays are stored in buffers with room for more
+        particles (see :func:`reserveParticles()`), so that adding particles
+        one at a time takes time proportional to the number of particles.
+
+        :param x: The particle center coordinates, one particle per row
+        :type x: numpy.array
+        :param radius: The particle radii
+        :type radius: float or numpy.array
+        :param vel: The particle linear velocities (default = [0,0,0])
+        :type vel: numpy.array
+        :param fixvel: 0: Do not fix particle velocity (default), 1: Fix
+            horizontal linear velocity, -1: Fix horizontal and vertical linear
+            velocity
+        :type fixvel: float or numpy.array
+        :param angpos: The particle angular positions (default = [0,0,0])
+        :type angpos: numpy.array
+        :param angvel: The particle angular velocities (default = [0,0,0])
+        :type angvel: numpy.array
+        :param torque: The particle torques (default = [0,0,0])
+        :type torque: numpy.array
+        :param es_dot: The particle shear energy loss rates (default = 0)
+        :type es_dot: float or numpy.array
+        :param es: The particle shear energy losses (default = 0)
+        :type es: float or numpy.array
+        :param ev_dot: The particle viscous energy rate losses (default = 0)
+        :type ev_dot: float or numpy.array
+        :param ev: The particle viscous energy losses (default = 0)
+        :type ev: float or numpy.array
+        :param p: The particle pressures (default = 0)
+        :type p: float or numpy.array
+        :param color: The particle color markers (default = 0)
+        :type color: int or numpy.array
+        '''
+
+        x = numpy.asarray(x, dtype=numpy.float64)
+        n = len(x)
+        first = self.np[0]
+        self.reserveParticles(first + n)
+
+        values = {'x': x, 'radius': radius, 'xyzsum': xyzsum, 'vel': vel,
+                'fixvel': fixvel, 'force': force, 'angpos': angpos,
+                'angvel': angvel, 'torque': torque, 'es_dot': es_dot,
+                'es': es, 'ev_dot': ev_dot, 'ev': ev, 'p': p, 'color': color}
+        for field in self.particleFields():
+            buffer = self.particle_buffers[field][0]
+            buffer[first:first + n] = values.get(field, 0.0)
+            self.particle_buffers[field] = (buffer, buffer[:first + n])
+            setattr(self, field, self.particle_buffers[field][1])
+
+        self.np = self.np + n
+
+    def particleFields(self):
+        '''
+        Returns the names of the arrays with one value or vector per particle.
+
+        :returns: The names of the particle arrays
+        :return type: list
+        '''
+        fields = ['x', 'radius', 'xyzsum', 'vel', 'fixvel', 'force', 'angpos',
+                'angvel', 'torque', 'es_dot', 'es', 'ev_dot', 'ev', 'p',
+                'color']
         if self.fluid:
-            self.f_d    = numpy.append(self.f_d, [numpy.zeros(3)], axis=0)
-            self.f_p    = numpy.append(self.f_p, [numpy.zeros(3)], axis=0)
-            self.f_v    = numpy.append(self.f_v, [numpy.zeros(3)], axis=0)
-            self.f_sum  = numpy.append(self.f_sum, [numpy.zeros(3)], axis=0)
+            # Darcy and Navier-Stokes
+            fields.append('f_p')
+            if self.cfd_solver[0] == 0: # Navier-Stokes
+                fields += ['f_d', 'f_v', 'f_sum']
+        return fields
+
+    def reserveParticles(self, n):
+        '''
+        Make room for at least ``n`` particles in the particle arrays. The
+        particle arrays (e.g. ``self.x``) are views of the first ``self.np``
+        rows of larger buffers, and particles added with
+        :func:`addParticles()` are written to the free rows. When a buffer is
+        too small, its size is at least doubled. Particle arrays that have
+        been replaced, e.g. by reading a binary file, are copied to new
+        buffers. The spare rows are released by :func:`trimParticles()`.
+
+        :param n: The number of particles to make room for
+        :type n: int
+        '''
+        for field in self.particleFields():
+            values = getattr(self, field)
+            buffer, view = self.particle_buffers.get(field, (None, None))
+            if values is not view or len(buffer) < n:
+                if values is view:
+                    size = max(n, 2*len(buffer))
+                else:
+                    size = max(n, len(values))
+                buffer = numpy.zeros((size,) + values.shape[1:],
+                        dtype=values.dtype)
+                buffer[:len(values)] = values
+                self.particle_buffers[field] = (buffer, buffer[:len(values)])
+                setattr(self, field, self.particle_buffers[field][1])
+
+    def trimParticles(self):
+        '''
+        Release the spare rows of the particle arrays reserved by
+        :func:`reserveParticles()`, so that each particle array holds exactly
+        ``self.np`` particles in its own memory.
+        '''
+        for field, (buffer, view) in self.particle_buffers.items():
+            if getattr(self, field, None) is view:
+                setattr(self, field, view.copy())
+        self.particle_buffers = {}
 
     def deleteParticle(self, i):
         '''
@@ -963,7 +1100,7 @@ class sim:
         self.f_sum   = numpy.zeros((self.np[0], self.nd[0]), dtype=numpy.float64)
 
     def readbin(self, targetbin, verbose = True, bonds = True, sigma0mod = True,
-            esysparticle = False):
+            esysparticle = False, mmap = False, fields = None):
         '''
         Reads a target ``sphere`` binary file.
 
@@ -985,6 +1122,22 @@ class sim:
             which is useful for reading output files from other DEM programs.
             (default = False)
         :type esysparticle: bool
+        :param mmap: Map the particle, bond and fluid arrays into memory with
+            ``numpy.memmap`` instead of reading them. Only the values needed to
+            find the position of each array are read when the file is opened,
+            and the data of an array is read from disk when it is accessed.
+            The mapping is copy-on-write, so changes to the arrays are not
+            written back to the file. The porosity change rate ``dphi`` is
+            scaled on reading and is therefore always loaded into memory
+            (default = False).
+        :type mmap: bool
+        :param fields: Only read the named values, e.g. ``['time_current',
+            'w_x', 'w_force']``, and skip over all other sections of the file.
+            The values that determine the file layout (``version``, ``nd``,
+            ``np``, ``num``, ``nw``, ``nb0`` and ``cfd_solver``) are always
+            read. All other values of the object are left unchanged
+            (default = None, which reads all values).
+        :type fields: list of str
         '''
 
         fh = None
@@ -993,6 +1146,18 @@ class sim:
                 print("Input file: {0}".format(targetbin))
             fh = open(targetbin, "rb")
 
+            # Find the file layout from the header values, and check that the
+            # file size matches before reading the data
+            layout = readBinaryLayout(fh, self.fluid, bonds, sigma0mod,
+                    check=not esysparticle)
+            if mmap or fields is not None:
+                data = None
+                if mmap:
+                    data = numpy.memmap(targetbin, dtype=numpy.uint8, mode='c')
+                self.readLayout(fh, layout, data, esysparticle, fields)
+                return
+            fh.seek(0)
+
             # Read the file version
             self.version = numpy.fromfile(fh, dtype=numpy.float64, count=1)
 
@@ -1013,11 +1178,6 @@ class sim:
                     numpy.fromfile(fh, dtype=numpy.uint32, count=1)
 
             # Allocate array memory for particles
-            self.x       = numpy.empty((self.np[0], self.nd[0]), dtype=numpy.float64)
-            self.radius  = numpy.empty(self.np[0], dtype=numpy.float64)
-            self.xyzsum  = numpy.empty((self.np[0], 3), dtype=numpy.float64)
-            self.vel     = numpy.empty((self.np[0], self.nd[0]), dtype=numpy.float64)
-            self.fixvel  = numpy.empty(self.np[0], dtype=numpy.float64)
             self.es_dot  = numpy.empty(self.np[0], dtype=numpy.float64)
             self.es      = numpy.empty(self.np[0], dtype=numpy.float64)
             self.ev_dot  = numpy.empty(self.np[0], dtype=numpy.float64)
@@ -1035,45 +1195,49 @@ class sim:
             else:
                 self.adaptive = numpy.zeros(1, dtype=numpy.float64)
 
-            # Per-particle vectors
-            for i in numpy.arange(self.np):
-                self.x[i,:] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
-                self.radius[i] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            np = int(self.np[0])
+            nd = int(self.nd[0])
+
+            # Per-particle vectors. The position and radius, and the velocity
+            # and fixvel flag, are interleaved per particle in the file. Each
+            # block is read in one call with a structured dtype and split into
+            # contiguous arrays afterwards.
+            block = numpy.fromfile(fh, count=np, dtype=numpy.dtype([
+                ('x', numpy.float64, (nd,)), ('radius', numpy.float64)]))
+            self.x = numpy.ascontiguousarray(block['x'])
+            self.radius = numpy.ascontiguousarray(block['radius'])
 
             if self.version >= 1.03:
                 self.xyzsum = numpy.fromfile(fh, dtype=numpy.float64,\
-                        count=self.np*3).reshape(self.np[0],3)
+                        count=np*3).reshape(np,3)
             else:
                 self.xyzsum = numpy.fromfile(fh, dtype=numpy.float64,\
-                        count=self.np*2).reshape(self.np[0],2)
+                        count=np*2).reshape(np,2)
 
-            for i in numpy.arange(self.np):
-                self.vel[i,:] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
-                self.fixvel[i] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            block = numpy.fromfile(fh, count=np, dtype=numpy.dtype([
+                ('vel', numpy.float64, (nd,)), ('fixvel', numpy.float64)]))
+            self.vel = numpy.ascontiguousarray(block['vel'])
+            self.fixvel = numpy.ascontiguousarray(block['fixvel'])
 
             self.force = numpy.fromfile(fh, dtype=numpy.float64,\
-                    count=self.np*self.nd[0]).reshape(self.np[0], self.nd[0])
+                    count=np*nd).reshape(np, nd)
 
             self.angpos = numpy.fromfile(fh, dtype=numpy.float64,\
-                    count=self.np*self.nd[0]).reshape(self.np[0], self.nd[0])
+                    count=np*nd).reshape(np, nd)
             self.angvel = numpy.fromfile(fh, dtype=numpy.float64,\
-                    count=self.np*self.nd[0]).reshape(self.np[0], self.nd[0])
+                    count=np*nd).reshape(np, nd)
             self.torque = numpy.fromfile(fh, dtype=numpy.float64,\
-                    count=self.np*self.nd[0]).reshape(self.np[0], self.nd[0])
+                    count=np*nd).reshape(np, nd)
 
             if esysparticle:
                 return
 
             # Per-particle single-value parameters
-            self.es_dot = numpy.fromfile(fh, dtype=numpy.float64, count=self.np)
-            self.es     = numpy.fromfile(fh, dtype=numpy.float64, count=self.np)
-            self.ev_dot = numpy.fromfile(fh, dtype=numpy.float64, count=self.np)
-            self.ev     = numpy.fromfile(fh, dtype=numpy.float64, count=self.np)
-            self.p      = numpy.fromfile(fh, dtype=numpy.float64, count=self.np)
+            self.es_dot = numpy.fromfile(fh, dtype=numpy.float64, count=np)
+            self.es     = numpy.fromfile(fh, dtype=numpy.float64, count=np)
+            self.ev_dot = numpy.fromfile(fh, dtype=numpy.float64, count=np)
+            self.ev     = numpy.fromfile(fh, dtype=numpy.float64, count=np)
+            self.p      = numpy.fromfile(fh, dtype=numpy.float64, count=np)
 
             # Constant, global physical parameters
             self.g      = numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
@@ -1102,26 +1266,20 @@ class sim:
 
             # Wall data
             self.nw      = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
-            self.wmode   = numpy.empty(self.nw[0], dtype=numpy.int32)
-            self.w_n     = numpy.empty(self.nw*self.nd, dtype=numpy.float64)\
-                    .reshape(self.nw[0],self.nd[0])
-            self.w_x     = numpy.empty(self.nw[0], dtype=numpy.float64)
-            self.w_m     = numpy.empty(self.nw[0], dtype=numpy.float64)
-            self.w_vel   = numpy.empty(self.nw[0], dtype=numpy.float64)
-            self.w_force = numpy.empty(self.nw[0], dtype=numpy.float64)
-            self.w_sigma0  = numpy.empty(self.nw[0], dtype=numpy.float64)
-
-            self.wmode   = numpy.fromfile(fh, dtype=numpy.int32, count=self.nw[0])
-            for i in numpy.arange(self.nw[0]):
-                self.w_n[i,:] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=self.nd[0])
-                self.w_x[i]   = numpy.fromfile(fh, dtype=numpy.float64, count=1)
-            for i in numpy.arange(self.nw[0]):
-                self.w_m[i]   = numpy.fromfile(fh, dtype=numpy.float64, count=1)
-                self.w_vel[i] = numpy.fromfile(fh, dtype=numpy.float64, count=1)
-                self.w_force[i] =\
-                        numpy.fromfile(fh, dtype=numpy.float64, count=1)
-                self.w_sigma0[i]= numpy.fromfile(fh, dtype=numpy.float64, count=1)
+            nw = int(self.nw[0])
+
+            self.wmode   = numpy.fromfile(fh, dtype=numpy.int32, count=nw)
+            block = numpy.fromfile(fh, count=nw, dtype=numpy.dtype([
+                ('w_n', numpy.float64, (nd,)), ('w_x', numpy.float64)]))
+            self.w_n     = numpy.ascontiguousarray(block['w_n'])
+            self.w_x     = numpy.ascontiguousarray(block['w_x'])
+            block = numpy.fromfile(fh, count=nw, dtype=numpy.dtype([
+                ('w_m', numpy.float64), ('w_vel', numpy.float64),
+                ('w_force', numpy.float64), ('w_sigma0', numpy.float64)]))
+            self.w_m     = numpy.ascontiguousarray(block['w_m'])
+            self.w_vel   = numpy.ascontiguousarray(block['w_vel'])
+            self.w_force = numpy.ascontiguousarray(block['w_force'])
+            self.w_sigma0  = numpy.ascontiguousarray(block['w_sigma0'])
             if sigma0mod:
                 self.w_sigma0_A = numpy.fromfile(fh, dtype=numpy.float64, count=1)
                 self.w_sigma0_f = numpy.fromfile(fh, dtype=numpy.float64, count=1)
@@ -1137,20 +1295,17 @@ class sim:
                 self.nb0 = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
                 self.sigma_b = numpy.fromfile(fh, dtype=numpy.float64, count=1)
                 self.tau_b = numpy.fromfile(fh, dtype=numpy.float64, count=1)
-                self.bonds = numpy.empty((self.nb0[0], 2), dtype=numpy.uint32)
-                for i in numpy.arange(self.nb0[0]):
-                    self.bonds[i,0] = numpy.fromfile(fh, dtype=numpy.uint32,
-                            count=1)
-                    self.bonds[i,1] = numpy.fromfile(fh, dtype=numpy.uint32,
-                            count=1)
+                nb0 = int(self.nb0[0])
+                self.bonds = numpy.fromfile(fh, dtype=numpy.uint32,
+                        count=nb0*2).reshape(nb0, 2)
                 self.bonds_delta_n = numpy.fromfile(fh, dtype=numpy.float64,
-                        count=self.nb0[0])
+                        count=nb0)
                 self.bonds_delta_t = numpy.fromfile(fh, dtype=numpy.float64,
-                        count=self.nb0*self.nd[0]).reshape(self.nb0[0], self.nd[0])
+                        count=nb0*nd).reshape(nb0, nd)
                 self.bonds_omega_n = numpy.fromfile(fh, dtype=numpy.float64,
-                        count=self.nb0[0])
+                        count=nb0)
                 self.bonds_omega_t = numpy.fromfile(fh, dtype=numpy.float64,
-                        count=self.nb0*self.nd[0]).reshape(self.nb0[0], self.nd[0])
+                        count=nb0*nd).reshape(nb0, nd)
             else:
                 self.nb0 = numpy.zeros(1, dtype=numpy.uint32)
 
@@ -1164,40 +1319,22 @@ class sim:
 
                 self.mu = numpy.fromfile(fh, dtype=numpy.float64, count=1)
 
-                self.v_f = numpy.empty(
-                        (self.num[0], self.num[1], self.num[2], self.nd[0]),
-                        dtype=numpy.float64)
-                self.p_f = \
-                        numpy.empty((self.num[0],self.num[1],self.num[2]),
-                        dtype=numpy.float64)
-                self.phi = \
-                        numpy.empty((self.num[0],self.num[1],self.num[2]),
-                        dtype=numpy.float64)
-                self.dphi = \
-                        numpy.empty((self.num[0],self.num[1],self.num[2]),
-                        dtype=numpy.float64)
-
-                for z in numpy.arange(self.num[2]):
-                    for y in numpy.arange(self.num[1]):
-                        for x in numpy.arange(self.num[0]):
-                            self.v_f[x,y,z,0] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)
-                            self.v_f[x,y,z,1] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)
-                            self.v_f[x,y,z,2] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)
-                            self.p_f[x,y,z] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)
-                            self.phi[x,y,z] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)
-                            self.dphi[x,y,z] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,\
-                                    count=1)/(self.time_dt*self.ndem)
+                # The fluid cells are stored with the x index varying
+                # fastest. Read all cells at once and transpose to the (x, y,
+                # z) index order used in Python.
+                nx, ny, nz = (int(n) for n in self.num)
+                block = numpy.fromfile(fh, count=nx*ny*nz,
+                        dtype=numpy.dtype([
+                            ('v_f', numpy.float64, (3,)),
+                            ('p_f', numpy.float64),
+                            ('phi', numpy.float64),
+                            ('dphi', numpy.float64)])).reshape(nz, ny, nx)
+                self.v_f = numpy.ascontiguousarray(
+                        block['v_f'].transpose(2, 1, 0, 3))
+                self.p_f = numpy.ascontiguousarray(block['p_f'].T)
+                self.phi = numpy.ascontiguousarray(block['phi'].T)
+                self.dphi = numpy.ascontiguousarray(block['dphi'].T)\
+                        /(self.time_dt*self.ndem)
 
                 if self.version >= 0.36:
                     self.rho_f =\
@@ -1237,17 +1374,9 @@ class sim:
                         self.bc_top_flux = numpy.zeros(1, dtype=numpy.float64)
 
                     if self.version >= 2.15:
-                        self.p_f_constant = \
-                            numpy.empty((self.num[0],self.num[1],self.num[2]),
-                                        dtype=numpy.int32)
-
-                        for z in numpy.arange(self.num[2]):
-                            for y in numpy.arange(self.num[1]):
-                                for x in numpy.arange(self.num[0]):
-                                    self.p_f_constant[x,y,z] = \
-                                        numpy.fromfile(fh,
-                                                    dtype=numpy.int32,
-                                                    count=1)
+                        self.p_f_constant = numpy.ascontiguousarray(
+                                numpy.fromfile(fh, dtype=numpy.int32,
+                                    count=nx*ny*nz).reshape(nz, ny, nx).T)
                     else:
                         self.p_f_constant = numpy.zeros(
                             (self.num[0], self.num[1], self.num[2]),
@@ -1290,27 +1419,14 @@ class sim:
                         self.c_v = numpy.ones(1, dtype=numpy.float64)
 
                     if self.version >= 1.05:
-                        self.f_d = numpy.empty_like(self.x)
-                        self.f_p = numpy.empty_like(self.x)
-                        self.f_v = numpy.empty_like(self.x)
-                        self.f_sum = numpy.empty_like(self.x)
-
-                        for i in numpy.arange(self.np[0]):
-                            self.f_d[i,:] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,
-                                            count=self.nd[0])
-                        for i in numpy.arange(self.np[0]):
-                            self.f_p[i,:] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,
-                                            count=self.nd[0])
-                        for i in numpy.arange(self.np[0]):
-                            self.f_v[i,:] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,
-                                            count=self.nd[0])
-                        for i in numpy.arange(self.np[0]):
-                            self.f_sum[i,:] = \
-                                    numpy.fromfile(fh, dtype=numpy.float64,
-                                            count=self.nd[0])
+                        self.f_d = numpy.fromfile(fh, dtype=numpy.float64,
+                                count=np*nd).reshape(np, nd)
+                        self.f_p = numpy.fromfile(fh, dtype=numpy.float64,
+                                count=np*nd).reshape(np, nd)
+                        self.f_v = numpy.fromfile(fh, dtype=numpy.float64,
+                                count=np*nd).reshape(np, nd)
+                        self.f_sum = numpy.fromfile(fh, dtype=numpy.float64,
+                                count=np*nd).reshape(np, nd)
                     else:
                         self.f_d = numpy.zeros((self.np[0], self.nd[0]),
                                 dtype=numpy.float64)
@@ -1330,11 +1446,8 @@ class sim:
                     self.ndem = numpy.fromfile(fh, dtype=numpy.uint32, count=1)
                     self.c_phi = \
                             numpy.fromfile(fh, dtype=numpy.float64, count=1)
-                    self.f_p = numpy.empty_like(self.x)
-                    for i in numpy.arange(self.np[0]):
-                        self.f_p[i,:] = \
-                                numpy.fromfile(fh, dtype=numpy.float64,
-                                        count=self.nd[0])
+                    self.f_p = numpy.fromfile(fh, dtype=numpy.float64,
+                            count=np*nd).reshape(np, nd)
                     self.beta_f = \
                             numpy.fromfile(fh, dtype=numpy.float64, count=1)
 
@@ -1343,15 +1456,137 @@ class sim:
 
             if self.version >= 1.02:
                 self.color =\
-                  numpy.fromfile(fh, dtype=numpy.int32, count=self.np)
+                  numpy.fromfile(fh, dtype=numpy.int32, count=np)
             else:
-                self.color = numpy.zeros(self.np[0], dtype=numpy.int32)
+                self.color = numpy.zeros(np, dtype=numpy.int32)
 
         finally:
             self.version[0] = VERSION
             if fh is not None:
                 fh.close()
 
+    def readLayout(self, fh, layout, data=None, esysparticle=False,
+            fields=None, buffers=None):
+        '''
+        Set the object values from the sections of a binary file described by
+        a layout from :func:`readBinaryLayout()`. This function is called by
+        :func:`readbin()`.
+
+        :param fh: The open binary file, or None if ``data`` holds the file
+        :type fh: file
+        :param layout: The file layout
+        :type layout: list
+        :param data: A ``numpy.memmap`` or a ``numpy.uint8`` array of the file
+            as bytes. If given, the arrays are views into ``data``, otherwise
+            they are read from ``fh`` (default = None)
+        :type data: numpy.array
+        :param esysparticle: Stop after reading the kinematics
+            (default = False)
+        :type esysparticle: bool
+        :param fields: Only set these values, and skip the sections containing
+            none of them (default = None, which sets all values)
+        :type fields: list of str
+        :param buffers: Read the sections into the arrays of this dict, keyed
+            by section name, and copy the values into the existing arrays of
+            the object where the shape and type are unchanged. The dict is
+            filled on the first call and reused afterwards
+            (default = None, which allocates new arrays)
+        :type buffers: dict
+        '''
+        grid_fields = ['v_f', 'p_f', 'phi', 'dphi', 'p_f_constant']
+
+        def reusable(array, dtype, shape):
+            return isinstance(array, numpy.ndarray) and \
+                    array.dtype == dtype and array.shape == tuple(shape) and \
+                    array.flags.c_contiguous and array.flags.writeable and \
+                    not isinstance(array, numpy.memmap)
+
+        if fields is not None:
+            available = set()
+            for name in [section[0] for section in layout]:
+                if isinstance(name, tuple):
+                    available.update(name)
+                else:
+                    available.add(name)
+            for field in fields:
+                if field not in available:
+                    raise Exception('Error: The field "{}" is not stored in '
+                            'this file'.format(field))
+
+            fields = set(fields)
+            fields.update(['version', 'nd', 'np', 'num', 'nw', 'nb0',
+                'cfd_solver'])
+            if 'dphi' in fields:
+                fields.add('time_dt')
+
+        for name, dtype, shape, offset, fill in layout:
+            if esysparticle and name == 'es_dot':
+                break
+
+            if isinstance(name, tuple):
+                names = name
+            else:
+                names = (name,)
+            if fields is not None and fields.isdisjoint(names):
+                continue
+
+            count = int(numpy.prod(shape))
+            if offset is None:
+                values = numpy.full(shape, fill, dtype=dtype)
+            elif data is not None and (count > 1 or fh is None):
+                values = data[offset:offset + count*dtype.itemsize]\
+                        .view(dtype).reshape(shape)
+            elif buffers is not None:
+                values = buffers.get(name)
+                if not isinstance(name, tuple) and \
+                        name not in grid_fields:
+                    # Read directly into the array of the object
+                    current = getattr(self, name, None)
+                    if reusable(current, dtype, shape):
+                        values = current
+                if not reusable(values, dtype, shape):
+                    values = numpy.empty(shape, dtype=dtype)
+                buffers[name] = values
+                fh.seek(offset)
+                if fh.readinto(values) != values.nbytes:
+                    raise Exception('Error: The file ends before the '
+                            'values of ' + str(name))
+            else:
+                fh.seek(offset)
+                values = numpy.fromfile(fh, dtype=dtype, count=count)\
+                        .reshape(shape)
+
+            for field in names:
+                if fields is not None and field not in fields:
+                    continue
+                if isinstance(name, tuple):
+                    value = values[field]
+                else:
+                    value = values
+
+                # Fluid grid values are stored with the x index varying
+                # fastest and are indexed as (x, y, z) in Python
+                if field in grid_fields:
+                    if value.ndim == 4:
+                        value = value.transpose(2, 1, 0, 3)
+                    else:
+                        value = value.T
+
+                if buffers is None and (data is None or fh is None or
+                        offset is None or count == 1):
+                    value = numpy.ascontiguousarray(value)
+                if field == 'dphi':
+                    value = value/(self.time_dt*self.ndem)
+                if buffers is not None:
+                    current = getattr(self, field, None)
+                    if current is value:
+                        continue
+                    if reusable(current, value.dtype, value.shape):
+                        numpy.copyto(current, value)
+                        continue
+                    value = numpy.array(value, order='C')
+                setattr(self, field, value)
+
     def writebin(self, folder = "../input/", verbose = True):
         '''
         Writes a ``sphere`` binary file to the ``../input/`` folder by default.
@@ -1364,6 +1599,9 @@ class sim:
         :param verbose: Show diagnostic information (default = True)
         :type verbose: bool
         '''
+        # Release the spare rows of particle arrays built with addParticle()
+        self.trimParticles()
+
         fh = None
         try :
             targetbin = folder + "/" + self.sid + ".bin"
@@ -1372,181 +1610,43 @@ class sim:
 
             fh = open(targetbin, "wb")
 
-            # Write the current version number
-            fh.write(self.version.astype(numpy.float64))
-
-            # Write the number of dimensions and particles
-            fh.write(self.nd.astype(numpy.int32))
-            fh.write(self.np.astype(numpy.uint32))
-
-            # Write the time variables
-            fh.write(self.time_dt.astype(numpy.float64))
-            fh.write(self.time_current.astype(numpy.float64))
-            fh.write(self.time_total.astype(numpy.float64))
-            fh.write(self.time_file_dt.astype(numpy.float64))
-            fh.write(self.time_step_count.astype(numpy.uint32))
-
-            # Read remaining data from binary
-            fh.write(self.origo.astype(numpy.float64))
-            fh.write(self.L.astype(numpy.float64))
-            fh.write(self.num.astype(numpy.uint32))
-            fh.write(self.periodic.astype(numpy.uint32))
-            fh.write(self.adaptive.astype(numpy.uint32))
-
-            # Per-particle vectors
-            for i in numpy.arange(self.np):
-                fh.write(self.x[i,:].astype(numpy.float64))
-                fh.write(self.radius[i].astype(numpy.float64))
-
-            if self.np[0] > 0:
-                fh.write(self.xyzsum.astype(numpy.float64))
-
-            for i in numpy.arange(self.np):
-                fh.write(self.vel[i,:].astype(numpy.float64))
-                fh.write(self.fixvel[i].astype(numpy.float64))
-
-            if self.np[0] > 0:
-                fh.write(self.force.astype(numpy.float64))
-
-                fh.write(self.angpos.astype(numpy.float64))
-                fh.write(self.angvel.astype(numpy.float64))
-                fh.write(self.torque.astype(numpy.float64))
-
-                # Per-particle single-value parameters
-                fh.write(self.es_dot.astype(numpy.float64))
-                fh.write(self.es.astype(numpy.float64))
-                fh.write(self.ev_dot.astype(numpy.float64))
-                fh.write(self.ev.astype(numpy.float64))
-                fh.write(self.p.astype(numpy.float64))
-
-            fh.write(self.g.astype(numpy.float64))
-            fh.write(self.k_n.astype(numpy.float64))
-            fh.write(self.k_t.astype(numpy.float64))
-            fh.write(self.k_r.astype(numpy.float64))
-            fh.write(self.E.astype(numpy.float64))
-            fh.write(self.gamma_n.astype(numpy.float64))
-            fh.write(self.gamma_t.astype(numpy.float64))
-            fh.write(self.gamma_r.astype(numpy.float64))
-            fh.write(self.mu_s.astype(numpy.float64))
-            fh.write(self.mu_d.astype(numpy.float64))
-            fh.write(self.mu_r.astype(numpy.float64))
-            fh.write(self.gamma_wn.astype(numpy.float64))
-            fh.write(self.gamma_wt.astype(numpy.float64))
-            fh.write(self.mu_ws.astype(numpy.float64))
-            fh.write(self.mu_wd.astype(numpy.float64))
-            fh.write(self.rho.astype(numpy.float64))
-            fh.write(self.contactmodel.astype(numpy.uint32))
-            fh.write(self.kappa.astype(numpy.float64))
-            fh.write(self.db.astype(numpy.float64))
-            fh.write(self.V_b.astype(numpy.float64))
-
-            fh.write(self.nw.astype(numpy.uint32))
-            for i in numpy.arange(self.nw[0]):
-                fh.write(self.wmode[i].astype(numpy.int32))
-            for i in numpy.arange(self.nw[0]):
-                fh.write(self.w_n[i,:].astype(numpy.float64))
-                fh.write(self.w_x[i].astype(numpy.float64))
-
-            for i in numpy.arange(self.nw[0]):
-                fh.write(self.w_m[i].astype(numpy.float64))
-                fh.write(self.w_vel[i].astype(numpy.float64))
-                fh.write(self.w_force[i].astype(numpy.float64))
-                fh.write(self.w_sigma0[i].astype(numpy.float64))
-            fh.write(self.w_sigma0_A.astype(numpy.float64))
-            fh.write(self.w_sigma0_f.astype(numpy.float64))
-            fh.write(self.w_tau_x.astype(numpy.float64))
-
-            fh.write(self.lambda_bar.astype(numpy.float64))
-            fh.write(self.nb0.astype(numpy.uint32))
-            fh.write(self.sigma_b.astype(numpy.float64))
-            fh.write(self.tau_b.astype(numpy.float64))
-            for i in numpy.arange(self.nb0[0]):
-                fh.write(self.bonds[i,0].astype(numpy.uint32))
-                fh.write(self.bonds[i,1].astype(numpy.uint32))
-            fh.write(self.bonds_delta_n.astype(numpy.float64))
-            fh.write(self.bonds_delta_t.astype(numpy.float64))
-            fh.write(self.bonds_omega_n.astype(numpy.float64))
-            fh.write(self.bonds_omega_t.astype(numpy.float64))
-
             if self.fluid:
-
-                fh.write(self.cfd_solver.astype(numpy.int32))
-                fh.write(self.mu.astype(numpy.float64))
-                for z in numpy.arange(self.num[2]):
-                    for y in numpy.arange(self.num[1]):
-                        for x in numpy.arange(self.num[0]):
-                            fh.write(self.v_f[x,y,z,0].astype(numpy.float64))
-                            fh.write(self.v_f[x,y,z,1].astype(numpy.float64))
-                            fh.write(self.v_f[x,y,z,2].astype(numpy.float64))
-                            fh.write(self.p_f[x,y,z].astype(numpy.float64))
-                            fh.write(self.phi[x,y,z].astype(numpy.float64))
-                            fh.write(self.dphi[x,y,z].astype(numpy.float64)*
-                                    self.time_dt*self.ndem)
-
-                fh.write(self.rho_f.astype(numpy.float64))
-                fh.write(self.p_mod_A.astype(numpy.float64))
-                fh.write(self.p_mod_f.astype(numpy.float64))
-                fh.write(self.p_mod_phi.astype(numpy.float64))
-
-                if self.cfd_solver[0] == 1:  # Sides only adjustable with Darcy
-                    fh.write(self.bc_xn.astype(numpy.int32))
-                    fh.write(self.bc_xp.astype(numpy.int32))
-                    fh.write(self.bc_yn.astype(numpy.int32))
-                    fh.write(self.bc_yp.astype(numpy.int32))
-
-                fh.write(self.bc_bot.astype(numpy.int32))
-                fh.write(self.bc_top.astype(numpy.int32))
-                fh.write(self.free_slip_bot.astype(numpy.int32))
-                fh.write(self.free_slip_top.astype(numpy.int32))
-                fh.write(self.bc_bot_flux.astype(numpy.float64))
-                fh.write(self.bc_top_flux.astype(numpy.float64))
-
-                for z in numpy.arange(self.num[2]):
-                    for y in numpy.arange(self.num[1]):
-                        for x in numpy.arange(self.num[0]):
-                            fh.write(self.p_f_constant[x,y,z].astype(
-                                numpy.int32))
-
-                # Navier Stokes
-                if self.cfd_solver[0] == 0:
-                    fh.write(self.gamma.astype(numpy.float64))
-                    fh.write(self.theta.astype(numpy.float64))
-                    fh.write(self.beta.astype(numpy.float64))
-                    fh.write(self.tolerance.astype(numpy.float64))
-                    fh.write(self.maxiter.astype(numpy.uint32))
-                    fh.write(self.ndem.astype(numpy.uint32))
-
-                    fh.write(self.c_phi.astype(numpy.float64))
-                    fh.write(self.c_v.astype(numpy.float64))
-                    fh.write(self.dt_dem_fac.astype(numpy.float64))
-
-                    for i in numpy.arange(self.np):
-                        fh.write(self.f_d[i,:].astype(numpy.float64))
-                    for i in numpy.arange(self.np):
-                        fh.write(self.f_p[i,:].astype(numpy.float64))
-                    for i in numpy.arange(self.np):
-                        fh.write(self.f_v[i,:].astype(numpy.float64))
-                    for i in numpy.arange(self.np):
-                        fh.write(self.f_sum[i,:].astype(numpy.float64))
-
-                # Darcy
-                elif self.cfd_solver[0] == 1:
-
-                    fh.write(self.tolerance.astype(numpy.float64))
-                    fh.write(self.maxiter.astype(numpy.uint32))
-                    fh.write(self.ndem.astype(numpy.uint32))
-                    fh.write(self.c_phi.astype(numpy.float64))
-                    for i in numpy.arange(self.np):
-                        fh.write(self.f_p[i,:].astype(numpy.float64))
-                    fh.write(self.beta_f.astype(numpy.float64))
-                    fh.write(self.k_c.astype(numpy.float64))
-
-                else:
+                cfd_solver = self.cfd_solver[0]
+                if cfd_solver != 0 and cfd_solver != 1:
                     raise Exception('Value of cfd_solver not understood (' + \
                             str(self.cfd_solver[0]) + ')')
-
-
-            fh.write(self.color.astype(numpy.int32))
+            else:
+                cfd_solver = 0
+
+            # The file is written in the current format. Each section is
+            # assembled as one contiguous array and written with a single call.
+            # Values that are interleaved per particle, wall or fluid cell are
+            # assembled with a structured dtype.
+            layout = binaryLayout(VERSION, self.nd[0], self.np[0], self.nw[0],
+                    self.nb0[0], self.num, self.fluid, cfd_solver)
+            grid_fields = ['v_f', 'p_f', 'phi', 'dphi', 'p_f_constant']
+
+            def value(field):
+                values = getattr(self, field)
+                if field == 'dphi':
+                    values = values*self.time_dt*self.ndem
+                if field in grid_fields:
+                    values = numpy.asarray(values)
+                    if values.ndim == 4:
+                        values = values.transpose(2, 1, 0, 3)
+                    else:
+                        values = values.T
+                return values
+
+            for name, dtype, shape, offset, fill in layout:
+                if isinstance(name, tuple):
+                    block = numpy.empty(shape, dtype=dtype)
+                    for field in name:
+                        block[field] = value(field)
+                else:
+                    block = numpy.ascontiguousarray(value(name), dtype=dtype)\
+                            .reshape(shape)
+                fh.write(block)
 
         finally:
             if fh is not None:
@@ -2295,7 +2395,7 @@ class sim:
         fn = '../output/' + self.sid + '.output00001.bin'
         self.readbin(fn, verbose)
 
-    def readstep(self, step, verbose=True):
+    def readstep(self, step, verbose=True, mmap=False, fields=None):
         '''
         Read a output file from the ``../output/`` folder, corresponding
         to the object simulation id (``self.sid``).
@@ -2304,32 +2404,48 @@ class sim:
         :type step: int
         :param verbose: Display diagnostic information (default = True)
         :type verbose: bool
+        :param mmap: Map the large arrays into memory instead of reading
+            them, see :func:`readbin()` (default = False)
+        :type mmap: bool
+        :param fields: Only read these values, see :func:`readbin()`
+            (default = None)
+        :type fields: list of str
+
+        If the output file does not exist, the step is read from the archive
+        written by :class:`OutputArchive`, if any. The ``mmap`` argument is
+        ignored for archived steps.
 
         See also :func:`readbin()`, :func:`readfirst()`, :func:`readlast()`,
         and :func:`readsecond`.
         '''
         fn = "../output/{0}.output{1:0=5}.bin".format(self.sid, step)
-        self.readbin(fn, verbose)
+        archive = OutputArchive(self.sid)
+        if not os.path.isfile(fn) and archive.exists():
+            archive.read(step, self, verbose, fields=fields)
+        else:
+            self.readbin(fn, verbose, mmap=mmap, fields=fields)
 
-    def readlast(self, verbose=True):
+    def readlast(self, verbose=True, mmap=False):
         '''
         Read the last output file from the ``../output/`` folder, corresponding
         to the object simulation id (``self.sid``).
 
         :param verbose: Display diagnostic information (default = True)
         :type verbose: bool
+        :param mmap: Map the large arrays into memory instead of reading
+            them, see :func:`readbin()` (default = False)
+        :type mmap: bool
 
         See also :func:`readbin()`, :func:`readfirst()`, :func:`readsecond`, and
         :func:`readstep`.
         '''
-        lastfile = status(self.sid)
-        fn = "../output/{0}.output{1:0=5}.bin".format(self.sid, lastfile)
-        self.readbin(fn, verbose)
+        self.readstep(status(self.sid), verbose, mmap=mmap)
 
     def readTime(self, time, verbose=True):
         '''
         Read the output file most closely corresponding to the time given as an
-        argument.
+        argument. The file is found by binary search in the output file index,
+        see :class:`SimSeries`.
 
         :param time: The desired current time [s]
         :type time: float
@@ -2337,23 +2453,345 @@ class sim:
         See also :func:`readbin()`, :func:`readfirst()`, :func:`readsecond`, and
         :func:`readstep`.
         '''
+        self.readstep(SimSeries(self.sid).step(time), verbose=verbose)
 
-        self.readfirst(verbose=False)
-        t_first = self.currentTime()
-        n_first = self.time_step_count[0]
+    def stepSeries(self, name, reducer, firststep=0, laststep=None,
+            fields=None, cache=True, workers=1, chunksize=1):
+        '''
+        Compute values from each output file of the simulation. The function
+        ``reducer`` is called with a ``sim`` object holding each output step,
+        and returns a dictionary of values (numbers or arrays of constant
+        shape) for the step.
 
-        self.readlast(verbose=False)
-        t_last = self.currentTime()
-        n_last = self.time_step_count[0]
+        The values are cached in the columnar file
+        ``../output/<sid>.<name>.cache.npz`` together with the size and
+        modification time of the output file they were computed from, see
+        :class:`SimSeries`. Later calls only read output files that are new or
+        have changed since the values were cached.
 
-        if time < t_first or time > t_last:
-            raise Exception('Error: The specified time {} s is outside the ' +
-                    'range of output files [{}; {}] s.'.format(time, \
-                            t_first, t_last))
+        :param name: The name of the cached values, which should be unique for
+            each reducer
+        :type name: str
+        :param reducer: Function computing the values of an output step
+        :type reducer: function
+        :param firststep: The first output step (default = 0)
+        :type firststep: int
+        :param laststep: The last output step (default = None, which uses the
+            last output file)
+        :type laststep: int
+        :param fields: Only read these values from the output files, see
+            :func:`readbin()` (default = None, which reads all values)
+        :type fields: list of str
+        :param cache: Read and update the cache file (default = True)
+        :type cache: bool
+        :param workers: The number of worker processes reading the output
+            files that are not cached, see :func:`mapSteps()` (default = 1)
+        :type workers: int
+        :param chunksize: The number of steps sent to a worker at a time
+            (default = 1)
+        :type chunksize: int
+        :returns: The values of each step, stacked in arrays with one row per
+            output step from ``firststep`` to ``laststep``
+        :return type: dict
+        '''
+        series = SimSeries(self.sid)
+        if laststep is None:
+            laststep = len(series) - 1
+        steps = range(firststep, laststep + 1)
+        cachefile = os.path.join(series.folder,
+                '{0}.{1}.cache.npz'.format(self.sid, name))
+
+        # Use the cached values of output files that are unchanged
+        values = {}
+        if cache and os.path.isfile(cachefile):
+            data = numpy.load(cachefile)
+            columns = [c for c in data.files
+                    if c not in ['step', 'size', 'mtime']]
+            for row in range(len(data['step'])):
+                step = int(data['step'][row])
+                if step < len(series) and \
+                        data['size'][row] == series.size[step] and \
+                        data['mtime'][row] == series.mtime[step]:
+                    values[step] = dict((c, data[c][row]) for c in columns)
+
+        missing = [step for step in steps if step not in values]
+        results = mapStepValues(self.sid, missing, reducer, self.fluid, fields,
+                workers, chunksize)
+        values.update(zip(missing, results))
+        changed = len(missing) > 0
+
+        if cache and changed:
+            cached = sorted(step for step in values if step < len(series))
+            columns = {}
+            if len(cached) > 0:
+                for c in values[cached[0]]:
+                    columns[c] = numpy.array([values[step][c]
+                        for step in cached])
+            fh = None
+            try:
+                fh = open(cachefile + '.tmp', 'wb')
+                numpy.savez(fh, step=numpy.array(cached, dtype=numpy.int64),
+                        size=series.size[cached], mtime=series.mtime[cached],
+                        **columns)
+            finally:
+                if fh is not None:
+                    fh.close()
+            os.rename(cachefile + '.tmp', cachefile)
+
+        result = {}
+        if len(steps) > 0:
+            for c in values[steps[0]]:
+                result[c] = numpy.array([values[step][c] for step in steps])
+        return result
+
+    def mapSteps(self, reducer, firststep=0, laststep=None, workers=None,
+            chunksize=1, fields=None):
+        '''
+        Compute values from each output file of the simulation in parallel.
+        The function ``reducer`` is called with a ``sim`` object holding each
+        output step, and the output steps are distributed over a pool of
+        worker processes. The reducer must be defined at the module level, so
+        that it can be sent to the worker processes.
+
+        :param reducer: Function computing the values of an output step. It
+            can return a number, an array, a tuple or a dictionary of these.
+        :type reducer: function
+        :param firststep: The first output step (default = 0)
+        :type firststep: int
+        :param laststep: The last output step (default = None, which uses the
+            last output file)
+        :type laststep: int
+        :param workers: The number of worker processes (default = None, which
+            uses one process per CPU). With a value of 1 the steps are read in
+            the current process.
+        :type workers: int
+        :param chunksize: The number of steps sent to a worker at a time
+            (default = 1)
+        :type chunksize: int
+        :param fields: Only read these values from the output files, see
+            :func:`readbin()` (default = None, which reads all values)
+        :type fields: list of str
+        :returns: The values of each step in step order, stacked in arrays
+            with one row per step. Tuples and dictionaries are stacked per
+            element.
+        :return type: numpy.array, tuple or dict
+        '''
+        if laststep is None:
+            laststep = len(SimSeries(self.sid)) - 1
+        results = mapStepValues(self.sid, range(firststep, laststep + 1),
+                reducer, self.fluid, fields, workers, chunksize)
+
+        if len(results) > 0 and isinstance(results[0], dict):
+            return dict((key, numpy.array([r[key] for r in results]))
+                    for key in results[0])
+        elif len(results) > 0 and isinstance(results[0], tuple):
+            return tuple(numpy.array([r[i] for r in results])
+                    for i in range(len(results[0])))
+        else:
+            return numpy.array(results)
+
+    def iterSteps(self, start=0, stop=None, stride=1, fields=None,
+            verbose=False, prefetch=1):
+        '''
+        Iterate over the output files of the simulation. The object itself is
+        updated with the values of each output step and yielded. The arrays of
+        the object are filled in place when their shape is unchanged, instead
+        of being allocated again for every step, so arrays from a previous step
+        must be copied if they are to be kept. The next output files are read
+        from disk on a background thread while the caller works on the current
+        step. Example:
+
+            sb = sphere.sim('shear', fluid=True)
+            for sb in sb.iterSteps(fields=['time_current', 'x', 'p_f']):
+                print(sb.time_current[0], sb.p_f.mean())
+
+        :param start: The first output step (default = 0)
+        :type start: int
+        :param stop: The output step after the last step (default = None,
+            which iterates to the last output file)
+        :type stop: int
+        :param stride: The increment of the output step number (default = 1)
+        :type stride: int
+        :param fields: Only read these values from the output files, see
+            :func:`readbin()` (default = None, which reads all values)
+        :type fields: list of str
+        :param verbose: Show the names of the output files (default = False)
+        :type verbose: bool
+        :param prefetch: The number of output files read ahead of the current
+            step, see :func:`prefetchSteps()`. With a value of 0 each file is
+            read when the step is reached (default = 1)
+        :type prefetch: int
+        :returns: The object, holding the values of each output step in turn
+        :return type: generator of sim
+        '''
+        if stop is None:
+            stop = len(SimSeries(self.sid))
+        steps = range(start, stop, stride)
+        buffers = {}
+        if prefetch > 0:
+            contents = prefetchSteps(self.sid, steps, prefetch)
+        try:
+            for step in steps:
+                fn = "../output/{0}.output{1:0=5}.bin".format(self.sid, step)
+                if prefetch > 0:
+                    fh = io.BytesIO(next(contents))
+                elif os.path.isfile(fn):
+                    fh = open(fn, 'rb')
+                else:
+                    self.readstep(step, verbose, fields=fields)
+                    yield self
+                    continue
+
+                if verbose:
+                    print("Input file: {0}".format(fn))
+                try:
+                    layout = readBinaryLayout(fh, self.fluid)
+                    self.readLayout(fh, layout, fields=fields,
+                            buffers=buffers)
+                finally:
+                    self.version[0] = VERSION
+                    fh.close()
+                yield self
+        finally:
+            if prefetch > 0:
+                contents.close()
+
+    def exportSeries(self, format='parquet',
+            fields=['x', 'vel', 'force', 'xyzsum'], start=0, stop=None,
+            stride=1, filename=None, rows=1000000, verbose=True):
+        '''
+        Export particle values of all output steps as a long-format table with
+        one row per particle and step. The table has the columns ``step`` and
+        ``id`` (the particle index), and a column for each of the particle
+        values in ``fields``. Vector values are stored as fixed size lists.
+        The output files are read one at a time with :func:`iterSteps()`, so
+        the memory use does not grow with the number of steps.
+
+        With ``format='parquet'``, the table is written to an Apache Parquet
+        file with one row group per step, using the ``pyarrow`` module. The
+        Arrow arrays share memory with the arrays of the object. If
+        ``pyarrow`` is not available, or with ``format='npy'``, the columns
+        are written in shards of at most ``rows`` rows to ``.npy`` files named
+        ``<column>.NNNNN.npy`` in a folder, with vector values as
+        two-dimensional arrays.
+
+        :param format: The output format, 'parquet' or 'npy'
+            (default = 'parquet')
+        :type format: str
+        :param fields: The particle values to export
+            (default = ['x', 'vel', 'force', 'xyzsum'])
+        :type fields: list of str
+        :param start: The first output step (default = 0)
+        :type start: int
+        :param stop: The output step after the last step (default = None,
+            which exports to the last output file)
+        :type stop: int
+        :param stride: The increment of the output step number (default = 1)
+        :type stride: int
+        :param filename: The output file or folder (default = None, which
+            uses ``../output/<sid>.parquet`` or ``../output/<sid>.series/``)
+        :type filename: str
+        :param rows: The number of rows per ``.npy`` shard (default = 1000000)
+        :type rows: int
+        :param verbose: Show the name of the output file or folder
+            (default = True)
+        :type verbose: bool
+        :returns: The path of the output file or folder
+        :return type: str
+        '''
+        if format == 'parquet' and not py_arrow:
+            print('Warning: Could not find "pyarrow" python module. ' +
+                    'Writing .npy shards instead')
+            format = 'npy'
+        if format not in ['parquet', 'npy']:
+            raise Exception('Error: The export format "{}" is not '
+                    'supported'.format(format))
+        if filename is None:
+            if format == 'parquet':
+                filename = '../output/' + self.sid + '.parquet'
+            else:
+                filename = '../output/' + self.sid + '.series'
+        if stop is None:
+            stop = len(SimSeries(self.sid))
+
+        names = ['step', 'id'] + list(fields)
+        if format == 'npy':
+            if not os.path.isdir(filename):
+                os.makedirs(filename)
+            for fn in os.listdir(filename):
+                if fn.split('.')[0] in names and fn.endswith('.npy'):
+                    os.remove(os.path.join(filename, fn))
+
+        writer = None
+        shard = dict((name, []) for name in names)
+        shard_rows = 0
+        shard_number = 0
+        ids = numpy.zeros(0, dtype=numpy.uint32)
+        try:
+            for i, sb in enumerate(self.iterSteps(start, stop, stride,
+                fields=list(fields))):
+                step = start + i*stride
+                np = int(self.np[0])
+                if len(ids) != np:
+                    ids = numpy.arange(np, dtype=numpy.uint32)
+                values = [numpy.full(np, step, dtype=numpy.uint32), ids]
+                for field in fields:
+                    value = getattr(self, field)
+                    if not isinstance(value, numpy.ndarray) or \
+                            value.ndim < 1 or value.shape[0] != np:
+                        raise Exception('Error: "{}" is not a particle '
+                                'value'.format(field))
+                    values.append(value)
+
+                if format == 'parquet':
+                    columns = []
+                    for value in values:
+                        array = pyarrow.array(value.reshape(-1))
+                        if value.ndim == 2:
+                            array = pyarrow.FixedSizeListArray.from_arrays(
+                                    array, value.shape[1])
+                        columns.append(array)
+                    table = pyarrow.Table.from_arrays(columns, names=names)
+                    if writer is None:
+                        writer = pyarrow.parquet.ParquetWriter(filename,
+                                table.schema)
+                    writer.write_table(table)
+                    continue
+
+                # The arrays of the object are refilled for the next step
+                for name, value in zip(names, values):
+                    shard[name].append(value.copy())
+                shard_rows += np
+                if shard_rows >= rows:
+                    self.writeShard(filename, shard_number, shard)
+                    shard_number += 1
+                    shard_rows = 0
+            if format == 'npy' and shard_rows > 0:
+                self.writeShard(filename, shard_number, shard)
+        finally:
+            if writer is not None:
+                writer.close()
 
-        dt_dn = (t_last - t_first)/(n_last - n_first)
-        step = int((time - t_first)/dt_dn) + n_first + 1
-        self.readstep(step, verbose=verbose)
+        if verbose:
+            print(filename)
+        return filename
+
+    def writeShard(self, folder, number, shard):
+        '''
+        Write the columns of a shard from :func:`exportSeries()` to ``.npy``
+        files, and empty the shard.
+
+        :param folder: The output folder
+        :type folder: str
+        :param number: The shard number
+        :type number: int
+        :param shard: The arrays of each step, by column name
+        :type shard: dict
+        '''
+        for name in shard:
+            numpy.save(os.path.join(folder, '{0}.{1:0=5}.npy'.format(name,
+                number)), numpy.concatenate(shard[name]))
+            shard[name] = []
 
     def generateRadii(self, psd = 'logn',
             mean = 440e-6,
@@ -2549,7 +2987,8 @@ class sim:
         '''
         self.adaptive[0] = 0
 
-    def initRandomPos(self, gridnum = numpy.array([12, 12, 36])):
+    def initRandomPos(self, gridnum = numpy.array([12, 12, 36]), dx=-1,
+            trials=10000, verbose=True):
         '''
         Initialize particle positions in completely random configuration. Radii
         *must* be set beforehand. If the x and y boundaries are set as periodic,
@@ -2557,52 +2996,281 @@ class sim:
         non-periodic boundaries, the particles are restrained at the edges to
         make space for their radii within the bounding box.
 
+        The positions are found by random sequential addition: particles are
+        given random positions until they do not overlap any of the particles
+        placed before them. All particles that are not yet placed are given new
+        positions at the same time, several at a time when few particles
+        remain, and the overlaps are found with a cell list
+        (:class:`CellList`), so that each position is only compared to the
+        particles in the neighbouring cells. Overlaps across periodic
+        boundaries are included.
+
         :param gridnum: The number of sorting cells in each spatial direction
             (default = [12, 12, 36])
         :type gridnum: numpy.array
         :param dx: The cell width in any direction. If the default value is used
             (-1), the cell width is calculated to fit the largest particle.
         :type dx: float
+        :param trials: The largest number of positions to try for each
+            particle (default = 10000)
+        :type trials: int
+        :param verbose: Show the packing fraction (default = True)
+        :type verbose: bool
+        :returns: The packing fraction, i.e. the volume of the particles
+            relative to the volume of the domain
+        :return type: float
         '''
 
         # Calculate cells in grid
-        self.num = gridnum
+        self.num = numpy.asarray(gridnum)
 
         # Cell configuration
+        r_max = numpy.amax(self.radius)
         if dx > 0.0:
             cellsize = dx
         else:
-            cellsize = 2.1 * numpy.amax(self.radius)
+            cellsize = 2.1 * r_max
 
         # World size
         self.L = self.num * cellsize
 
+        # Range of the particle positions
+        periodic = numpy.zeros(self.nd[0], dtype=bool)
+        if self.periodic[0] == 1:
+            periodic[:2] = True
+        elif self.periodic[0] == 2:
+            periodic[0] = True
+        margin = numpy.where(periodic, 0.0, self.radius[:, None])
+        lower = self.origo + margin
+        width = self.L - self.origo - 2.0*margin
+        if numpy.any(width < 0.0):
+            raise Exception('Error: The particles do not fit in the world. '
+                    + 'Please increase the world size.')
 
         # Particle positions randomly distributed without overlap
-        for i in range(self.np):
-            overlaps = True
-            while overlaps:
-                overlaps = False
-
-                # Draw random position
-                for d in range(self.nd[0]):
-                    self.x[i,d] = (self.L[d] - self.origo[d] - 2*r_max) \
-                            * numpy.random.random_sample() \
-                            + self.origo[d] + r_max
-
-                # Check other particles for overlaps
-                for j in range(i-1):
-                    delta = self.x[i] - self.x[j]
-                    delta_len = math.sqrt(numpy.dot(delta,delta)) \
-                            - (self.radius[i] + self.radius[j])
-                    if delta_len < 0.0:
-                        overlaps = True
-            print("\rFinding non-overlapping particle positions, "
-                    + "{0} % complete".format(numpy.ceil(i/self.np[0]*100)))
-
-        # Print newline
-        print()
+        placed = numpy.zeros(0, dtype=numpy.int64)
+        remaining = numpy.arange(self.np[0])
+        tried = numpy.zeros(self.np[0], dtype=numpy.int64)
+        while len(remaining) > 0 and tried[remaining].max() < trials:
+
+            # Draw random positions, several for each particle when few
+            # particles remain
+            m = len(remaining)
+            k = int(max(1, min(trials - tried[remaining].max(), 65536//m)))
+            candidate = numpy.repeat(remaining, k)
+            position = lower[candidate] + width[candidate] \
+                    * numpy.random.random_sample((m*k, self.nd[0]))
+
+            # Find the positions that do not overlap the placed particles, and
+            # use the first of these for each particle
+            free = numpy.ones(m*k, dtype=bool)
+            if len(placed) > 0:
+                q, j, vector = CellList(self.x[placed], 2.0*r_max, self.origo,
+                        self.L, self.periodic[0]).within(position, 2.0*r_max)
+                overlap = numpy.sum(vector**2, axis=1) < \
+                        (self.radius[candidate[q]] + self.radius[placed[j]])**2
+                free[q[overlap]] = False
+            free = free.reshape(m, k)
+            first = numpy.where(free.any(axis=1), numpy.argmax(free, axis=1),
+                    k - 1)
+            tried[remaining] += first + 1
+            found = numpy.nonzero(free.any(axis=1))[0]
+            position = position.reshape(m, k, -1)[found, first[found]]
+
+            # Keep the positions that do not overlap the new positions of
+            # particles with lower indexes
+            i, j, vector = CellList(position, 2.0*r_max, self.origo, self.L,
+                    self.periodic[0]).pairs(2.0*r_max)
+            overlap = numpy.sum(vector**2, axis=1) < \
+                    (self.radius[remaining[found[i]]]
+                            + self.radius[remaining[found[j]]])**2
+            accepted = numpy.ones(len(found), dtype=bool)
+            accepted[j[overlap]] = False
+
+            self.x[remaining[found[accepted]]] = position[accepted]
+            placed = numpy.concatenate((placed, remaining[found[accepted]]))
+            kept = numpy.ones(m, dtype=bool)
+            kept[found[accepted]] = False
+            remaining = remaining[kept]
+
+        if len(remaining) > 0:
+            raise Exception('Error: Could not place {} particles without '
+                    .format(len(remaining))
+                    + 'overlaps after {} trials. '.format(trials)
+                    + 'Please increase the world size.')
+
+        packing = numpy.sum(V_sphere(self.radius))/numpy.prod(self.L
+                - self.origo)
+        if verbose:
+            print('Packing fraction: {0:.3f}'.format(packing))
+        return packing
+
+    def initDensePos(self, packing=0.6, gridnum=numpy.array([12, 12, 36]),
+            dx=-1, growth=0.01, tolerance=1e-4, iterations=100000,
+            verbose=True):
+        '''
+        Initialize particle positions in a dense, random configuration with a
+        prescribed packing fraction. Radii *must* be set beforehand, e.g. with
+        :func:`generateRadii()` or :func:`generateBimodalRadii()`. The width
+        of the world along x and y is given by ``gridnum``, and the particles
+        are packed from the bottom of the world to the height where they
+        occupy the volume fraction ``packing``. If the x and y boundaries are
+        set as periodic, the particles are packed across them, otherwise the
+        particles are kept within the world edges.
+
+        The packing is found by collective rearrangement: the particles are
+        given random positions, and their radii are scaled down until the
+        packing fraction is low. The overlaps are then repeatedly removed by
+        moving the particles of each overlapping pair apart, and the radii are
+        grown in small steps each time the largest overlap is smaller than the
+        growth step. The packing is done when the radii are back at their
+        original values and the largest overlap is below ``tolerance``. The
+        overlapping pairs are found with a cell list (:class:`CellList`) of
+        neighbour pairs, which is only updated when the particles have moved
+        far enough to form new contacts. This replaces the consolidation of a
+        loose packing from :func:`initRandomGridPos()` before the first
+        simulation. Packing fractions up to around 0.6 are reached quickly
+        with periodic x and y boundaries, while denser packings, or packings
+        between walls, may need many iterations.
+
+        The world height and the number of sorting cells in the z direction
+        are set to fit the packing, leaving space for a wall at its top.
+
+        :param packing: The volume of the particles relative to the volume of
+            the packed part of the world (default = 0.6)
+        :type packing: float
+        :param gridnum: The number of sorting cells in the x and y directions.
+            The number of cells in the z direction is found from the packing
+            fraction. (default = [12, 12, 36])
+        :type gridnum: numpy.array
+        :param dx: The cell width in any direction. If the default value is used
+            (-1), the cell width is calculated to fit the largest particle.
+        :type dx: float
+        :param growth: The relative increase of the radii in each growth step
+            (default = 0.01)
+        :type growth: float
+        :param tolerance: The largest remaining overlap relative to the sum of
+            the radii of the overlapping particles (default = 1e-4)
+        :type tolerance: float
+        :param iterations: The largest number of rearrangements
+            (default = 100000)
+        :type iterations: int
+        :param verbose: Show the packing fraction and the number of
+            rearrangements (default = True)
+        :type verbose: bool
+        :returns: The packing fraction of the packed part of the world
+        :return type: float
+        '''
 
+        # Cell configuration
+        r_max = numpy.amax(self.radius)
+        if dx > 0.0:
+            cellsize = dx
+        else:
+            cellsize = 2.1 * r_max
+
+        # World size, where the packed height gives the packing fraction
+        self.num[:2] = numpy.asarray(gridnum)[:2]
+        self.L[:2] = self.origo[:2] + self.num[:2]*cellsize
+        height = numpy.sum(V_sphere(self.radius)) \
+                / (packing*numpy.prod(self.L[:2] - self.origo[:2]))
+        upper = self.L.copy()
+        upper[2] = self.origo[2] + height
+        self.num[2] = numpy.ceil(height/cellsize)
+        self.L[2] = self.origo[2] + self.num[2]*cellsize
+
+        periodic = numpy.zeros(self.nd[0], dtype=bool)
+        if self.periodic[0] == 1:
+            periodic[:2] = True
+        elif self.periodic[0] == 2:
+            periodic[0] = True
+        if numpy.any(upper - self.origo < 2.0*r_max):
+            raise Exception('Error: The particles do not fit in the world. '
+                    + 'Please increase the world size.')
+
+        # Random positions with the radii scaled to a packing fraction of 0.2
+        scale = min(1.0, (0.2/packing)**(1.0/3.0))
+        margin = numpy.where(periodic, 0.0, scale*self.radius[:, None])
+        self.x[:,:] = self.origo + margin + (upper - self.origo - 2.0*margin) \
+                * numpy.random.random_sample((self.np[0], self.nd[0]))
+
+        # The pairs closer than the largest contact distance plus a skin are
+        # kept until the particles have moved far enough for other pairs to
+        # come into contact
+        skin = 0.4*r_max
+        moved = numpy.inf
+
+        # Part of the previous displacement added to the next, which speeds up
+        # the removal of overlaps in dense packings
+        momentum = 0.9
+        step = numpy.zeros_like(self.x)
+
+        iteration = 0
+        while True:
+            radius = scale*self.radius
+
+            if moved > skin:
+                cells = CellList(self.x, 2.0*scale*r_max + skin, self.origo,
+                        upper, self.periodic[0])
+                i, j, vector = cells.pairs(2.0*scale*r_max + skin)
+                x_list = self.x.copy()
+                scale_list = scale
+
+            vector = cells.nearestImage(self.x[j] - self.x[i])
+            distance = numpy.sqrt(numpy.sum(vector**2, axis=1))
+            overlap = numpy.maximum(radius[i] + radius[j] - distance, 0.0)
+
+            # Grow the radii when the overlaps are smaller than the growth
+            # step, and stop when the overlaps of the full radii are below the
+            # tolerance
+            if len(overlap) > 0:
+                largest = numpy.max(overlap/(radius[i] + radius[j]))
+            else:
+                largest = 0.0
+            if scale == 1.0 and largest < tolerance:
+                break
+            if iteration >= iterations:
+                raise Exception('Error: Could not reach a packing fraction of '
+                        + '{} after {} iterations. '.format(packing,
+                            iterations)
+                        + 'Please increase the number of iterations or '
+                        + 'lower the packing fraction.')
+            iteration += 1
+
+            # Move the particles of each overlapping pair apart by half of
+            # their overlap each
+            x_previous = self.x.copy()
+            push = (0.5*overlap/numpy.maximum(distance, 1e-300))[:, None] \
+                    * vector
+            for d in range(self.nd[0]):
+                self.x[:,d] += momentum*step[:,d] \
+                        + numpy.bincount(j, weights=push[:,d],
+                                minlength=self.np[0]) \
+                        - numpy.bincount(i, weights=push[:,d],
+                                minlength=self.np[0])
+
+            # Keep the particles inside the world
+            for d in range(self.nd[0]):
+                if periodic[d]:
+                    self.x[:,d] = self.origo[d] + (self.x[:,d] - self.origo[d])\
+                            % (upper[d] - self.origo[d])
+                else:
+                    self.x[:,d] = numpy.clip(self.x[:,d],
+                            self.origo[d] + radius, upper[d] - radius)
+            step = cells.nearestImage(self.x - x_previous)
+
+            if scale < 1.0 and largest < growth:
+                scale = min(1.0, scale*(1.0 + growth))
+            moved = 2.0*numpy.sqrt(numpy.max(numpy.sum(
+                cells.nearestImage(self.x - x_list)**2, axis=1))) \
+                        + 2.0*(scale - scale_list)*r_max
+
+        packing = numpy.sum(V_sphere(self.radius))/numpy.prod(upper
+                - self.origo)
+        if verbose:
+            print('Packing fraction: {0:.3f} ({1} iterations)'.format(packing,
+                iteration))
+        return packing
 
     def defineWorldBoundaries(self, L, origo=[0.0, 0.0, 0.0], dx=-1):
         '''
@@ -2746,8 +3414,6 @@ class sim:
             print("Error! The grid is not sufficiently large.")
             raise NameError('Error! The grid is not sufficiently large.')
 
-        gridpos = numpy.zeros(self.nd, dtype=numpy.uint32)
-
         # Make sure grid is sufficiently large if every second level is moved
         if self.periodic[0] == 1:
             self.num[0] -= 1
@@ -2758,25 +3424,22 @@ class sim:
             print("Error! The grid is not sufficiently large.")
             raise NameError('Error! The grid is not sufficiently large.')
 
+        # Find positions in 3d mesh from the linear particle indexes
+        i = numpy.arange(self.np[0])
+        gridpos = numpy.empty((self.np[0], 3), dtype=numpy.uint32)
+        gridpos[:,0] = i % self.num[0]
+        gridpos[:,1] = (i//self.num[0]) % self.num[0]
+        gridpos[:,2] = i//(self.num[0]*self.num[1])
 
-        # Particle positions randomly distributed without overlap
-        for i in range(self.np):
-
-            # Find position in 3d mesh from linear index
-            gridpos[0] = (i % (self.num[0]))
-            gridpos[1] = numpy.floor(i/(self.num[0])) % (self.num[0])
-            gridpos[2] = numpy.floor(i/((self.num[0])*(self.num[1]))) #\
-                    #% ((self.num[0])*(self.num[1]))
-
-            for d in range(self.nd[0]):
-                self.x[i,d] = gridpos[d] * cellsize + 0.5*cellsize
+        # Place particles in the cell centers
+        self.x[:,:] = gridpos[:,:self.nd[0]]*cellsize + 0.5*cellsize
 
-            # Allow pushing every 2.nd level out of lateral boundaries
-            if self.periodic[0] == 1:
-                # Offset every second level
-                if gridpos[2] % 2:
-                    self.x[i,0] += 0.5*cellsize
-                    self.x[i,1] += 0.5*cellsize
+        # Allow pushing every 2.nd level out of lateral boundaries
+        if self.periodic[0] == 1:
+            # Offset every second level
+            odd = gridpos[:,2] % 2 == 1
+            self.x[odd,0] += 0.5*cellsize
+            self.x[odd,1] += 0.5*cellsize
 
         # Readjust grid to correct size
         if self.periodic[0] == 1:
@@ -2817,22 +3480,21 @@ class sim:
             print("Error! The grid is not sufficiently large.")
             raise NameError('Error! The grid is not sufficiently large.')
 
-        gridpos = numpy.zeros(self.nd, dtype=numpy.uint32)
-
-        # Particle positions randomly distributed without overlap
-        for i in range(self.np):
-
-            # Find position in 3d mesh from linear index
-            gridpos[0] = (i % (coarsegrid[0]))
-            gridpos[1] = numpy.floor(i/(coarsegrid[0]))%(coarsegrid[1]) # Thanks Horacio!
-            gridpos[2] = numpy.floor(i/((coarsegrid[0])*(coarsegrid[1])))
-
-            # Place particles in grid structure, and randomly adjust the
-            # positions within the oversized cells (uniform distribution)
-            for d in range(self.nd[0]):
-                r = self.radius[i]*1.05
-                self.x[i,d] = gridpos[d] * cellsize \
-                        + ((cellsize-r) - r) * numpy.random.random_sample() + r
+        # Find positions in 3d mesh from the linear particle indexes
+        i = numpy.arange(self.np[0])
+        gridpos = numpy.empty((self.np[0], 3), dtype=numpy.uint32)
+        gridpos[:,0] = i % coarsegrid[0]
+        gridpos[:,1] = (i//coarsegrid[0]) % coarsegrid[1] # Thanks Horacio!
+        gridpos[:,2] = i//(coarsegrid[0]*coarsegrid[1])
+
+        # Place particles in grid structure, and randomly adjust the
+        # positions within the oversized cells (uniform distribution). The
+        # random numbers are drawn in the same particle-major order as a
+        # per-particle loop would draw them.
+        r = (self.radius*1.05).reshape(-1, 1)
+        self.x[:,:] = gridpos[:,:self.nd[0]]*cellsize \
+                + ((cellsize-r) - r) \
+                * numpy.random.random_sample((self.np[0], self.nd[0])) + r
 
         # Calculate new grid with cell size equal to max. particle diameter
         x_max = numpy.max(self.x[:,0] + self.radius)
@@ -2859,48 +3521,66 @@ class sim:
             overlap. The value is relative to the sum of the two radii.
         :type spacing: float
         '''
+        self.createBondPairs([i], [j], spacing)
+
+    def createBondPairs(self, i, j, spacing=-0.1):
+        '''
+        Bond the particles in ``i`` to the particles in ``j``. Each particle
+        in ``j`` is moved adjacent to its partner in ``i``, and oriented
+        randomly. All pairs are placed and bonded at once, so a particle should
+        only be part of one pair. The random orientations are drawn in the same
+        order as with :func:`createBondPair()` for one pair at a time.
+
+        :param i: Indexes of the first particles in the bonds
+        :type i: numpy.array
+        :param j: Indexes of the second particles in the bonds
+        :type j: numpy.array
+        :param spacing: The inter-particle distance prescribed. Positive
+            values result in a inter-particle distance, negative equal an
+            overlap. The value is relative to the sum of the two radii.
+        :type spacing: float
+        '''
+
+        i = numpy.asarray(i, dtype=numpy.int64).ravel()
+        j = numpy.asarray(j, dtype=numpy.int64).ravel()
+        if i.size != j.size:
+            raise Exception('Error: The number of first and second particles '
+                    + 'in the bonds differ ({} and {})'.format(i.size, j.size))
 
         x_i = self.x[i]
-        r_i = self.radius[i]
-        r_j = self.radius[j]
-        dist_ij = (r_i + r_j)*(1.0 + spacing)
+        dist_ij = (self.radius[i] + self.radius[j])*(1.0 + spacing)
 
-        dazi = numpy.random.rand(1) * 360.0  # azimuth
+        # Azimuth and angle of each pair
+        angles = numpy.random.random_sample((i.size, 2))
+        dazi = angles[:,0] * 360.0
         azi = numpy.radians(dazi)
-        dang = numpy.random.rand(1) * 180.0 - 90.0 # angle
+        dang = angles[:,1] * 180.0 - 90.0
         ang = numpy.radians(dang)
 
         x_j = numpy.copy(x_i)
-        x_j[0] = x_j[0] + dist_ij * numpy.cos(azi) * numpy.cos(ang)
-        x_j[1] = x_j[1] + dist_ij * numpy.sin(azi) * numpy.cos(ang)
-        x_j[2] = x_j[2] + dist_ij * numpy.sin(ang) * numpy.cos(azi)
-        self.x[j] = x_j
-
-        if self.x[j,0] < self.origo[0]:
-            self.x[j,0] += x_i[0] - x_j[0]
-        if self.x[j,1] < self.origo[1]:
-            self.x[j,1] += x_i[1] - x_j[1]
-        if self.x[j,2] < self.origo[2]:
-            self.x[j,2] += x_i[2] - x_j[2]
-
-        if self.x[j,0] > self.L[0]:
-            self.x[j,0] -= abs(x_j[0] - x_i[0])
-        if self.x[j,1] > self.L[1]:
-            self.x[j,1] -= abs(x_j[1] - x_i[1])
-        if self.x[j,2] > self.L[2]:
-            self.x[j,2] -= abs(x_j[2] - x_i[2])
-
-        self.bond(i,j)     # register bond
+        x_j[:,0] = x_j[:,0] + dist_ij * numpy.cos(azi) * numpy.cos(ang)
+        x_j[:,1] = x_j[:,1] + dist_ij * numpy.sin(azi) * numpy.cos(ang)
+        x_j[:,2] = x_j[:,2] + dist_ij * numpy.sin(ang) * numpy.cos(azi)
+
+        # Move particles placed outside the world back towards their partner
+        x_new = numpy.copy(x_j)
+        for d in range(3):
+            x_new[:,d] = numpy.where(x_new[:,d] < self.origo[d],
+                    x_new[:,d] + (x_i[:,d] - x_j[:,d]), x_new[:,d])
+            x_new[:,d] = numpy.where(x_new[:,d] > self.L[d],
+                    x_new[:,d] - numpy.abs(x_j[:,d] - x_i[:,d]), x_new[:,d])
+        self.x[j] = x_new
 
         # Check that the spacing is correct
-        x_ij = self.x[i] - self.x[j]
-        x_ij_length = numpy.sqrt(x_ij.dot(x_ij))
-        if (x_ij_length - dist_ij) > dist_ij*0.01:
-            print(x_i); print(r_i)
-            print(x_j); print(r_j)
-            print(x_ij_length); print(dist_ij)
-            raise Exception("Error, something went wrong in createBondPair")
+        x_ij_length = numpy.sqrt(numpy.sum((x_i - x_new)**2, axis=1))
+        wrong = numpy.nonzero((x_ij_length - dist_ij) > dist_ij*0.01)[0]
+        if wrong.size > 0:
+            n = wrong[0]
+            raise Exception('Error, something went wrong in createBondPair: '
+                    + 'particles {} and {} are {} apart instead of {}'.format(
+                        i[n], j[n], x_ij_length[n], dist_ij[n]))
 
+        self.bondPairs(i, j)     # register bonds
 
     def randomBondPairs(self, ratio=0.3, spacing=-0.1):
         '''
@@ -2917,15 +3597,14 @@ class sim:
         '''
 
         bondparticles = numpy.unique(\
-                numpy.random.random_integers(0, high=self.np-1,\
-                size=int(self.np*ratio)))
+                numpy.random.randint(0, self.np[0],\
+                size=int(self.np[0]*ratio)))
         if bondparticles.size % 2 > 0:
             bondparticles = bondparticles[:-1].copy()
         bondparticles =\
                 bondparticles.reshape(int(bondparticles.size/2), 2).copy()
 
-        for n in numpy.arange(bondparticles.shape[0]):
-            self.createBondPair(bondparticles[n,0], bondparticles[n,1], spacing)
+        self.createBondPairs(bondparticles[:,0], bondparticles[:,1], spacing)
 
     def zeroKinematics(self):
         '''
@@ -4081,42 +4760,41 @@ class sim:
         :param j: Index of second particle in bond
         :type j: int
         '''
+        self.bondPairs([i], [j])
 
-        self.lambda_bar[0] = 1.0 # Radius multiplier to parallel-bond radii
-
-        if hasattr(self, 'bonds') == False:
-            self.bonds = numpy.array([[i,j]], dtype=numpy.uint32)
-        else :
-            self.bonds = numpy.vstack((self.bonds, [i,j]))
+    def bondPairs(self, i, j):
+        '''
+        Create bonds between the particles in ``i`` and the particles in
+        ``j``. The bond arrays are extended once for all the new bonds.
 
-        if hasattr(self, 'bonds_delta_n') == False:
-            self.bonds_delta_n = numpy.array([0.0], dtype=numpy.uint32)
-        else :
-            #self.bonds_delta_n = numpy.vstack((self.bonds_delta_n, [0.0]))
-            self.bonds_delta_n = numpy.append(self.bonds_delta_n, [0.0])
+        :param i: Indexes of the first particles in the bonds
+        :type i: numpy.array
+        :param j: Indexes of the second particles in the bonds
+        :type j: numpy.array
+        '''
 
-        if hasattr(self, 'bonds_delta_t') == False:
-            self.bonds_delta_t = numpy.array([[0.0, 0.0, 0.0]],\
-                    dtype=numpy.uint32)
-        else :
-            self.bonds_delta_t = numpy.vstack((self.bonds_delta_t,\
-                    [0.0, 0.0, 0.0]))
+        i = numpy.asarray(i).ravel()
+        j = numpy.asarray(j).ravel()
+        if i.size != j.size:
+            raise Exception('Error: The number of first and second particles '
+                    + 'in the bonds differ ({} and {})'.format(i.size, j.size))
+        n = i.size
 
-        if hasattr(self, 'bonds_omega_n') == False:
-            self.bonds_omega_n = numpy.array([0.0], dtype=numpy.uint32)
-        else :
-            #self.bonds_omega_n = numpy.vstack((self.bonds_omega_n, [0.0]))
-            self.bonds_omega_n = numpy.append(self.bonds_omega_n, [0.0])
+        self.lambda_bar[0] = 1.0 # Radius multiplier to parallel-bond radii
 
-        if hasattr(self, 'bonds_omega_t') == False:
-            self.bonds_omega_t = numpy.array([[0.0, 0.0, 0.0]],\
-                    dtype=numpy.uint32)
-        else :
-            self.bonds_omega_t = numpy.vstack((self.bonds_omega_t,\
-                    [0.0, 0.0, 0.0]))
+        self.bonds = numpy.concatenate((self.bonds.reshape(-1, 2),
+            numpy.column_stack((i, j)).astype(self.bonds.dtype)))
+        self.bonds_delta_n = numpy.concatenate((self.bonds_delta_n,
+            numpy.zeros(n)))
+        self.bonds_delta_t = numpy.concatenate((
+            self.bonds_delta_t.reshape(-1, 3), numpy.zeros((n, 3))))
+        self.bonds_omega_n = numpy.concatenate((self.bonds_omega_n,
+            numpy.zeros(n)))
+        self.bonds_omega_t = numpy.concatenate((
+            self.bonds_omega_t.reshape(-1, 3), numpy.zeros((n, 3))))
 
-        # Increment the number of bonds with one
-        self.nb0 += 1
+        # Increment the number of bonds
+        self.nb0 += n
 
     def currentNormalStress(self, type='defined'):
         '''
@@ -4865,22 +5543,108 @@ class sim:
         return self.shearStrainRate() * numpy.mean(self.radius) \
                 * numpy.sqrt(self.rho[0]/self.currentNormalStress())
 
+    def spatialIndex(self):
+        '''
+        Returns a cell list (:class:`CellList`) of the particle positions with
+        cells of at least twice the largest particle radius, for finding pairs
+        of nearby particles and the neighbours of positions. The cell list is
+        kept and reused until the particle positions or radii, the domain or
+        the periodic boundaries change, which is detected by checksums of the
+        values.
+
+        :returns: The cell list of the particles
+        :return type: CellList
+        '''
+        x = numpy.ascontiguousarray(self.x, dtype=numpy.float64)
+        radius = numpy.ascontiguousarray(self.radius, dtype=numpy.float64)
+        signature = (x.shape, zlib.crc32(x), radius.shape, zlib.crc32(radius),
+                tuple(self.origo), tuple(self.L), int(self.periodic[0]))
+        if getattr(self, 'spatial_index_signature', None) != signature:
+            cellsize = 1.0
+            if radius.size > 0:
+                cellsize = 2.0*numpy.max(radius)
+            self.spatial_index = CellList(x, cellsize, self.origo, self.L,
+                    self.periodic[0])
+            self.spatial_index_signature = signature
+        return self.spatial_index
+
     def findOverlaps(self):
         '''
-        Find all particle-particle overlaps by a n^2 contact search, which is
-        done in C++. The particle pair indexes and the distance of the overlaps
-        is saved in the object itself as the ``.pairs`` and ``.overlaps``
-        members.
+        Find all particle-particle overlaps by a contact search on the cell list
+        from :func:`spatialIndex()`. Periodic boundaries are taken into account, and as in the C++ contact
+        search, pairs where one of the particles has a fixed velocity are
+        skipped. The particle pair indexes, sorted by the first and then the
+        second index, and the distance of the overlaps (negative) are saved in
+        the object itself as the ``.pairs`` and ``.overlaps`` members.
+
+        :returns: The particle pair indexes and the overlap distances
+        :return type: numpy.array, numpy.array
 
         See also: :func:`findNormalForces()`
         '''
-        self.writebin(verbose=False)
-        subprocess.call('cd .. && ./sphere --contacts input/' + self.sid
-                + '.bin > output/' + self.sid + '.contacts.txt', shell=True)
-        contactdata = numpy.loadtxt('../output/' + self.sid + '.contacts.txt')
-        self.pairs = numpy.array((contactdata[:,0], contactdata[:,1]),
-                dtype=numpy.int32)
-        self.overlaps = numpy.array(contactdata[:,2])
+        pairs = numpy.zeros((2, 0), dtype=numpy.int32)
+        overlaps = numpy.zeros(0, dtype=numpy.float64)
+        if self.radius.size > 1:
+            i, j, vector = self.spatialIndex().pairs(
+                    2.0*numpy.max(self.radius))
+            delta = numpy.sqrt(numpy.sum(vector**2, axis=1)) \
+                    - (self.radius[i] + self.radius[j])
+            overlapping = (delta < 0.0) & (self.fixvel[i] == 0) & \
+                    (self.fixvel[j] == 0)
+            pairs = numpy.array((i[overlapping], j[overlapping]),
+                    dtype=numpy.int32)
+            overlaps = delta[overlapping]
+        self.pairs = pairs
+        self.overlaps = overlaps
+        return self.pairs, self.overlaps
+
+    def contactKinematics(self, pairs=None):
+        '''
+        Find the geometry and relative motion of particle pairs, for all pairs
+        at once. The contact normal points from particle j to particle i, and
+        the relative contact velocity is ``(v_i - v_j) + r_i (n x omega_i) +
+        r_j (n x omega_j)``, as used in :func:`thinsection_x1x3()`. Distances
+        are measured to the nearest periodic image.
+
+        :param pairs: The particle pair indexes, one pair per column as in
+            ``self.pairs`` (default = None, which finds the overlapping pairs
+            with :func:`findOverlaps()`)
+        :type pairs: numpy.array
+        :returns: A dict of arrays with one row per pair: ``'normal'``, the
+            unit normal vectors, ``'overlap'``, the distance between the
+            particle surfaces (negative for overlaps), ``'vel_n'``, the normal
+            component of the relative contact velocity, ``'vel_t'``, the
+            tangential relative contact velocity vectors, ``'slip_angle'``, the
+            angle of the tangential velocity in the x,z plane,
+            ``atan(vel_t_z/vel_t_x)``, and ``'angvel'``, the relative angular
+            velocities ``omega_i - omega_j``
+        :return type: dict
+        '''
+        if pairs is None:
+            pairs = self.findOverlaps()[0]
+        i = numpy.asarray(pairs[0], dtype=numpy.int64)
+        j = numpy.asarray(pairs[1], dtype=numpy.int64)
+
+        x_ij = self.spatialIndex().nearestImage(self.x[i] - self.x[j])
+        x_ij_length = numpy.sqrt(numpy.sum(x_ij**2, axis=1))
+        r_i = self.radius[i][:, None]
+        r_j = self.radius[j][:, None]
+        n_ij = x_ij/x_ij_length[:, None]
+
+        dot_delta = (self.vel[i] - self.vel[j]) \
+                + r_i*numpy.cross(n_ij, self.angvel[i]) \
+                + r_j*numpy.cross(n_ij, self.angvel[j])
+        vel_n = numpy.sum(dot_delta*n_ij, axis=1)
+        vel_t = dot_delta - n_ij*vel_n[:, None]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            slip_angle = numpy.arctan(vel_t[:, 2]/vel_t[:, 0])
+
+        return {'normal': n_ij,
+                'overlap': x_ij_length - (self.radius[i] + self.radius[j]),
+                'vel_n': vel_n,
+                'vel_t': vel_t,
+                'slip_angle': slip_angle,
+                'angvel': self.angvel[i] - self.angvel[j]}
 
     def findCoordinationNumber(self):
         '''
@@ -4888,10 +5652,9 @@ class sim:
         particle). Requires a previous call to :func:`findOverlaps()`. Values
         are stored in ``self.coordinationnumber``.
         '''
-        self.coordinationnumber = numpy.zeros(self.np[0], dtype=numpy.int)
-        for i in numpy.arange(self.overlaps.size):
-            self.coordinationnumber[self.pairs[0,i]] += 1
-            self.coordinationnumber[self.pairs[1,i]] += 1
+        self.coordinationnumber = numpy.bincount(
+                numpy.ravel(self.pairs[:, :self.overlaps.size]),
+                minlength=self.np[0])
 
     def findMeanCoordinationNumber(self):
         '''
@@ -4903,18 +5666,141 @@ class sim:
         '''
         return numpy.mean(self.coordinationnumber)
 
+    def contactStatistics(self):
+        '''
+        Finds the contacts of each particle (by first calling
+        :func:`findNormalForces()`), and the number of contacts and the sum of
+        the normal force magnitudes of each particle. Particles with fewer
+        than two contacts are rattlers, which do not take part in the force
+        network. The mechanical coordination number is the average number of
+        contacts per particle when the rattlers and their contacts are left
+        out. The values are kept and reused until the particle positions,
+        radii or fixed velocities, the domain, the periodic boundaries or the
+        contact stiffness change, which is detected by checksums of the
+        values. The number of contacts per particle is also stored in
+        ``self.coordinationnumber``.
+
+        :returns: A dict with the number of contacts of each particle,
+            ``'coordinationnumber'``, the mean number of contacts per
+            particle, ``'meancoordinationnumber'``, a mask of the rattlers,
+            ``'rattlers'``, the mechanical coordination number,
+            ``'mechanicalcoordinationnumber'``, and the sum of the normal
+            force magnitudes on each particle, ``'f_n_sum'``
+        :return type: dict
+
+        See also: :func:`findCoordinationNumber()` and
+        :func:`findNormalForces()`
+        '''
+        x = numpy.ascontiguousarray(self.x, dtype=numpy.float64)
+        radius = numpy.ascontiguousarray(self.radius, dtype=numpy.float64)
+        fixvel = numpy.ascontiguousarray(self.fixvel, dtype=numpy.float64)
+        signature = (x.shape, zlib.crc32(x), radius.shape, zlib.crc32(radius),
+                fixvel.shape, zlib.crc32(fixvel), tuple(self.origo),
+                tuple(self.L), int(self.periodic[0]), float(self.k_n[0]),
+                float(self.E[0]))
+        if getattr(self, 'contact_statistics_signature', None) != signature:
+            self.findNormalForces()
+            n = self.radius.size
+            i, j = self.pairs
+            contacts = numpy.bincount(numpy.ravel(self.pairs), minlength=n)
+            f_n_sum = numpy.bincount(i, weights=self.f_n_magn, minlength=n) \
+                    + numpy.bincount(j, weights=self.f_n_magn, minlength=n)
+
+            rattlers = contacts < 2
+            mechanical = numpy.count_nonzero(~rattlers[i] & ~rattlers[j])
+            nonrattlers = numpy.count_nonzero(~rattlers)
+            z_m = 0.0
+            if nonrattlers > 0:
+                z_m = 2.0*mechanical/nonrattlers
+
+            self.contact_statistics = {
+                    'coordinationnumber': contacts,
+                    'meancoordinationnumber': 2.0*i.size/max(n, 1),
+                    'rattlers': rattlers,
+                    'mechanicalcoordinationnumber': z_m,
+                    'f_n_sum': f_n_sum}
+            self.contact_statistics_signature = signature
+        self.coordinationnumber = \
+                self.contact_statistics['coordinationnumber']
+        return self.contact_statistics
+
+    def contactTensors(self, slices=1):
+        '''
+        Finds the contact fabric tensor and the average (Love-Weber) stress
+        tensor from the particle-particle contacts, in horizontal slabs of
+        equal height. The contacts and their normal forces are found with
+        :func:`findNormalForces()`, and each contact is placed in the slab
+        containing the midpoint of its branch vector. The fabric tensor of a
+        slab is the average of the outer products ``n n`` of the contact
+        normals, and the stress tensor is the sum of the outer products ``f l``
+        of the normal contact forces and the branch vectors, divided by the
+        slab volume, with compressive stresses positive. The tangential
+        contact forces are not stored in the output files and are not
+        included. The slabs span the domain from ``self.origo[2]`` to the top
+        wall, or to the top of the domain if there are no walls.
+
+        :param slices: The number of horizontal slabs (default = 1)
+        :type slices: int
+        :returns: A dict with the slab centre heights, ``'z'``, the number of
+            contacts in each slab, ``'contacts'``, and the fabric and stress
+            tensors of each slab, ``'fabric'`` and ``'stress'``, with the
+            shape ``(slices, 3, 3)``
+        :return type: dict
+
+        See also: :func:`findNormalForces()` and :func:`contactStatistics()`
+        '''
+        self.findNormalForces()
+        i, j = self.pairs
+        x_ij = self.spatialIndex().nearestImage(self.x[i] - self.x[j])
+        l_ij = numpy.sqrt(numpy.sum(x_ij**2, axis=1))
+        n_ij = x_ij/l_ij[:, None]
+
+        z_min = self.origo[2]
+        z_max = self.origo[2] + self.L[2]
+        if self.nw > 0:
+            z_max = self.w_x[0]
+        dz = (z_max - z_min)/slices
+        slab = numpy.clip(numpy.floor(
+            (self.x[i, 2] - 0.5*x_ij[:, 2] - z_min)/dz).astype(numpy.int64),
+            0, slices - 1)
+
+        # Sum the outer products of each contact in each slab
+        fabric = numpy.einsum('ki,kj->kij', n_ij, n_ij).reshape(-1, 9)
+        stress = numpy.einsum('k,ki,kj->kij', self.f_n_magn*l_ij, n_ij,
+                n_ij).reshape(-1, 9)
+        contacts = numpy.bincount(slab, minlength=slices)
+        fabric = numpy.array([numpy.bincount(slab, weights=fabric[:, c],
+            minlength=slices) for c in range(9)]).T.reshape(slices, 3, 3)
+        stress = numpy.array([numpy.bincount(slab, weights=stress[:, c],
+            minlength=slices) for c in range(9)]).T.reshape(slices, 3, 3)
+
+        fabric /= numpy.maximum(contacts, 1)[:, None, None]
+        stress /= self.L[0]*self.L[1]*dz
+
+        return {'z': z_min + (numpy.arange(slices) + 0.5)*dz,
+                'contacts': contacts,
+                'fabric': fabric,
+                'stress': stress}
+
     def findNormalForces(self):
         '''
         Finds all particle-particle overlaps (by first calling
         :func:`findOverlaps()`) and calculating the normal magnitude by
-        multiplying the overlaps with the elastic stiffness ``self.k_n``.
+        multiplying the overlaps with the elastic stiffness ``self.k_n``. If
+        the Young's modulus ``self.E`` is set, the stiffness of each contact is
+        found from the scale-invariant contact model instead, as in the contact
+        models of the sphere binary.
 
         The result is saved in ``self.f_n_magn``.
 
         See also: :func:`findOverlaps()` and :func:`findContactStresses()`
         '''
         self.findOverlaps()
-        self.f_n_magn = self.k_n * numpy.abs(self.overlaps)
+        k_n = self.k_n
+        if self.E > 0.001:
+            k_n = numpy.pi/2.0*self.E*(self.radius[self.pairs[0]]
+                    + self.radius[self.pairs[1]])/2.0
+        self.f_n_magn = k_n * numpy.abs(self.overlaps)
 
     def contactSurfaceArea(self, i, j, overlap):
         '''
@@ -5015,6 +5901,119 @@ class sim:
         self.findContactStresses()
         return numpy.nonzero(self.sigma_contacts >= threshold)
 
+    def contactHistory(self, start=0, stop=None, stride=1, threshold=None,
+            verbose=False):
+        '''
+        Tracks the particle-particle contacts through the output files of the
+        simulation. The output steps are read with :func:`iterSteps()`, and
+        the contacts of each step are found with :func:`findOverlaps()`, or
+        with :func:`findLoadedContacts()` if a threshold is given, and added to
+        a :class:`ContactHistory`. Example:
+
+            sb = sphere.sim('shear')
+            history = sb.contactHistory()
+            pairs, birth, death, lifetime = history.lifetimes()
+
+        :param start: The first output step (default = 0)
+        :type start: int
+        :param stop: The output step after the last step (default = None,
+            which uses the last output file)
+        :type stop: int
+        :param stride: The increment of the output step number (default = 1)
+        :type stride: int
+        :param threshold: Only track contacts where the contact stress
+            magnitude exceeds or is equal to this value [Pa] (default = None,
+            which tracks all contacts)
+        :type threshold: float
+        :param verbose: Show the names of the output files (default = False)
+        :type verbose: bool
+        :returns: The contact history
+        :return type: ContactHistory
+        '''
+        if stop is None:
+            stop = len(SimSeries(self.sid))
+        steps = range(start, stop, stride)
+        history = ContactHistory()
+        for n, sb in enumerate(self.iterSteps(start, stop, stride,
+                verbose=verbose)):
+            if threshold is None:
+                pairs = self.findOverlaps()[0]
+            else:
+                loaded = self.findLoadedContacts(threshold)[0]
+                pairs = self.pairs[:, loaded]
+            history.update(pairs, steps[n])
+        return history
+
+    def contactHistogram(self, start=0, stop=None, stride=1, lc=0.0,
+            strike_bins=36, dip_bins=9, force_bins=None, relative=True,
+            verbose=False):
+        '''
+        Accumulates histograms of the contact orientations and normal force
+        magnitudes over the output files of the simulation. The output steps
+        are read with :func:`iterSteps()`, and the contacts of each step are
+        found with :func:`forcechainsTable()` and added to a
+        :class:`ContactHistogram`. Example:
+
+            sb = sphere.sim('shear')
+            histogram = sb.contactHistogram(start=100)
+            histogram.plot('contacts-shear.png')
+
+        :param start: The first output step (default = 0)
+        :type start: int
+        :param stop: The output step after the last step (default = None,
+            which uses the last output file)
+        :type stop: int
+        :param stride: The increment of the output step number (default = 1)
+        :type stride: int
+        :param lc: Lower cutoff of contact forces. Contacts below are skipped
+            (default = 0.0)
+        :type lc: float
+        :param strike_bins: The number of strike bins (default = 36)
+        :type strike_bins: int
+        :param dip_bins: The number of dip bins (default = 9)
+        :type dip_bins: int
+        :param force_bins: The edges of the force bins, see
+            :class:`ContactHistogram` (default = None)
+        :type force_bins: numpy.array
+        :param relative: Bin the forces relative to the mean normal force of
+            each step (default = True)
+        :type relative: bool
+        :param verbose: Show the names of the output files (default = False)
+        :type verbose: bool
+        :returns: The accumulated histograms
+        :return type: ContactHistogram
+        '''
+        histogram = ContactHistogram(strike_bins, dip_bins, force_bins,
+                relative)
+        for sb in self.iterSteps(start, stop, stride, verbose=verbose):
+            histogram.addStep(self, lc)
+        return histogram
+
+    def forcechainsTable(self, lc=0.0):
+        '''
+        Finds the end points and normal force magnitudes of all
+        particle-particle contacts, as in the text output of the `forcechains`
+        binary (``forcechains -f txt``). The normal forces are found with
+        :func:`findNormalForces()`. The second end point of a contact across a
+        periodic boundary is the periodic image of the second particle which
+        is closest to the first particle.
+
+        :param lc: Lower cutoff of contact forces. Contacts below are skipped
+        :type lc: float
+        :returns: The first end points, the second end points, the normal
+            force magnitudes, and the indexes of the first and second particles
+            of the contacts
+        :return type: numpy.array, numpy.array, numpy.array, numpy.array,
+            numpy.array
+        '''
+        self.findNormalForces()
+        i, j = self.pairs
+        x_i = self.x[i]
+        x_j = x_i - self.spatialIndex().nearestImage(x_i - self.x[j])
+
+        I = numpy.nonzero(self.f_n_magn >= lc)[0]
+        return x_i[I], x_j[I], self.f_n_magn[I], i[I], j[I]
+
     def forcechains(self, lc=200.0, uc=650.0, outformat='png', disp='2d'):
         '''
         Visualizes the force chains in the system from the magnitude of the
@@ -5058,13 +6057,8 @@ class sim:
         :param graphics_format: Save the plot in this format
         :type graphics_format: str
         '''
-        self.writebin(verbose=False)
-
-        subprocess.call("cd .. && ./forcechains -f txt input/" + self.sid \
-                + ".bin > python/fc-tmp.txt", shell=True)
-
-        # data will have the shape (numcontacts, 7)
-        data = numpy.loadtxt("fc-tmp.txt", skiprows=1)
+        # data will have the shape (numcontacts, 9)
+        data = numpy.column_stack(self.forcechainsTable())
 
         # find the max. value of the normal force
         f_n_max = numpy.amax(data[:,6])
@@ -5075,41 +6069,9 @@ class sim:
         # find the indexes of these contacts
         I = numpy.nonzero(data[:,6] > f_n_lim)
 
-        # loop through these contacts and find the strike and dip of the
-        # contacts
-        strikelist = [] # strike direction of the normal vector, [0:360[
-        diplist = [] # dip of the normal vector, [0:90]
-        for i in I[0]:
-
-            x1 = data[i,0]
-            y1 = data[i,1]
-            z1 = data[i,2]
-            x2 = data[i,3]
-            y2 = data[i,4]
-            z2 = data[i,5]
-
-            if z1 < z2:
-                xlower = x1; ylower = y1; zlower = z1
-                xupper = x2; yupper = y2; zupper = z2
-            else :
-                xlower = x2; ylower = y2; zlower = z2
-                xupper = x1; yupper = y1; zupper = z1
-
-            # Vector pointing downwards
-            dx = xlower - xupper
-            dy = ylower - yupper
-            dz = zlower - zupper
-            dhoriz = numpy.sqrt(dx**2 + dy**2)
-
-            # Find dip angle
-            diplist.append(math.degrees(math.atan((zupper - zlower)/dhoriz)))
-
-            # Find strike angle
-            if ylower >= yupper: # in first two quadrants
-                strikelist.append(math.acos(dx/dhoriz))
-            else :
-                strikelist.append(2.0*numpy.pi - math.acos(dx/dhoriz))
-
+        # find the strike and dip of these contacts
+        strikelist, diplist = contactOrientations(data[I[0],0:3],
+                data[I[0],3:6])
 
         plt.figure(figsize=[4,4])
         ax = plt.subplot(111, polar=True, axisbg='w')
@@ -5119,8 +6081,6 @@ class sim:
         plt.savefig('fc-' + self.sid + '-rose.' + graphics_format,\
                 transparent=True)
 
-        subprocess.call('rm fc-tmp.txt', shell=True)
-
     def bondsRose(self, graphics_format='pdf'):
         '''
         Visualize the trend and plunge angles of the bond pairs in a rose plot.
@@ -5130,43 +6090,10 @@ class sim:
         :param graphics_format: Save the plot in this format
         :type graphics_format: str
         '''
-        # loop through these contacts and find the strike and dip of the
-        # contacts
-        strikelist = [] # strike direction of the normal vector, [0:360[
-        diplist = [] # dip of the normal vector, [0:90]
-        for n in numpy.arange(self.nb0[0]):
-
-            i = self.bonds[n,0]
-            j = self.bonds[n,1]
-
-            x1 = self.x[i,0]
-            y1 = self.x[i,1]
-            z1 = self.x[i,2]
-            x2 = self.x[j,0]
-            y2 = self.x[j,1]
-            z2 = self.x[j,2]
-
-            if z1 < z2:
-                xlower = x1; ylower = y1; zlower = z1
-                xupper = x2; yupper = y2; zupper = z2
-            else :
-                xlower = x2; ylower = y2; zlower = z2
-                xupper = x1; yupper = y1; zupper = z1
-
-            # Vector pointing downwards
-            dx = xlower - xupper
-            dy = ylower - yupper
-            dz = zlower - zupper
-            dhoriz = numpy.sqrt(dx**2 + dy**2)
-
-            # Find dip angle
-            diplist.append(math.degrees(math.atan((zupper - zlower)/dhoriz)))
-
-            # Find strike angle
-            if ylower >= yupper: # in first two quadrants
-                strikelist.append(math.acos(dx/dhoriz))
-            else :
-                strikelist.append(2.0*numpy.pi - math.acos(dx/dhoriz))
+        # find the strike and dip of the bonds
+        bonds = self.bonds[:self.nb0[0]]
+        strikelist, diplist = contactOrientations(self.x[bonds[:,0]],
+                self.x[bonds[:,1]])
 
         plt.figure(figsize=[4,4])
         ax = plt.subplot(111, polar=True, axisbg='w')
@@ -5469,69 +6396,46 @@ class sim:
 
         # Check whether there are slips between the particles intersecting the
         # plane
-        sxlist = []
-        sylist = []
-        dsxlist = []
-        dsylist = []
-        anglelist = [] # angle of the slip vector
-        slipvellist = [] # velocity of the slip
-        for i in ilist:
-
-            # Loop through other particles, and check whether they are in
-            # contact
-            for j in ilist:
-                #if i < j:
-                if i != j:
-
-                    # positions
-                    x_i = self.x[i,:]
-                    x_j = self.x[j,:]
-
-                    # radii
-                    r_i = self.radius[i]
-                    r_j = self.radius[j]
-
-                    # Inter-particle vector
-                    x_ij = x_i - x_j
-                    x_ij_length = numpy.sqrt(x_ij.dot(x_ij))
-
-                    # Check for overlap
-                    if x_ij_length - (r_i + r_j) < 0.0:
-
-                        # contact plane normal vector
-                        n_ij = x_ij / x_ij_length
-
-                        vel_i = self.vel[i,:]
-                        vel_j = self.vel[j,:]
-                        angvel_i = self.angvel[i,:]
-                        angvel_j = self.angvel[j,:]
-
-                        # Determine the tangential contact surface velocity in
-                        # the x,z plane
-                        dot_delta = (vel_i - vel_j) \
-                                + r_i * numpy.cross(n_ij, angvel_i) \
-                                + r_j * numpy.cross(n_ij, angvel_j)
-
-                        # Subtract normal component to get tangential velocity
-                        dot_delta_n = n_ij * numpy.dot(dot_delta, n_ij)
-                        dot_delta_t = dot_delta - dot_delta_n
-
-                        # Save slip velocity data for gnuplot
-                        if dot_delta_t[0] != 0.0 or dot_delta_t[2] != 0.0:
-
-                            # Center position of the contact
-                            cpos = x_i - x_ij * 0.5
-
-                            sxlist.append(cpos[0])
-                            sylist.append(cpos[2])
-                            dsxlist.append(dot_delta_t[0] * slipscale)
-                            dsylist.append(dot_delta_t[2] * slipscale)
-                            #anglelist.append(math.degrees(\
-                                    #math.atan(dot_delta_t[2]/dot_delta_t[0])))
-                            anglelist.append(\
-                                    math.atan(dot_delta_t[2]/dot_delta_t[0]))
-                            slipvellist.append(\
-                                    numpy.sqrt(dot_delta_t.dot(dot_delta_t)))
+        # Find the pairs of nearby particles intersecting the plane, in both
+        # orders
+        intersecting = numpy.zeros(self.radius.size, dtype=bool)
+        intersecting[ilist] = True
+        pair_i = numpy.zeros(0, dtype=numpy.int64)
+        pair_j = numpy.zeros(0, dtype=numpy.int64)
+        if len(ilist) > 1:
+            pair_i, pair_j = self.spatialIndex().pairs(
+                    2.0*numpy.max(self.radius))[:2]
+            both = intersecting[pair_i] & intersecting[pair_j]
+            pair_i, pair_j = pair_i[both], pair_j[both]
+            pair_i, pair_j = numpy.concatenate((pair_i, pair_j)), \
+                    numpy.concatenate((pair_j, pair_i))
+            order = numpy.lexsort((pair_j, pair_i))
+            pair_i, pair_j = pair_i[order], pair_j[order]
+
+        # Keep the overlapping pairs
+        x_ij = self.x[pair_i] - self.x[pair_j]
+        overlapping = numpy.sqrt(numpy.sum(x_ij**2, axis=1)) \
+                - (self.radius[pair_i] + self.radius[pair_j]) < 0.0
+        pair_i, pair_j = pair_i[overlapping], pair_j[overlapping]
+        x_ij = x_ij[overlapping]
+
+        # Determine the tangential contact surface velocity in the x,z plane
+        kinematics = self.contactKinematics(numpy.array([pair_i, pair_j]))
+        dot_delta_t = kinematics['vel_t']
+
+        # Save slip velocity data for gnuplot
+        slipping = (dot_delta_t[:,0] != 0.0) | (dot_delta_t[:,2] != 0.0)
+
+        # Center position of the contact
+        cpos = self.x[pair_i[slipping]] - x_ij[slipping]*0.5
+
+        sxlist = list(cpos[:,0])
+        sylist = list(cpos[:,2])
+        dsxlist = list(dot_delta_t[slipping,0]*slipscale)
+        dsylist = list(dot_delta_t[slipping,2]*slipscale)
+        anglelist = list(kinematics['slip_angle'][slipping])
+        slipvellist = list(numpy.sqrt(numpy.sum(dot_delta_t[slipping]**2,
+            axis=1)))
 
 
         # Write slip lines to text file
@@ -5596,14 +6500,8 @@ class sim:
         :param graphics_format: Save the plot in this format
         :type graphics_format: str
         '''
-        self.writebin(verbose=False)
-
-
-        subprocess.call("cd .. && ./forcechains -f txt input/" + self.sid \
-                + ".bin > python/contacts-tmp.txt", shell=True)
-
-        # data will have the shape (numcontacts, 7)
-        data = numpy.loadtxt('contacts-tmp.txt', skiprows=1)
+        # data will have the shape (numcontacts, 9)
+        data = numpy.column_stack(self.forcechainsTable())
 
         # find the max. value of the normal force
         f_n_max = numpy.amax(data[:,6])
@@ -5619,46 +6517,10 @@ class sim:
         # find the indexes of these contacts
         I = numpy.nonzero(data[:,6] >= f_n_lim)
 
-        # loop through these contacts and find the strike and dip of the
-        # contacts
-
-        # strike direction of the normal vector, [0:360[
-        strikelist = numpy.empty(len(I[0]))
-        diplist = numpy.empty(len(I[0])) # dip of the normal vector, [0:90]
+        # find the strike and dip of these contacts
+        strikelist, diplist = contactOrientations(data[I[0],0:3],
+                data[I[0],3:6])
         forcemagnitude = data[I,6]
-        j = 0
-        for i in I[0]:
-
-            x1 = data[i,0]
-            y1 = data[i,1]
-            z1 = data[i,2]
-            x2 = data[i,3]
-            y2 = data[i,4]
-            z2 = data[i,5]
-
-            if z1 < z2:
-                xlower = x1; ylower = y1; zlower = z1
-                xupper = x2; yupper = y2; zupper = z2
-            else :
-                xlower = x2; ylower = y2; zlower = z2
-                xupper = x1; yupper = y1; zupper = z1
-
-            # Vector pointing downwards
-            dx = xlower - xupper
-            dy = ylower - yupper
-            dz = zlower - zupper
-            dhoriz = numpy.sqrt(dx**2 + dy**2)
-
-            # Find dip angle
-            diplist[j] = numpy.degrees(numpy.arctan((zupper - zlower)/dhoriz))
-
-            # Find strike angle
-            if ylower >= yupper: # in first two quadrants
-                strikelist[j] = numpy.arccos(dx/dhoriz)
-            else :
-                strikelist[j] = 2.0*numpy.pi - numpy.arccos(dx/dhoriz)
-
-            j += 1
 
         fig = plt.figure(figsize=figsize)
         ax = plt.subplot(111, polar=True, axisbg='white')
@@ -5698,8 +6560,6 @@ class sim:
                 graphics_format,\
                 transparent=False)
 
-        subprocess.call('rm contacts-tmp.txt', shell=True)
-
         fig.clf()
         if histogram:
             #hist, bins = numpy.histogram(datadata[:,6], bins=10)
@@ -6060,7 +6920,8 @@ class sim:
         sb.readfirst(verbose=False)
         load = 0.0
         for i in numpy.arange(1, self.status()+1):
-            sb.readstep(i, verbose=False)
+            sb.readstep(i, verbose=False,
+                    fields=['time_current', 'w_x', 'w_sigma0'])
             if i == 0:
                 load = sb.w_sigma0[0]
             t[i-1]  = sb.time_current[0]
@@ -6087,6 +6948,7 @@ class sim:
                 (self.H50 - H[i_lower])/(H[i_upper] - H[i_lower])
 
         self.c_coeff = T50*self.H50**2.0/(self.t50)
+        sb.readstep(self.status(), verbose=False)
         if self.fluid:
             e = numpy.mean(sb.phi[:,:,3:-8]) # ignore boundaries
         else:
@@ -6437,7 +7299,8 @@ class sim:
 
     def visualize(self, method='energy', savefig=True, outformat='png',
             figsize=False, pickle=False, xlim=False, firststep=0, f_min=None,
-            f_max=None, cmap=None, smoothing=0, smoothing_window='hanning'):
+            f_max=None, cmap=None, smoothing=0, smoothing_window='hanning',
+            workers=1):
         '''
         Visualize output from the simulation, where the temporal progress is
         of interest. The output will be saved in the current folder with a name
@@ -6474,6 +7337,10 @@ class sim:
             Valid values are 'flat', 'hanning' (default), 'hamming', 'bartlett',
             and 'blackman'.
         :type smoothing_window: str
+        :param workers: The number of processes reading output files that are
+            not in the cache of earlier calls, see :func:`stepSeries()`
+            (default = 1)
+        :type workers: int
         '''
 
         lastfile = self.status()
@@ -6492,33 +7359,20 @@ class sim:
             else:
                 fig = plt.figure(figsize=(20,8))
 
-            # Allocate arrays
-            t = numpy.zeros(lastfile-firststep + 1)
-            Epot = numpy.zeros_like(t)
-            Ekin = numpy.zeros_like(t)
-            Erot = numpy.zeros_like(t)
-            Es  = numpy.zeros_like(t)
-            Ev  = numpy.zeros_like(t)
-            Es_dot = numpy.zeros_like(t)
-            Ev_dot = numpy.zeros_like(t)
-            Ebondpot = numpy.zeros_like(t)
-            Esum = numpy.zeros_like(t)
-
-            # Read energy values from simulation binaries
-            for i in numpy.arange(firststep, lastfile+1):
-                sb.readstep(i, verbose = False)
-
-                Epot[i] = sb.energy("pot")
-                Ekin[i] = sb.energy("kin")
-                Erot[i] = sb.energy("rot")
-                Es[i]   = sb.energy("shear")
-                Ev[i]   = sb.energy("visc_n")
-                Es_dot[i] = sb.energy("shearrate")
-                Ev_dot[i] = sb.energy("visc_n_rate")
-                Ebondpot[i] = sb.energy("bondpot")
-                Esum[i] = Epot[i] + Ekin[i] + Erot[i] + Es[i] + Ev[i] +\
-                        Ebondpot[i]
-                t[i] = sb.currentTime()
+            # Read energy values from simulation binaries, or from the cache
+            # of earlier calls
+            values = self.stepSeries('energy', stepEnergies, firststep,
+                    lastfile, workers=workers)
+            t = values['t']
+            Epot = values['Epot']
+            Ekin = values['Ekin']
+            Erot = values['Erot']
+            Es  = values['Es']
+            Ev  = values['Ev']
+            Es_dot = values['Es_dot']
+            Ev_dot = values['Ev_dot']
+            Ebondpot = values['Ebondpot']
+            Esum = Epot + Ekin + Erot + Es + Ev + Ebondpot
 
 
             if outformat != 'txt':
@@ -6612,32 +7466,33 @@ class sim:
 
         elif method == 'walls':
 
-            # Read energy values from simulation binaries
-            for i in numpy.arange(firststep, lastfile+1):
-                sb.readstep(i, verbose=False)
-
-                # Allocate arrays on first run
-                if i == firststep:
-                    wforce = numpy.zeros((lastfile+1)*sb.nw[0],\
-                            dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
-                    wvel   = numpy.zeros((lastfile+1)*sb.nw[0],\
-                            dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
-                    wpos   = numpy.zeros((lastfile+1)*sb.nw[0],\
-                            dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
-                    wsigma0  = numpy.zeros((lastfile+1)*sb.nw[0],\
-                            dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
-                    maxpos = numpy.zeros((lastfile+1), dtype=numpy.float64)
-                    logstress = numpy.zeros((lastfile+1), dtype=numpy.float64)
-                    voidratio = numpy.zeros((lastfile+1), dtype=numpy.float64)
-
-                wforce[i] = sb.w_force[0]
-                wvel[i]   = sb.w_vel[0]
-                wpos[i]   = sb.w_x[0]
-                wsigma0[i]  = sb.w_sigma0[0]
-                maxpos[i] = numpy.max(sb.x[:,2]+sb.radius)
-                logstress[i] =\
-                        numpy.log((sb.w_force[0]/(sb.L[0]*sb.L[1]))/1000.0)
-                voidratio[i] = sb.voidRatio()
+            # Read wall values from simulation binaries, or from the cache of
+            # earlier calls
+            fields = ['time_current', 'L', 'origo', 'x', 'radius', 'w_x',
+                    'w_vel', 'w_force', 'w_sigma0']
+            values = self.stepSeries('walls', stepWallValues, firststep,
+                    lastfile, fields=fields, workers=workers)
+            sb.readstep(lastfile, verbose=False, fields=fields)
+
+            wforce = numpy.zeros((lastfile+1)*sb.nw[0],\
+                    dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
+            wvel   = numpy.zeros((lastfile+1)*sb.nw[0],\
+                    dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
+            wpos   = numpy.zeros((lastfile+1)*sb.nw[0],\
+                    dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
+            wsigma0  = numpy.zeros((lastfile+1)*sb.nw[0],\
+                    dtype=numpy.float64).reshape((lastfile+1), sb.nw[0])
+            maxpos = numpy.zeros((lastfile+1), dtype=numpy.float64)
+            logstress = numpy.zeros((lastfile+1), dtype=numpy.float64)
+            voidratio = numpy.zeros((lastfile+1), dtype=numpy.float64)
+
+            wforce[firststep:] = values['w_force'][:,numpy.newaxis]
+            wvel[firststep:]   = values['w_vel'][:,numpy.newaxis]
+            wpos[firststep:]   = values['w_x'][:,numpy.newaxis]
+            wsigma0[firststep:]  = values['w_sigma0'][:,numpy.newaxis]
+            maxpos[firststep:] = values['maxpos']
+            logstress[firststep:] = values['logstress']
+            voidratio[firststep:] = values['voidratio']
 
             t = numpy.linspace(0.0, sb.time_current, lastfile+1)
 
@@ -6688,30 +7543,23 @@ class sim:
 
         elif method == 'triaxial':
 
-            # Read energy values from simulation binaries
-            for i in numpy.arange(firststep, lastfile+1):
-                sb.readstep(i, verbose = False)
+            # Read wall values from simulation binaries, or from the cache of
+            # earlier calls
+            values = self.stepSeries('triaxial', stepTriaxialValues,
+                    firststep, lastfile,
+                    fields=['origo', 'w_x', 'w_force', 'w_sigma0'],
+                    workers=workers)
 
-                vol = (sb.w_x[0]-sb.origo[2]) * (sb.w_x[1]-sb.w_x[2]) \
-                        * (sb.w_x[3] - sb.w_x[4])
+            axial_strain = numpy.zeros(lastfile+1, dtype=numpy.float64)
+            deviatoric_stress = numpy.zeros(lastfile+1, dtype=numpy.float64)
+            volumetric_strain = numpy.zeros(lastfile+1, dtype=numpy.float64)
 
-                # Allocate arrays on first run
-                if i == firststep:
-                    axial_strain = numpy.zeros(lastfile+1, dtype=numpy.float64)
-                    deviatoric_stress =\
-                            numpy.zeros(lastfile+1, dtype=numpy.float64)
-                    volumetric_strain =\
-                            numpy.zeros(lastfile+1, dtype=numpy.float64)
+            w0pos0 = values['w_x'][0]
+            vol0 = values['vol'][0]
 
-                    w0pos0 = sb.w_x[0]
-                    vol0 = vol
-
-                sigma1 = sb.w_force[0]/\
-                        ((sb.w_x[1]-sb.w_x[2])*(sb.w_x[3]-sb.w_x[4]))
-
-                axial_strain[i] = (w0pos0 - sb.w_x[0])/w0pos0
-                volumetric_strain[i] = (vol0-vol)/vol0
-                deviatoric_stress[i] = sigma1 / sb.w_sigma0[1]
+            axial_strain[firststep:] = (w0pos0 - values['w_x'])/w0pos0
+            volumetric_strain[firststep:] = (vol0 - values['vol'])/vol0
+            deviatoric_stress[firststep:] = values['sigma1']/values['w_sigma0']
 
             #print(lastfile)
             #print(axial_strain)
@@ -6747,9 +7595,16 @@ class sim:
 
         elif method == 'shear':
 
-            # Read stress values from simulation binaries
+            # Read stress values from simulation binaries, or from the cache of
+            # earlier calls
+            fields = ['time_file_dt', 'L', 'origo', 'vel', 'fixvel', 'force',
+                    'w_x', 'w_force', 'w_sigma0']
+            values = self.stepSeries('shear', stepShearValues, firststep,
+                    lastfile, fields=fields, workers=workers)
+            sb.readstep(lastfile, verbose=False, fields=fields)
+
             for i in numpy.arange(firststep, lastfile+1):
-                sb.readstep(i, verbose = False)
+                n = i - firststep
 
                 # First iteration: Allocate arrays and find constant values
                 if i == firststep:
@@ -6773,24 +7628,21 @@ class sim:
                     # Shear strain value of peak sh. stress
                     self.tau_p_shearstrain = 0.0
 
-                    fixvel = numpy.nonzero(sb.fixvel > 0.0)
-                    #fixvel_upper = numpy.nonzero(sb.vel[fixvel,0] > 0.0)
-                    shearvel = sb.vel[fixvel,0].max()
-                    w_x0 = sb.w_x[0]        # Original height
-                    A = sb.L[0] * sb.L[1]   # Upper surface area
+                    shearvel = values['shearvel'][n]
+                    w_x0 = values['w_x'][n]     # Original height
+                    A = values['A'][n]          # Upper surface area
 
                 if i == firststep+1:
-                    w_x0 = sb.w_x[0]        # Original height
+                    w_x0 = values['w_x'][n]     # Original height
 
-                # Summation of shear stress contributions
-                for j in fixvel[0]:
-                    if sb.vel[j,0] > 0.0:
-                        self.tau[i] += -sb.force[j,0]/A
+                # Sum of shear stress contributions
+                self.tau[i] = values['tau'][n]
 
                 if i > 0:
-                    self.xdisp[i] = self.xdisp[i-1] +sb.time_file_dt[0]*shearvel
-                self.sigma_eff[i] = sb.w_force[0] / A
-                self.sigma_def[i] = sb.w_sigma0[0]
+                    self.xdisp[i] = self.xdisp[i-1] \
+                            + values['time_file_dt'][n]*shearvel
+                self.sigma_eff[i] = values['w_force'][n] / A
+                self.sigma_def[i] = values['w_sigma0'][n]
 
                 # dilation in meters
                 #dilation[i] = sb.w_x[0] - w_x0
@@ -6807,7 +7659,7 @@ class sim:
                             + 'file')
                     self.readfirst()
                     d_bar = numpy.mean(self.radius)*2.0
-                self.dilation[i] = (sb.w_x[0] - w_x0)/d_bar
+                self.dilation[i] = (values['w_x'][n] - w_x0)/d_bar
 
                 # Test if this was the max. shear stress
                 if self.tau[i] > self.tau_p:
@@ -7180,10 +8032,10 @@ class sim:
             t = numpy.zeros(sb.status())
             I = numpy.zeros(sb.status())
 
-            for i in numpy.arange(firststep, sb.status()):
-                sb.readstep(i, verbose = False)
-                t[i] = sb.currentTime()
-                I[i] = sb.inertiaParameterPlanarShear()
+            values = self.stepSeries('inertia', stepInertia, firststep,
+                    sb.status()-1, workers=workers)
+            t[firststep:] = values['t']
+            I[firststep:] = values['I']
 
             # Plotting
             if outformat != 'txt':
@@ -7201,15 +8053,15 @@ class sim:
 
         elif method == 'mean-fluid-pressure':
 
-            # Read pressure values from simulation binaries
-            for i in numpy.arange(firststep, lastfile+1):
-                sb.readstep(i, verbose = False)
+            # Read pressure values from simulation binaries, or from the cache
+            # of earlier calls
+            values = self.stepSeries('mean-fluid-pressure',
+                    stepMeanFluidPressure, firststep, lastfile,
+                    fields=['p_f'], workers=workers)
+            sb.readstep(lastfile, verbose=False, fields=['time_current'])
 
-                # Allocate arrays on first run
-                if i == firststep:
-                    p_mean = numpy.zeros(lastfile+1, dtype=numpy.float64)
-
-                p_mean[i] = numpy.mean(sb.p_f)
+            p_mean = numpy.zeros(lastfile+1, dtype=numpy.float64)
+            p_mean[firststep:] = values['p_mean']
 
             t = numpy.linspace(0.0, sb.time_current, lastfile+1)
 
@@ -7245,11 +8097,13 @@ class sim:
             shear_strain = numpy.zeros(sb.status())
             pres = numpy.zeros((sb.num[2], sb.status()))
 
-            # Read pressure values from simulation binaries
-            for i in numpy.arange(firststep, sb.status()):
-                sb.readstep(i, verbose = False)
-                pres[:,i] = numpy.average(numpy.average(sb.p_f, axis=0), axis=0)
-                shear_strain[i] = sb.shearStrain()
+            # Read pressure values from simulation binaries, or from the cache
+            # of earlier calls
+            values = self.stepSeries('fluid-pressure', stepFluidPressure,
+                    firststep, sb.status()-1, workers=workers)
+            pres[:,firststep:] = values['p_f'].T
+            shear_strain[firststep:] = values['shear_strain']
+            sb.readstep(sb.status()-1, verbose=False)
             t = numpy.linspace(0.0, sb.time_current, lastfile+1)
 
             # Plotting
@@ -7337,11 +8191,13 @@ class sim:
             shear_strain = numpy.zeros(sb.status())
             poros = numpy.zeros((sb.num[2], sb.status()))
 
-            # Read pressure values from simulation binaries
-            for i in numpy.arange(firststep, sb.status()):
-                sb.readstep(i, verbose = False)
-                poros[:,i] = numpy.average(numpy.average(sb.phi, axis=0),axis=0)
-                shear_strain[i] = sb.shearStrain()
+            # Read porosity values from simulation binaries, or from the
+            # cache of earlier calls
+            values = self.stepSeries('porosity', stepPorosity, firststep,
+                    sb.status()-1, workers=workers)
+            poros[:,firststep:] = values['phi'].T
+            shear_strain[firststep:] = values['shear_strain']
+            sb.readstep(sb.status()-1, verbose=False)
             t = numpy.linspace(0.0, sb.time_current, lastfile+1)
 
             # Plotting
@@ -7447,6 +8303,1722 @@ class sim:
                 plt.show()
 
 
+def stepValues(sid, reducer, fluid, fields, step):
+    '''
+    Read an output step and return the values computed from it by
+    ``reducer``. This function is run in the worker processes of
+    :func:`mapStepValues()`.
+    '''
+    sb = sim(sid, fluid=fluid)
+    sb.readstep(step, verbose=False, fields=fields)
+    return reducer(sb)
+
+def mapStepValues(sid, steps, reducer, fluid=False, fields=None, workers=None,
+        chunksize=1):
+    '''
+    Compute values from a list of output steps of a simulation with a pool of
+    worker processes. See :func:`sim.mapSteps()`.
+
+    :param sid: The simulation id
+    :type sid: str
+    :param steps: The output steps to read
+    :type steps: list of int
+    :param reducer: Module-level function computing the values of an output
+        step from a ``sim`` object
+    :type reducer: function
+    :param fluid: The simulation contains fluid data (default = False)
+    :type fluid: bool
+    :param fields: Only read these values from the output files
+        (default = None, which reads all values)
+    :type fields: list of str
+    :param workers: The number of worker processes (default = None, which
+        uses one process per CPU)
+    :type workers: int
+    :param chunksize: The number of steps sent to a worker at a time
+        (default = 1)
+    :type chunksize: int
+    :returns: The values of each step, in the order of ``steps``
+    :return type: list
+    '''
+    steps = list(steps)
+    function = functools.partial(stepValues, sid, reducer, fluid, fields)
+    if workers == 1 or len(steps) < 2 or not py_futures:
+        return [function(step) for step in steps]
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        return list(executor.map(function, steps, chunksize=chunksize))
+    finally:
+        executor.shutdown()
+
+def prefetchSteps(sid, steps, depth=1, folder='../output/'):
+    '''
+    Read the contents of output files on a background thread. The files are
+    read in order, and at most ``depth`` files are held in memory ahead of the
+    file returned last, so reading overlaps with the processing of the
+    previous steps. Steps without an output file are read from the archive
+    written by :class:`OutputArchive`.
+
+    :param sid: The simulation id
+    :type sid: str
+    :param steps: The output file numbers
+    :type steps: list of int
+    :param depth: The largest number of files read ahead (default = 1)
+    :type depth: int
+    :param folder: The folder containing the output files
+        (default = '../output/')
+    :type folder: str
+    :returns: The contents of each output file
+    :return type: generator of bytes
+    '''
+    contents = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(value):
+        # Wait for space in the queue until the reader is stopped
+        while not stop.is_set():
+            try:
+                contents.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        archive = OutputArchive(sid, folder)
+        try:
+            for step in steps:
+                fn = archive.filename(step)
+                if os.path.isfile(fn) or not archive.exists():
+                    fh = open(fn, 'rb')
+                    try:
+                        value = fh.read()
+                    finally:
+                        fh.close()
+                else:
+                    value = archive.raw(step)
+                if not put((True, value)):
+                    return
+        except Exception as e:
+            put((False, e))
+
+    thread = threading.Thread(target=read)
+    thread.daemon = True
+    thread.start()
+    try:
+        for step in steps:
+            success, value = contents.get()
+            if not success:
+                raise value
+            yield value
+    finally:
+        stop.set()
+        thread.join()
+
+def stepEnergies(sb):
+    '''
+    Energy values of an output step, used by ``sim.visualize('energy')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The current time and energy components
+    :return type: dict
+    '''
+    return {'t': sb.currentTime(),
+            'Epot': sb.energy('pot'),
+            'Ekin': sb.energy('kin'),
+            'Erot': sb.energy('rot'),
+            'Es': sb.energy('shear'),
+            'Ev': sb.energy('visc_n'),
+            'Es_dot': sb.energy('shearrate'),
+            'Ev_dot': sb.energy('visc_n_rate'),
+            'Ebondpot': sb.energy('bondpot')}
+
+def stepWallValues(sb):
+    '''
+    Values of the upper wall of an output step, used by
+    ``sim.visualize('walls')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The wall force, velocity, position and normal stress, the
+        highest particle position, the log stress, and the void ratio
+    :return type: dict
+    '''
+    return {'w_force': sb.w_force[0],
+            'w_vel': sb.w_vel[0],
+            'w_x': sb.w_x[0],
+            'w_sigma0': sb.w_sigma0[0],
+            'maxpos': numpy.max(sb.x[:,2]+sb.radius),
+            'logstress': numpy.log((sb.w_force[0]/(sb.L[0]*sb.L[1]))/1000.0),
+            'voidratio': sb.voidRatio()}
+
+def stepTriaxialValues(sb):
+    '''
+    Values of an output step of a triaxial test, used by
+    ``sim.visualize('triaxial')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The upper wall position, the sample volume, the axial stress,
+        and the lateral normal stress
+    :return type: dict
+    '''
+    vol = (sb.w_x[0]-sb.origo[2]) * (sb.w_x[1]-sb.w_x[2]) \
+            * (sb.w_x[3] - sb.w_x[4])
+    sigma1 = sb.w_force[0]/((sb.w_x[1]-sb.w_x[2])*(sb.w_x[3]-sb.w_x[4]))
+    return {'w_x': sb.w_x[0], 'vol': vol, 'sigma1': sigma1,
+            'w_sigma0': sb.w_sigma0[1]}
+
+def stepShearValues(sb):
+    '''
+    Values of an output step of a shear experiment, used by
+    ``sim.visualize('shear')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The shear stress on the upper, fixed particles, the shear
+        velocity, the upper surface area, and the upper wall values
+    :return type: dict
+    '''
+    fixvel = numpy.nonzero(sb.fixvel > 0.0)
+    A = sb.L[0] * sb.L[1]   # Upper surface area
+
+    # Summation of shear stress contributions
+    tau = 0.0
+    for j in fixvel[0]:
+        if sb.vel[j,0] > 0.0:
+            tau += -sb.force[j,0]/A
+
+    shearvel = 0.0
+    if len(fixvel[0]) > 0:
+        shearvel = sb.vel[fixvel,0].max()
+
+    return {'tau': tau, 'shearvel': shearvel, 'A': A,
+            'time_file_dt': sb.time_file_dt[0],
+            'w_x': sb.w_x[0],
+            'w_force': sb.w_force[0],
+            'w_sigma0': sb.w_sigma0[0]}
+
+def stepInertia(sb):
+    '''
+    Inertia parameter of an output step, used by ``sim.visualize('inertia')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The current time and the inertia parameter
+    :return type: dict
+    '''
+    return {'t': sb.currentTime(), 'I': sb.inertiaParameterPlanarShear()}
+
+def stepMeanFluidPressure(sb):
+    '''
+    Mean fluid pressure of an output step, used by
+    ``sim.visualize('mean-fluid-pressure')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The mean fluid pressure
+    :return type: dict
+    '''
+    return {'p_mean': numpy.mean(sb.p_f)}
+
+def stepFluidPressure(sb):
+    '''
+    Horizontally averaged fluid pressures of an output step, used by
+    ``sim.visualize('fluid-pressure')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The fluid pressure profile and the shear strain
+    :return type: dict
+    '''
+    return {'p_f': numpy.average(numpy.average(sb.p_f, axis=0), axis=0),
+            'shear_strain': sb.shearStrain()}
+
+def stepPorosity(sb):
+    '''
+    Horizontally averaged porosities of an output step, used by
+    ``sim.visualize('porosity')``.
+
+    :param sb: The output step
+    :type sb: sim
+    :returns: The porosity profile and the shear strain
+    :return type: dict
+    '''
+    return {'phi': numpy.average(numpy.average(sb.phi, axis=0), axis=0),
+            'shear_strain': sb.shearStrain()}
+
+def stepContactTensors(sb, slices=1):
+    '''
+    Contact fabric and stress tensors of an output step, for use with
+    ``sim.stepSeries()``, ``sim.mapSteps()`` or ``sim.iterSteps()``. Use
+    ``functools.partial(stepContactTensors, slices=n)`` for more than one
+    slab.
+
+    :param sb: The output step
+    :type sb: sim
+    :param slices: The number of horizontal slabs (default = 1)
+    :type slices: int
+    :returns: The current time and the slab values of
+        :func:`sim.contactTensors()`
+    :return type: dict
+    '''
+    values = sb.contactTensors(slices)
+    values['t'] = sb.currentTime()
+    return values
+
+def binaryLayout(version, nd, np, nw, nb0, num, fluid=False, cfd_solver=0,
+        bonds=True, sigma0mod=True):
+    '''
+    Compute the position and type of every section in a ``sphere`` binary
+    file. The layout follows the order in which :func:`sim.readbin()` reads the
+    file.
+
+    :param version: The file version
+    :type version: float
+    :param nd: The number of spatial dimensions
+    :type nd: int
+    :param np: The number of particles
+    :type np: int
+    :param nw: The number of dynamic walls
+    :type nw: int
+    :param nb0: The number of bonds
+    :type nb0: int
+    :param num: The number of fluid cells along each axis
+    :type num: list of int
+    :param fluid: The file contains fluid data
+    :type fluid: bool
+    :param cfd_solver: The fluid solver (0: Navier-Stokes, 1: Darcy)
+    :type cfd_solver: int
+    :param bonds: The file contains bond information (default = True)
+    :type bonds: bool
+    :param sigma0mod: The file contains information about modulating stresses
+        at the top wall (default = True)
+    :type sigma0mod: bool
+    :returns: A list of ``(name, dtype, shape, offset, fill)`` tuples in file
+        order. ``name`` is the attribute name, or a tuple of attribute names
+        for sections where several values are interleaved per element, in
+        which case ``dtype`` is a structured type with one field per name.
+        ``offset`` is the position of the section in bytes, or ``None`` for
+        values that are not stored in files of this version. These values are
+        set to arrays of ``shape`` filled with ``fill`` when reading.
+        Sections on the fluid grid have the shape ``(num[2], num[1],
+        num[0])``, in the order they are stored. Layouts are cached per
+        combination of the arguments and shared between calls, and must not
+        be modified.
+    :return type: list
+    '''
+    signature = (float(version), int(nd), int(np), int(nw), int(nb0),
+            tuple([int(n) for n in num]), bool(fluid), int(cfd_solver),
+            bool(bonds), bool(sigma0mod))
+    if signature in binary_layouts:
+        return binary_layouts[signature]
+
+    f8 = numpy.dtype(numpy.float64)
+    i4 = numpy.dtype(numpy.int32)
+    u4 = numpy.dtype(numpy.uint32)
+    nd = int(nd)
+    np = int(np)
+    nw = int(nw)
+    nb0 = int(nb0)
+    cells = (int(num[2]), int(num[1]), int(num[0]))
+
+    layout = []
+    position = [0]
+
+    def stored(name, dtype, shape=(1,)):
+        layout.append((name, dtype, shape, position[0], None))
+        position[0] += dtype.itemsize*int(numpy.prod(shape))
+
+    def missing(name, dtype, shape=(1,), fill=0):
+        layout.append((name, dtype, shape, None, fill))
+
+    def interleaved(names, shape, vector=None):
+        fields = []
+        for name in names:
+            if name == vector:
+                fields.append((name, f8, (nd,)))
+            else:
+                fields.append((name, f8))
+        stored(tuple(names), numpy.dtype(fields), shape)
+
+    stored('version', f8)
+    stored('nd', i4)
+    stored('np', u4)
+    for name in ['time_dt', 'time_current', 'time_total', 'time_file_dt']:
+        stored(name, f8)
+    stored('time_step_count', u4)
+    stored('origo', f8, (nd,))
+    stored('L', f8, (nd,))
+    stored('num', u4, (nd,))
+    stored('periodic', i4)
+    if version >= 2.14:
+        stored('adaptive', i4)
+    else:
+        missing('adaptive', f8)
+
+    interleaved(['x', 'radius'], (np,), vector='x')
+    if version >= 1.03:
+        stored('xyzsum', f8, (np, 3))
+    else:
+        stored('xyzsum', f8, (np, 2))
+    interleaved(['vel', 'fixvel'], (np,), vector='vel')
+    for name in ['force', 'angpos', 'angvel', 'torque']:
+        stored(name, f8, (np, nd))
+    for name in ['es_dot', 'es', 'ev_dot', 'ev', 'p']:
+        stored(name, f8, (np,))
+
+    stored('g', f8, (nd,))
+    for name in ['k_n', 'k_t', 'k_r']:
+        stored(name, f8)
+    if version >= 2.13:
+        stored('E', f8)
+    else:
+        missing('E', f8)
+    for name in ['gamma_n', 'gamma_t', 'gamma_r', 'mu_s', 'mu_d', 'mu_r',
+            'gamma_wn', 'gamma_wt', 'mu_ws', 'mu_wd', 'rho']:
+        stored(name, f8)
+    stored('contactmodel', u4)
+    for name in ['kappa', 'db', 'V_b']:
+        stored(name, f8)
+
+    stored('nw', u4)
+    stored('wmode', i4, (nw,))
+    interleaved(['w_n', 'w_x'], (nw,), vector='w_n')
+    interleaved(['w_m', 'w_vel', 'w_force', 'w_sigma0'], (nw,))
+    if sigma0mod:
+        stored('w_sigma0_A', f8)
+        stored('w_sigma0_f', f8)
+    if version >= 2.1:
+        stored('w_tau_x', f8)
+    else:
+        missing('w_tau_x', f8)
+
+    if bonds:
+        stored('lambda_bar', f8)
+        stored('nb0', u4)
+        stored('sigma_b', f8)
+        stored('tau_b', f8)
+        stored('bonds', u4, (nb0, 2))
+        stored('bonds_delta_n', f8, (nb0,))
+        stored('bonds_delta_t', f8, (nb0, nd))
+        stored('bonds_omega_n', f8, (nb0,))
+        stored('bonds_omega_t', f8, (nb0, nd))
+    else:
+        missing('nb0', u4)
+
+    if fluid:
+        if version >= 2.0:
+            stored('cfd_solver', i4)
+        else:
+            missing('cfd_solver', i4)
+        stored('mu', f8)
+        stored(('v_f', 'p_f', 'phi', 'dphi'), numpy.dtype([('v_f', f8, (3,)),
+            ('p_f', f8), ('phi', f8), ('dphi', f8)]), cells)
+
+        if version >= 0.36:
+            for name in ['rho_f', 'p_mod_A', 'p_mod_f', 'p_mod_phi']:
+                stored(name, f8)
+            if version >= 2.12 and cfd_solver == 1:
+                for name in ['bc_xn', 'bc_xp', 'bc_yn', 'bc_yp']:
+                    stored(name, i4)
+            for name in ['bc_bot', 'bc_top', 'free_slip_bot', 'free_slip_top']:
+                stored(name, i4)
+            if version >= 2.11:
+                stored('bc_bot_flux', f8)
+                stored('bc_top_flux', f8)
+            else:
+                missing('bc_bot_flux', f8)
+                missing('bc_top_flux', f8)
+            if version >= 2.15:
+                stored('p_f_constant', i4, cells)
+            else:
+                missing('p_f_constant', i4, cells)
+
+        if version >= 2.0 and cfd_solver == 0:
+            for name in ['gamma', 'theta', 'beta', 'tolerance']:
+                stored(name, f8)
+            stored('maxiter', u4)
+            if version >= 1.01:
+                stored('ndem', u4)
+            else:
+                missing('ndem', u4, fill=1)
+            if version >= 1.04:
+                stored('c_phi', f8)
+                stored('c_v', f8)
+                if version == 1.06:
+                    stored('c_a', f8)
+                elif version >= 1.07:
+                    stored('dt_dem_fac', f8)
+                else:
+                    missing('c_a', f8, fill=1)
+            else:
+                missing('c_phi', f8, fill=1)
+                missing('c_v', f8, fill=1)
+            for name in ['f_d', 'f_p', 'f_v', 'f_sum']:
+                if version >= 1.05:
+                    stored(name, f8, (np, nd))
+                else:
+                    missing(name, f8, (np, nd))
+
+        elif version >= 2.0 and cfd_solver == 1:
+            stored('tolerance', f8)
+            stored('maxiter', u4)
+            stored('ndem', u4)
+            stored('c_phi', f8)
+            stored('f_p', f8, (np, nd))
+            stored('beta_f', f8)
+            stored('k_c', f8)
+
+    if version >= 1.02:
+        stored('color', i4, (np,))
+    else:
+        missing('color', i4, (np,))
+
+    if len(binary_layouts) >= 256:
+        binary_layouts.clear()
+    binary_layouts[signature] = layout
+    return layout
+
+# Layouts computed by binaryLayout(), by argument values
+binary_layouts = {}
+
+def binaryLayoutSize(layout):
+    '''
+    Returns the size of a ``sphere`` binary file with the given layout.
+
+    :param layout: The file layout, see :func:`binaryLayout()`
+    :type layout: list
+    :returns: The file size in bytes
+    :return type: int
+    '''
+    # The sections are stored in order, so the file ends with the last
+    # stored section
+    for name, dtype, shape, offset, fill in reversed(layout):
+        if offset is not None:
+            return offset + dtype.itemsize*int(numpy.prod(shape))
+    return 0
+
+def checkBinarySize(size, layout, fluid=False):
+    '''
+    Check that the size of a ``sphere`` binary file matches its layout. Files
+    may be larger than the layout without fluid data, as the fluid data is
+    then not read.
+
+    :param size: The file size in bytes
+    :type size: int
+    :param layout: The file layout, see :func:`binaryLayout()`
+    :type layout: list
+    :param fluid: The layout includes the fluid data
+    :type fluid: bool
+    '''
+    expected = binaryLayoutSize(layout)
+    if size < expected or (fluid and size > expected):
+        raise Exception('Error: The file size of {} bytes does not match the '
+                '{} bytes expected from its header. The file is truncated, or '
+                'the fluid and bond settings do not match the file.'
+                .format(size, expected))
+
+def readBinaryLayout(fh, fluid=False, bonds=True, sigma0mod=True,
+        check=True):
+    '''
+    Read the values that determine the layout of a ``sphere`` binary file
+    (version, dimensions, particle, wall, bond and fluid cell counts, and
+    the fluid solver) by seeking directly to them, and return the layout
+    computed by :func:`binaryLayout()`. The file size is checked against the
+    layout with :func:`checkBinarySize()` before any other data is read.
+
+    :param fh: An open binary file, or a file object holding the file
+        contents in memory, such as ``io.BytesIO``
+    :type fh: file
+    :param fluid: The file contains fluid data
+    :type fluid: bool
+    :param bonds: The file contains bond information (default = True)
+    :type bonds: bool
+    :param sigma0mod: The file contains information about modulating stresses
+        at the top wall (default = True)
+    :type sigma0mod: bool
+    :param check: Check the file size (default = True)
+    :type check: bool
+    :returns: The file layout, see :func:`binaryLayout()`
+    :return type: list
+    '''
+    fh.seek(0, 2)
+    size = fh.tell()
+
+    def read(offset, dtype, count):
+        if offset + dtype.itemsize*count > size:
+            raise Exception('Error: The file size of {} bytes is too small '
+                    'for the values in its header. The file is truncated, or '
+                    'the fluid and bond settings do not match the file.'
+                    .format(size))
+        fh.seek(offset)
+        return numpy.frombuffer(fh.read(dtype.itemsize*count), dtype=dtype)
+
+    def value(layout, name):
+        for section_name, dtype, shape, offset, fill in layout:
+            if section_name == name:
+                if offset is None:
+                    return numpy.full(shape, fill, dtype=dtype)
+                return read(offset, dtype, int(numpy.prod(shape)))
+
+    header = read(0, numpy.dtype([('version', numpy.float64),
+        ('nd', numpy.int32), ('np', numpy.uint32)]), 1)
+    version = header['version'][0]
+    nd = header['nd'][0]
+    np = header['np'][0]
+
+    # The wall, bond and fluid solver values are stored after sections whose
+    # sizes depend on the values before them
+    layout = binaryLayout(version, nd, np, 0, 0, numpy.zeros(nd), fluid, 0,
+            bonds, sigma0mod)
+    num = value(layout, 'num')
+    nw = value(layout, 'nw')[0]
+    layout = binaryLayout(version, nd, np, nw, 0, num, fluid, 0, bonds,
+            sigma0mod)
+    nb0 = value(layout, 'nb0')[0]
+    layout = binaryLayout(version, nd, np, nw, nb0, num, fluid, 0, bonds,
+            sigma0mod)
+    cfd_solver = 0
+    if fluid:
+        cfd_solver = value(layout, 'cfd_solver')[0]
+    layout = binaryLayout(version, nd, np, nw, nb0, num, fluid, cfd_solver,
+            bonds, sigma0mod)
+    if check:
+        checkBinarySize(size, layout, fluid)
+    return layout
+
+class SimSeries:
+    '''
+    Index of the output files of a simulation. The output folder is scanned
+    for ``<sid>.outputNNNNN.bin`` files, and the current time, time step count
+    and file size of each output step are read from the file headers. The index
+    is stored in the sidecar file ``<sid>.index.npz`` in the output folder, and
+    is extended with new output files when it is loaded or updated.
+
+    :param sid: The simulation id
+    :type sid: str
+    :param folder: The folder containing the output files
+        (default = '../output/')
+    :type folder: str
+    :param update: Scan the output folder for new files (default = True)
+    :type update: bool
+    '''
+
+    def __init__(self, sid, folder='../output/', update=True):
+        self.sid = sid
+        self.folder = folder
+        self.indexfile = os.path.join(folder, sid + '.index.npz')
+
+        self.time_current = numpy.zeros(0, dtype=numpy.float64)
+        self.time_step_count = numpy.zeros(0, dtype=numpy.uint32)
+        self.size = numpy.zeros(0, dtype=numpy.int64)
+        self.mtime = numpy.zeros(0, dtype=numpy.float64)
+
+        if os.path.isfile(self.indexfile):
+            index = numpy.load(self.indexfile)
+            self.time_current = index['time_current']
+            self.time_step_count = index['time_step_count']
+            self.size = index['size']
+            self.mtime = index['mtime']
+
+        if update:
+            self.update()
+
+    def __len__(self):
+        return len(self.time_current)
+
+    def filename(self, step):
+        '''
+        Returns the path of the output file for a step.
+
+        :param step: The output file number, starting from 0
+        :type step: int
+        :returns: The file path
+        :return type: str
+        '''
+        return os.path.join(self.folder,
+                "{0}.output{1:0=5}.bin".format(self.sid, step))
+
+    def update(self):
+        '''
+        Add output files that were written since the index was last updated,
+        and save the index to the sidecar file. The last indexed file is read
+        again if its size or modification time has changed, and the index is
+        truncated if indexed files were removed.
+
+        :returns: The number of indexed output steps
+        :return type: int
+        '''
+        header = numpy.dtype([('version', numpy.float64),
+            ('nd', numpy.int32), ('np', numpy.uint32),
+            ('time_dt', numpy.float64), ('time_current', numpy.float64),
+            ('time_total', numpy.float64), ('time_file_dt', numpy.float64),
+            ('time_step_count', numpy.uint32)])
+
+        # Find the first step that needs to be read
+        n = len(self)
+        while n > 0:
+            fn = self.filename(n - 1)
+            if os.path.isfile(fn):
+                stat = os.stat(fn)
+                if stat.st_size == self.size[n - 1] and \
+                        stat.st_mtime == self.mtime[n - 1]:
+                    break
+            n -= 1
+        changed = n < len(self)
+
+        time_current = list(self.time_current[:n])
+        time_step_count = list(self.time_step_count[:n])
+        size = list(self.size[:n])
+        mtime = list(self.mtime[:n])
+        while os.path.isfile(self.filename(n)):
+            fn = self.filename(n)
+            stat = os.stat(fn)
+            values = numpy.fromfile(fn, dtype=header, count=1)
+            if len(values) < 1:  # the file is still being written
+                break
+            time_current.append(values['time_current'][0])
+            time_step_count.append(values['time_step_count'][0])
+            size.append(stat.st_size)
+            mtime.append(stat.st_mtime)
+            n += 1
+            changed = True
+
+        if changed:
+            self.time_current = numpy.array(time_current, dtype=numpy.float64)
+            self.time_step_count = numpy.array(time_step_count,
+                    dtype=numpy.uint32)
+            self.size = numpy.array(size, dtype=numpy.int64)
+            self.mtime = numpy.array(mtime, dtype=numpy.float64)
+            self.save()
+        return len(self)
+
+    def save(self):
+        '''
+        Write the index to the sidecar file. The file is written under a
+        temporary name first, so that readers never see a partial index.
+        '''
+        tmpfile = self.indexfile + '.tmp'
+        fh = None
+        try:
+            fh = open(tmpfile, 'wb')
+            numpy.savez(fh, time_current=self.time_current,
+                    time_step_count=self.time_step_count, size=self.size,
+                    mtime=self.mtime)
+        finally:
+            if fh is not None:
+                fh.close()
+        os.rename(tmpfile, self.indexfile)
+
+    def step(self, time):
+        '''
+        Find the output step with the current time closest to the given time
+        by binary search in the index. The output times are not required to be
+        equally spaced.
+
+        :param time: The desired current time [s]
+        :type time: float
+        :returns: The output file number
+        :return type: int
+        '''
+        if len(self) == 0:
+            raise Exception('Error: No output files found for "' + self.sid
+                    + '" in ' + self.folder)
+        if time < self.time_current[0] or time > self.time_current[-1]:
+            raise Exception('Error: The specified time {} s is outside the '
+                    'range of output files [{}; {}] s.'.format(time,
+                        self.time_current[0], self.time_current[-1]))
+
+        i = int(numpy.searchsorted(self.time_current, time))
+        if i > 0 and (i == len(self) or time - self.time_current[i-1]
+                <= self.time_current[i] - time):
+            i -= 1
+        return i
+
+    def read(self, step, sb=None, fluid=False, **kwargs):
+        '''
+        Read an output step into a ``sim`` object.
+
+        :param step: The output file number, starting from 0
+        :type step: int
+        :param sb: The object to read into. A new object is created if not
+            given (default = None)
+        :type sb: sim
+        :param fluid: The simulation contains fluid data. Only used when a new
+            object is created (default = False)
+        :type fluid: bool
+        :param kwargs: Additional arguments to :func:`sim.readbin()`, such as
+            ``fields`` or ``mmap``
+        :returns: The object containing the output step
+        :return type: sim
+        '''
+        if sb is None:
+            sb = sim(self.sid, fluid=fluid)
+        kwargs.setdefault('verbose', False)
+        sb.readbin(self.filename(step), **kwargs)
+        return sb
+
+class OutputArchive:
+    '''
+    Compressed single-file container for the output files of a simulation,
+    stored as ``<sid>.outputs.zip`` in the output folder. Each output file is
+    split into the values described by :func:`binaryLayout()`. Values that are
+    equal to those of the first packed file, e.g. the particle radii and
+    colors, the parameters and the bonds, are stored once, and the remaining
+    values of each output step are compressed in a separate archive member.
+    The member index of the archive gives random access to a step without
+    decompressing the other steps. Unpacked output files are identical to the
+    original files.
+
+    :param sid: The simulation id
+    :type sid: str
+    :param folder: The folder containing the output files and the archive
+        (default = '../output/')
+    :type folder: str
+    :param compression: The compression of new archive members, 'zlib' or
+        'lzma' (default = 'zlib')
+    :type compression: str
+    '''
+
+    def __init__(self, sid, folder='../output/', compression='zlib'):
+        self.sid = sid
+        self.folder = folder
+        self.archivefile = os.path.join(folder, sid + '.outputs.zip')
+        if compression == 'zlib':
+            self.compression = zipfile.ZIP_DEFLATED
+        elif compression == 'lzma' and hasattr(zipfile, 'ZIP_LZMA'):
+            self.compression = zipfile.ZIP_LZMA
+        else:
+            raise Exception('Error: The compression "{}" is not '
+                    'supported'.format(compression))
+
+    def exists(self):
+        '''
+        Returns True if the archive file exists.
+        '''
+        return os.path.isfile(self.archivefile)
+
+    def filename(self, step):
+        '''
+        Returns the path of the output file for a step.
+
+        :param step: The output file number, starting from 0
+        :type step: int
+        :returns: The file path
+        :return type: str
+        '''
+        return os.path.join(self.folder,
+                "{0}.output{1:0=5}.bin".format(self.sid, step))
+
+    def steps(self):
+        '''
+        Returns the numbers of the output steps stored in the archive.
+
+        :returns: The sorted output file numbers
+        :return type: list of int
+        '''
+        if not self.exists():
+            return []
+        zf = zipfile.ZipFile(self.archivefile, 'r')
+        try:
+            return sorted([int(member[len('output'):])
+                for member in zf.namelist() if member.startswith('output')])
+        finally:
+            zf.close()
+
+    def outputFiles(self):
+        '''
+        Returns the numbers of the output files in the output folder.
+
+        :returns: The sorted output file numbers
+        :return type: list of int
+        '''
+        prefix = self.sid + '.output'
+        steps = []
+        for fn in os.listdir(self.folder):
+            number = fn[len(prefix):-len('.bin')]
+            if fn.startswith(prefix) and fn.endswith('.bin') and \
+                    number.isdigit():
+                steps.append(int(number))
+        return sorted(steps)
+
+    def pack(self, remove=False, verbose=True):
+        '''
+        Add the output files that are not yet in the archive. The archive is
+        created if it does not exist.
+
+        :param remove: Remove the output files after checking that they are
+            restored identically from the archive (default = False)
+        :type remove: bool
+        :param verbose: Show the names of the packed files (default = True)
+        :type verbose: bool
+        :returns: The number of output files added to the archive
+        :return type: int
+        '''
+        packed = set(self.steps())
+        steps = self.outputFiles()
+        added = 0
+
+        zf = zipfile.ZipFile(self.archivefile, 'a', self.compression,
+                allowZip64=True)
+        try:
+            reference = None
+            if 'reference' in zf.namelist():
+                reference = self.decode(zf.read('reference'))[1]
+
+            for step in steps:
+                if step in packed:
+                    continue
+                fh = open(self.filename(step), 'rb')
+                try:
+                    raw = fh.read()
+                    params = self.layoutParams(fh, raw)
+                finally:
+                    fh.close()
+                names, parts = self.split(raw, params)
+
+                # The values of the first packed file are shared by all steps
+                if reference is None:
+                    reference = parts
+                    zf.writestr('reference', self.encode({}, names, parts))
+
+                static = [name for name in names
+                        if reference.get(name) == parts[name]]
+                dynamic = [name for name in names if name not in static]
+                manifest = {'layout': params, 'size': len(raw),
+                        'names': names, 'static': static}
+                zf.writestr('output{0:0=5}'.format(step),
+                        self.encode(manifest, dynamic, parts))
+                added += 1
+                if verbose:
+                    print(self.filename(step))
+        finally:
+            zf.close()
+
+        if remove:
+            for step in steps:
+                fh = open(self.filename(step), 'rb')
+                try:
+                    identical = fh.read() == self.raw(step)
+                finally:
+                    fh.close()
+                if not identical:
+                    raise Exception('Error: The archived copy of ' +
+                            self.filename(step) + ' differs from the file')
+                os.remove(self.filename(step))
+        return added
+
+    def unpack(self, steps=None, verbose=True):
+        '''
+        Restore output files from the archive.
+
+        :param steps: The output file numbers to restore (default = None,
+            which restores all steps in the archive)
+        :type steps: list of int
+        :param verbose: Show the names of the restored files (default = True)
+        :type verbose: bool
+        '''
+        if steps is None:
+            steps = self.steps()
+        for step in steps:
+            fh = open(self.filename(step), 'wb')
+            try:
+                fh.write(self.raw(step))
+            finally:
+                fh.close()
+            if verbose:
+                print(self.filename(step))
+
+    def raw(self, step):
+        '''
+        Returns the contents of the output file of a step. Only the archive
+        member of the step and the shared values are decompressed.
+
+        :param step: The output file number, starting from 0
+        :type step: int
+        :returns: The file contents
+        :return type: bytes
+        '''
+        return self.load(step)[1]
+
+    def load(self, step):
+        '''
+        Returns the manifest and the contents of the output file of a step.
+        '''
+        zf = zipfile.ZipFile(self.archivefile, 'r')
+        try:
+            manifest, parts = self.decode(
+                    zf.read('output{0:0=5}'.format(step)))
+            if manifest['static']:
+                reference = self.decode(zf.read('reference'))[1]
+                for name in manifest['static']:
+                    parts[name] = reference[name]
+        finally:
+            zf.close()
+        return manifest, self.join(manifest['names'], parts,
+                manifest['layout'], manifest['size'])
+
+    def read(self, step, sb, verbose=True, fields=None):
+        '''
+        Read an output step from the archive into a ``sim`` object, in the
+        same way as :func:`sim.readbin()`.
+
+        :param step: The output file number, starting from 0
+        :type step: int
+        :param sb: The object to read into
+        :type sb: sim
+        :param verbose: Show diagnostic information (default = True)
+        :type verbose: bool
+        :param fields: Only read the named values, see :func:`sim.readbin()`
+            (default = None)
+        :type fields: list of str
+        '''
+        if verbose:
+            print("Input file: {0} in {1}".format(self.filename(step),
+                self.archivefile))
+        manifest, raw = self.load(step)
+        if manifest['layout'] is None:
+            raise Exception('Error: The layout of ' + self.filename(step) +
+                    ' is unknown')
+        version, nd, np, nw, nb0, num, fluid, cfd_solver = manifest['layout']
+        if sb.fluid and not fluid:
+            raise Exception('Error: ' + self.filename(step) +
+                    ' contains no fluid data')
+
+        layout = binaryLayout(version, nd, np, nw, nb0, num, sb.fluid,
+                cfd_solver)
+        checkBinarySize(len(raw), layout, sb.fluid)
+        data = numpy.frombuffer(bytearray(raw), dtype=numpy.uint8)
+        try:
+            sb.readLayout(None, layout, data, fields=fields)
+        finally:
+            sb.version[0] = VERSION
+
+    def layoutParams(self, fh, raw):
+        '''
+        Find the layout of an output file. The file is assumed to contain
+        fluid data if the layout without fluid data does not match the file
+        size.
+
+        :returns: The :func:`binaryLayout()` arguments ``[version, nd, np, nw,
+            nb0, num, fluid, cfd_solver]``, or None if no layout matches the
+            file size
+        :return type: list
+        '''
+        for fluid in [False, True]:
+            try:
+                layout = readBinaryLayout(fh, fluid)
+            except Exception:
+                continue
+            if binaryLayoutSize(layout) != len(raw):
+                continue
+            values = {'cfd_solver': [0]}
+            for name, dtype, shape, offset, fill in layout:
+                if offset is None:
+                    values[name] = numpy.full(shape, fill, dtype=dtype)
+                elif not isinstance(name, tuple):
+                    values[name] = numpy.frombuffer(raw, dtype=dtype,
+                            count=int(numpy.prod(shape)), offset=offset)
+            return [float(values['version'][0]), int(values['nd'][0]),
+                    int(values['np'][0]), int(values['nw'][0]),
+                    int(values['nb0'][0]), [int(n) for n in values['num']],
+                    fluid, int(values['cfd_solver'][0])]
+        return None
+
+    def split(self, raw, params):
+        '''
+        Split the contents of an output file into the bytes of each value.
+        Values that are interleaved in the file are separated.
+
+        :returns: The value names in file order, and a dict with the bytes of
+            each value
+        :return type: list, dict
+        '''
+        if params is None:
+            return ['raw'], {'raw': raw}
+        names = []
+        parts = {}
+        for name, dtype, shape, offset, fill in binaryLayout(*params):
+            if offset is None:
+                continue
+            count = int(numpy.prod(shape))
+            if isinstance(name, tuple):
+                block = numpy.frombuffer(raw, dtype=dtype, count=count,
+                        offset=offset)
+                for field in name:
+                    names.append(field)
+                    parts[field] = numpy.ascontiguousarray(block[field])\
+                            .tobytes()
+            else:
+                names.append(name)
+                parts[name] = raw[offset:offset + count*dtype.itemsize]
+        return names, parts
+
+    def join(self, names, parts, params, size):
+        '''
+        Assemble the contents of an output file from the bytes of each value,
+        the inverse of :func:`split()`.
+        '''
+        if params is None:
+            return parts['raw']
+        raw = bytearray(size)
+        for name, dtype, shape, offset, fill in binaryLayout(*params):
+            if offset is None:
+                continue
+            if isinstance(name, tuple):
+                block = numpy.empty(shape, dtype=dtype)
+                for field in name:
+                    block[field] = numpy.frombuffer(parts[field],
+                            dtype=dtype.fields[field][0].base)\
+                            .reshape(block[field].shape)
+                value = block.tobytes()
+            else:
+                value = parts[name]
+            raw[offset:offset + len(value)] = value
+        return bytes(raw)
+
+    def encode(self, manifest, names, parts):
+        '''
+        Returns an archive member with a manifest and the bytes of the named
+        values. The member starts with the length of the JSON encoded
+        manifest.
+        '''
+        manifest = dict(manifest)
+        manifest['fields'] = [[name, len(parts[name])] for name in names]
+        header = json.dumps(manifest).encode('ascii')
+        return numpy.array([len(header)], dtype=numpy.uint32).tobytes() + \
+                header + b''.join([parts[name] for name in names])
+
+    def decode(self, member):
+        '''
+        Returns the manifest and a dict with the bytes of each value of an
+        archive member written by :func:`encode()`.
+        '''
+        length = int(numpy.frombuffer(member, dtype=numpy.uint32, count=1)[0])
+        manifest = json.loads(member[4:4 + length].decode('ascii'))
+        parts = {}
+        position = 4 + length
+        for name, size in manifest['fields']:
+            parts[str(name)] = member[position:position + size]
+            position += size
+        return manifest, parts
+
+class CellList:
+    '''
+    Cell list of points for neighbour searches. The points are sorted into a
+    uniform grid of cells with a side length of at least ``cellsize``, so that
+    points closer than ``cellsize`` are in the same or in neighbouring cells.
+    The grid spans the points along normal axes, and the domain given by
+    ``origo`` and ``L`` along periodic axes, where distances are measured to
+    the nearest periodic image.
+
+    :param x: The point positions
+    :type x: numpy.array
+    :param cellsize: The smallest cell side length
+    :type cellsize: float
+    :param origo: The lower corner of the domain (default = None)
+    :type origo: numpy.array
+    :param L: The side lengths of the domain (default = None)
+    :type L: numpy.array
+    :param periodic: The periodic boundaries, 0: none, 1: x and y, 2: x, as
+        in ``sim.periodic`` (default = 0)
+    :type periodic: int
+    '''
+
+    def __init__(self, x, cellsize, origo=None, L=None, periodic=0):
+        self.x = numpy.asarray(x, dtype=numpy.float64)
+        n, nd = self.x.shape
+
+        self.periodic = numpy.zeros(nd, dtype=bool)
+        if periodic == 1:
+            self.periodic[:2] = True
+        elif periodic == 2:
+            self.periodic[0] = True
+        if L is None or origo is None:
+            self.periodic[:] = False
+        else:
+            self.periodic &= numpy.asarray(L[:nd]) > 0.0
+
+        if n > 0:
+            self.lower = self.x.min(axis=0)
+            self.length = self.x.max(axis=0) - self.lower
+        else:
+            self.lower = numpy.zeros(nd)
+            self.length = numpy.zeros(nd)
+        if self.periodic.any():
+            self.lower[self.periodic] = numpy.asarray(origo)[:nd][self.periodic]
+            self.length[self.periodic] = numpy.asarray(L)[:nd][self.periodic]
+
+        # Use larger cells if the grid would have more cells than points
+        cellsize = max(float(cellsize), 1e-300)
+        self.num = numpy.maximum(1, numpy.floor(self.length/cellsize))\
+                .astype(numpy.int64)
+        while numpy.prod(self.num.astype(numpy.float64)) > 8.0*max(n, 1):
+            cellsize *= 2.0
+            self.num = numpy.maximum(1, numpy.floor(self.length/cellsize))\
+                    .astype(numpy.int64)
+        self.cellsize = numpy.where(self.length > 0.0,
+                self.length/self.num, cellsize)
+
+        self.cell = self.pointCells(self.x)
+        flat = numpy.ravel_multi_index(self.cell.T, self.num)
+        self.order = numpy.argsort(flat, kind='mergesort')
+        self.count = numpy.bincount(flat, minlength=int(numpy.prod(self.num)))
+        self.start = numpy.cumsum(self.count) - self.count
+
+    def pointCells(self, points):
+        '''
+        Returns the cell of each point, wrapping the coordinates along
+        periodic axes. Points outside the grid are placed in the outermost
+        cells.
+
+        :param points: The point positions
+        :type points: numpy.array
+        :returns: The cell index along each axis of each point
+        :return type: numpy.array
+        '''
+        position = points - self.lower
+        if self.periodic.any():
+            position[:, self.periodic] %= self.length[self.periodic]
+        return numpy.clip(numpy.floor(position/self.cellsize)
+                .astype(numpy.int64), 0, self.num - 1)
+
+    def wrapOffsets(self, offset):
+        '''
+        Returns cell offsets with the components along periodic axes wrapped
+        to the range ``[-num//2, num - num//2)``, so that offsets reaching the
+        same cell through the boundary are equal.
+        '''
+        offset = numpy.array(offset)
+        half = self.num//2
+        wrapped = (offset + half) % self.num - half
+        return numpy.where(self.periodic, wrapped, offset)
+
+    def offsets(self, distance):
+        '''
+        Returns the offsets to the cells that may contain points within a
+        distance of a point.
+
+        :param distance: The search distance
+        :type distance: float
+        :returns: The cell offsets, one per row
+        :return type: numpy.array
+        '''
+        axes = []
+        for axis in range(len(self.num)):
+            k = int(numpy.ceil(distance/self.cellsize[axis]))
+            offset = numpy.arange(-k, k + 1)
+            if self.periodic[axis]:
+                half = self.num[axis]//2
+                offset = numpy.unique((offset + half) % self.num[axis] - half)
+            else:
+                offset = offset[numpy.abs(offset) < self.num[axis]]
+            axes.append(offset)
+        return numpy.array(numpy.meshgrid(*axes, indexing='ij'))\
+                .reshape(len(axes), -1).T
+
+    def neighbourCells(self, cell, offset):
+        '''
+        Returns the flat index of the cells at an offset from the given cells,
+        and whether these cells are inside the grid.
+        '''
+        valid = numpy.ones(len(cell), dtype=bool)
+        flat = numpy.zeros(len(cell), dtype=numpy.int64)
+        for axis in range(len(self.num)):
+            neighbour = cell[:, axis] + offset[axis]
+            if self.periodic[axis]:
+                neighbour %= self.num[axis]
+            else:
+                valid &= (neighbour >= 0) & (neighbour < self.num[axis])
+            flat = flat*self.num[axis] + neighbour
+        flat[~valid] = 0
+        return flat, valid
+
+    def nearestImage(self, vector):
+        '''
+        Replace vectors between points by the vectors to the nearest periodic
+        image, and return them.
+        '''
+        for axis in numpy.nonzero(self.periodic)[0]:
+            vector[:, axis] -= self.length[axis]*\
+                    numpy.round(vector[:, axis]/self.length[axis])
+        return vector
+
+    def pairs(self, distance, chunk=65536):
+        '''
+        Find all pairs of points that are closer than a distance.
+
+        :param distance: The largest distance between the points of a pair
+        :type distance: float
+        :param chunk: The number of points searched at a time, which limits
+            the memory use (default = 65536)
+        :type chunk: int
+        :returns: The indexes ``i`` and ``j`` of each pair with ``i < j``,
+            sorted by ``i`` and then ``j``, and the vectors from ``x[i]`` to
+            ``x[j]``
+        :return type: numpy.array, numpy.array, numpy.array
+        '''
+        found_i = []
+        found_j = []
+        found_vector = []
+        for offset in self.offsets(distance):
+            # Each pair of cells is searched once, from the cell where the
+            # offset to the other cell is lexicographically positive. Pairs in
+            # the same cell, or in cells that are their own neighbour at the
+            # opposite offset across a periodic boundary, are found twice and
+            # only kept with i < j.
+            opposite = self.wrapOffsets(-offset)
+            symmetric = numpy.array_equal(offset, opposite)
+            if not symmetric and tuple(offset) < tuple(opposite):
+                continue
+            for first in range(0, len(self.order), chunk):
+                points = numpy.arange(first, min(first + chunk,
+                    len(self.order)))
+                neighbour, valid = self.neighbourCells(
+                        self.cell[self.order[points]], offset)
+                count = numpy.where(valid, self.count[neighbour], 0)
+                total = int(count.sum())
+                if total == 0:
+                    continue
+
+                # Combine each point with every point in the neighbour cell
+                skip = numpy.repeat(self.start[neighbour]
+                        - (numpy.cumsum(count) - count), count)
+                i = self.order[numpy.repeat(points, count)]
+                j = self.order[skip + numpy.arange(total)]
+                if symmetric:
+                    i, j = i[i < j], j[i < j]
+                else:
+                    i, j = numpy.minimum(i, j), numpy.maximum(i, j)
+                vector = self.nearestImage(self.x[j] - self.x[i])
+                close = numpy.sum(vector**2, axis=1) < distance**2
+                found_i.append(i[close])
+                found_j.append(j[close])
+                found_vector.append(vector[close])
+
+        if len(found_i) == 0:
+            return numpy.zeros(0, dtype=numpy.int64), \
+                    numpy.zeros(0, dtype=numpy.int64), \
+                    numpy.zeros((0, self.x.shape[1]))
+        i = numpy.concatenate(found_i)
+        j = numpy.concatenate(found_j)
+        vector = numpy.concatenate(found_vector)
+        order = numpy.lexsort((j, i))
+        return i[order], j[order], vector[order]
+
+    def within(self, points, distance, chunk=65536):
+        '''
+        Find the points of the cell list that are closer than a distance to
+        each of the given positions.
+
+        :param points: The query positions, one per row
+        :type points: numpy.array
+        :param distance: The search distance
+        :type distance: float
+        :param chunk: The number of query positions searched at a time
+            (default = 65536)
+        :type chunk: int
+        :returns: The index ``q`` of the query position and the index ``j``
+            of the point for each match, sorted by ``q`` and then ``j``, and
+            the vectors from the query positions to ``x[j]``
+        :return type: numpy.array, numpy.array, numpy.array
+        '''
+        points = numpy.asarray(points, dtype=numpy.float64)\
+                .reshape(-1, self.x.shape[1])
+        cell = self.pointCells(points)
+        found_q = []
+        found_j = []
+        found_vector = []
+        for offset in self.offsets(distance):
+            for first in range(0, len(points), chunk):
+                queries = numpy.arange(first, min(first + chunk, len(points)))
+                neighbour, valid = self.neighbourCells(cell[queries], offset)
+                count = numpy.where(valid, self.count[neighbour], 0)
+                total = int(count.sum())
+                if total == 0:
+                    continue
+                skip = numpy.repeat(self.start[neighbour]
+                        - (numpy.cumsum(count) - count), count)
+                q = numpy.repeat(queries, count)
+                j = self.order[skip + numpy.arange(total)]
+                vector = self.nearestImage(self.x[j] - points[q])
+                close = numpy.sum(vector**2, axis=1) < distance**2
+                found_q.append(q[close])
+                found_j.append(j[close])
+                found_vector.append(vector[close])
+
+        if len(found_q) == 0:
+            return numpy.zeros(0, dtype=numpy.int64), \
+                    numpy.zeros(0, dtype=numpy.int64), \
+                    numpy.zeros((0, self.x.shape[1]))
+        q = numpy.concatenate(found_q)
+        j = numpy.concatenate(found_j)
+        vector = numpy.concatenate(found_vector)
+        order = numpy.lexsort((j, q))
+        return q[order], j[order], vector[order]
+
+    def nearest(self, points, k=1):
+        '''
+        Find the ``k`` nearest points of the cell list to each of the given
+        positions. The search distance is doubled until enough points are
+        found.
+
+        :param points: The query positions, one per row
+        :type points: numpy.array
+        :param k: The number of points to find (default = 1)
+        :type k: int
+        :returns: The indexes of the nearest points and their distances, with
+            one row per query position sorted by distance. Rows are filled
+            with -1 and ``inf`` if there are less than ``k`` points.
+        :return type: numpy.array, numpy.array
+        '''
+        points = numpy.asarray(points, dtype=numpy.float64)\
+                .reshape(-1, self.x.shape[1])
+        index = numpy.full((len(points), k), -1, dtype=numpy.int64)
+        distances = numpy.full((len(points), k), numpy.inf)
+
+        extent = numpy.sqrt(numpy.sum(self.length**2)) + \
+                numpy.max(self.cellsize)
+        distance = numpy.max(self.cellsize)
+        remaining = numpy.arange(len(points))
+        while len(remaining) > 0:
+            q, j, vector = self.within(points[remaining], distance)
+            length = numpy.sqrt(numpy.sum(vector**2, axis=1))
+            order = numpy.lexsort((length, q))
+            q, j, length = q[order], j[order], length[order]
+
+            # The k nearest points are known where k points were found within
+            # the search distance, or where all points were searched
+            found = numpy.bincount(q, minlength=len(remaining))
+            done = (found >= k) | (distance > extent)
+            rank = numpy.arange(len(q)) - \
+                    numpy.repeat(numpy.cumsum(found) - found, found)
+            take = done[q] & (rank < k)
+            index[remaining[q[take]], rank[take]] = j[take]
+            distances[remaining[q[take]], rank[take]] = length[take]
+            remaining = remaining[~done]
+            distance *= 2.0
+        return index, distances
+
+def contactKeys(pairs):
+    '''
+    Packs particle index pairs into 64-bit integer keys, with the smaller
+    index in the upper 32 bits and the larger index in the lower 32 bits, so
+    that a contact has the same key regardless of the order of its particles.
+    Sorting the keys sorts the pairs by the first and then by the second
+    index.
+
+    :param pairs: The particle pair indexes, one pair per column as in
+        ``sim.pairs``
+    :type pairs: numpy.array
+    :returns: The contact keys
+    :return type: numpy.array of uint64
+    '''
+    i = numpy.asarray(pairs[0]).astype(numpy.uint64)
+    j = numpy.asarray(pairs[1]).astype(numpy.uint64)
+    return (numpy.minimum(i, j) << numpy.uint64(32)) | numpy.maximum(i, j)
+
+def contactPairs(keys):
+    '''
+    Unpacks contact keys from :func:`contactKeys()` into particle index pairs.
+
+    :param keys: The contact keys
+    :type keys: numpy.array of uint64
+    :returns: The particle pair indexes, one pair per column
+    :return type: numpy.array of int64
+    '''
+    keys = numpy.asarray(keys, dtype=numpy.uint64)
+    return numpy.array([keys >> numpy.uint64(32),
+        keys & numpy.uint64(0xffffffff)]).astype(numpy.int64)
+
+def contactOrientations(x_i, x_j):
+    '''
+    Finds the orientation of the lines between pairs of points, such as the
+    particle centres of contacts or bonds, as the strike and dip of the
+    vector pointing downwards along the line. The strike is the horizontal
+    direction measured from the positive x axis towards the positive y axis,
+    and the dip is the angle below the horizontal plane. The strike of
+    vertical lines is 0.
+
+    :param x_i: The first points
+    :type x_i: numpy.array
+    :param x_j: The second points
+    :type x_j: numpy.array
+    :returns: The strike in radians, in [0;2*pi[, and the dip in degrees, in
+        [0;90]
+    :return type: numpy.array, numpy.array
+    '''
+    x_i = numpy.asarray(x_i, dtype=numpy.float64).reshape(-1, 3)
+    x_j = numpy.asarray(x_j, dtype=numpy.float64).reshape(-1, 3)
+
+    # Vector pointing downwards
+    d = numpy.where((x_i[:, 2] < x_j[:, 2])[:, None], x_i - x_j, x_j - x_i)
+    dhoriz = numpy.sqrt(d[:, 0]**2 + d[:, 1]**2)
+
+    strike = numpy.arctan2(d[:, 1], d[:, 0]) % (2.0*numpy.pi)
+    dip = numpy.degrees(numpy.arctan2(-d[:, 2], dhoriz))
+    return strike, dip
+
+class ContactHistory:
+    '''
+    Tracks the particle-particle contacts through a sequence of output steps.
+    The contacts of each step are passed to :func:`update()`, and each contact
+    is identified by its key from :func:`contactKeys()`. The sorted keys of
+    the current contacts are matched against the keys of the previous step
+    with binary searches, and only the current contacts and the contacts that
+    have ended are stored, so the history can be built while streaming over
+    the output files of a long simulation. See :func:`sim.contactHistory()`.
+    '''
+
+    def __init__(self):
+        # Steps passed to update(), and the number of contacts, new contacts
+        # and ended contacts at each of them
+        self.steps = []
+        self.ncontacts = []
+        self.nbirths = []
+        self.ndeaths = []
+
+        # Current contacts, sorted by key, with the step where they formed
+        self.keys = numpy.zeros(0, dtype=numpy.uint64)
+        self.birth = numpy.zeros(0, dtype=numpy.int64)
+
+        # Ended contacts, with the step where they formed, the last step where
+        # they were found, and the step where they were gone
+        self.ended_keys = []
+        self.ended_birth = []
+        self.ended_last = []
+        self.ended_death = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def update(self, pairs, step=None):
+        '''
+        Add the contacts of the next step to the history.
+
+        :param pairs: The particle pair indexes of the contacts, one pair per
+            column as in ``sim.pairs``
+        :type pairs: numpy.array
+        :param step: The output step number (default = None, which uses the
+            number of steps added so far)
+        :type step: int
+        '''
+        if step is None:
+            step = len(self.steps)
+        keys = numpy.unique(contactKeys(pairs))
+
+        kept = sortedMember(self.keys, keys)
+        born = ~sortedMember(keys, self.keys)
+
+        if not kept.all():
+            self.ended_keys.append(self.keys[~kept])
+            self.ended_birth.append(self.birth[~kept])
+            self.ended_last.append(numpy.repeat(self.steps[-1],
+                numpy.count_nonzero(~kept)).astype(numpy.int64))
+            self.ended_death.append(numpy.repeat(step,
+                numpy.count_nonzero(~kept)).astype(numpy.int64))
+
+        birth = numpy.empty(len(keys), dtype=numpy.int64)
+        birth[~born] = self.birth[kept]
+        birth[born] = step
+
+        self.steps.append(step)
+        self.ncontacts.append(len(keys))
+        self.nbirths.append(numpy.count_nonzero(born))
+        self.ndeaths.append(numpy.count_nonzero(~kept))
+        self.keys = keys
+        self.birth = birth
+
+    def counts(self):
+        '''
+        Returns the number of contacts, the number of new contacts and the
+        number of contacts that have ended at each step. All contacts of the
+        first step are counted as new.
+
+        :returns: The steps, and the numbers of contacts, new contacts and
+            ended contacts at each step
+        :return type: numpy.array, numpy.array, numpy.array, numpy.array
+        '''
+        return numpy.array(self.steps, dtype=numpy.int64), \
+                numpy.array(self.ncontacts, dtype=numpy.int64), \
+                numpy.array(self.nbirths, dtype=numpy.int64), \
+                numpy.array(self.ndeaths, dtype=numpy.int64)
+
+    def lifetimes(self):
+        '''
+        Returns every contact found during the steps, with the step where it
+        formed, the step where it ended, and its lifetime. A contact that
+        forms again after it has ended is listed once for each time it
+        existed. The lifetime is the number of steps between the first and the
+        last step where the contact was found, and is a lower bound for
+        contacts that exist in the first or the last step.
+
+        :returns: The particle pair indexes of the contacts, one pair per
+            column, and the step of formation, the step where the contact was
+            gone (-1 for contacts in the last step) and the lifetime of each
+            contact
+        :return type: numpy.array, numpy.array, numpy.array, numpy.array
+        '''
+        last = self.steps[-1] if len(self.steps) > 0 else 0
+        keys = numpy.concatenate(self.ended_keys + [self.keys])
+        birth = numpy.concatenate(self.ended_birth + [self.birth])
+        lastfound = numpy.concatenate(self.ended_last +
+                [numpy.repeat(last, len(self.keys)).astype(numpy.int64)])
+        death = numpy.concatenate(self.ended_death +
+                [numpy.repeat(-1, len(self.keys)).astype(numpy.int64)])
+        return contactPairs(keys), birth, death, lastfound - birth
+
+def sortedMember(a, b):
+    '''
+    Finds the values of a sorted array that are present in another sorted
+    array, using binary searches.
+
+    :param a: The values to look up, in increasing order
+    :type a: numpy.array
+    :param b: The values to search, in increasing order
+    :type b: numpy.array
+    :returns: True where the value of ``a`` is in ``b``
+    :return type: numpy.array of bool
+    '''
+    if len(b) == 0:
+        return numpy.zeros(len(a), dtype=bool)
+    index = numpy.minimum(numpy.searchsorted(b, a), len(b) - 1)
+    return b[index] == a
+
+class ContactHistogram:
+    '''
+    Histograms of the orientations and normal force magnitudes of the
+    particle-particle contacts, accumulated over any number of output steps.
+    The orientations are binned by strike and dip (see
+    :func:`contactOrientations()`), which divides the lower hemisphere into
+    cells of equal angular size, and both the number of contacts and the sum
+    of their normal forces are stored for each cell. The forces are binned
+    relative to the mean normal force of each step, or as absolute values.
+    Contacts are added with :func:`add()` or :func:`addStep()`, and the
+    histograms are plotted with :func:`plot()`. See
+    :func:`sim.contactHistogram()`.
+
+    :param strike_bins: The number of strike bins in [0;2*pi[ (default = 36)
+    :type strike_bins: int
+    :param dip_bins: The number of dip bins in [0;90] (default = 9)
+    :type dip_bins: int
+    :param force_bins: The edges of the force bins. Forces outside the bins
+        are not counted in the force histogram (default = None, which uses
+        25 bins in [0;5] for relative forces, and 25 bins from zero to five
+        times the mean force of the first step for absolute forces)
+    :type force_bins: numpy.array
+    :param relative: Bin the forces relative to the mean normal force of each
+        step (default = True)
+    :type relative: bool
+    '''
+
+    def __init__(self, strike_bins=36, dip_bins=9, force_bins=None,
+            relative=True):
+        self.strike_edges = numpy.linspace(0.0, 2.0*numpy.pi, strike_bins + 1)
+        self.dip_edges = numpy.linspace(0.0, 90.0, dip_bins + 1)
+        self.force_edges = None
+        if force_bins is not None:
+            self.force_edges = numpy.asarray(force_bins, dtype=numpy.float64)
+        elif relative:
+            self.force_edges = numpy.linspace(0.0, 5.0, 26)
+        self.relative = relative
+
+        self.orientation = numpy.zeros((strike_bins, dip_bins),
+                dtype=numpy.int64)
+        self.orientation_force = numpy.zeros((strike_bins, dip_bins))
+        self.force = numpy.zeros(0, dtype=numpy.int64)
+        if self.force_edges is not None:
+            self.force = numpy.zeros(len(self.force_edges) - 1,
+                    dtype=numpy.int64)
+        self.steps = 0
+        self.contacts = 0
+
+    def add(self, x_i, x_j, f_n):
+        '''
+        Add the contacts of an output step to the histograms.
+
+        :param x_i: The first end points of the contacts
+        :type x_i: numpy.array
+        :param x_j: The second end points of the contacts
+        :type x_j: numpy.array
+        :param f_n: The normal force magnitudes of the contacts
+        :type f_n: numpy.array
+        '''
+        f_n = numpy.asarray(f_n, dtype=numpy.float64)
+        strike, dip = contactOrientations(x_i, x_j)
+
+        s = numpy.clip(numpy.searchsorted(self.strike_edges, strike,
+            side='right') - 1, 0, len(self.strike_edges) - 2)
+        d = numpy.clip(numpy.searchsorted(self.dip_edges, dip,
+            side='right') - 1, 0, len(self.dip_edges) - 2)
+        cell = s*(len(self.dip_edges) - 1) + d
+        self.orientation += numpy.bincount(cell,
+                minlength=self.orientation.size).reshape(self.orientation.shape)
+        self.orientation_force += numpy.bincount(cell, weights=f_n,
+                minlength=self.orientation.size).reshape(self.orientation.shape)
+
+        if f_n.size > 0 and numpy.mean(f_n) > 0.0:
+            if self.relative:
+                f_n = f_n/numpy.mean(f_n)
+            elif self.force_edges is None:
+                self.force_edges = numpy.linspace(0.0, 5.0*numpy.mean(f_n), 26)
+                self.force = numpy.zeros(25, dtype=numpy.int64)
+            self.force += numpy.histogram(f_n, self.force_edges)[0]
+
+        self.steps += 1
+        self.contacts += f_n.size
+
+    def addStep(self, sb, lc=0.0):
+        '''
+        Add the contacts of a ``sim`` object to the histograms, as found by
+        :func:`sim.forcechainsTable()`.
+
+        :param sb: The output step
+        :type sb: sim
+        :param lc: Lower cutoff of contact forces. Contacts below are skipped
+            (default = 0.0)
+        :type lc: float
+        '''
+        x_i, x_j, f_n = sb.forcechainsTable(lc)[:3]
+        self.add(x_i, x_j, f_n)
+
+    def plot(self, filename, figsize=[8,4]):
+        '''
+        Plot the orientation histogram on a polar plot, with the dip measured
+        from the center, next to the force histogram.
+
+        :param filename: The name of the image file
+        :type filename: str
+        :param figsize: The size of the figure in inches (default = [8,4])
+        :type figsize: list of float
+        '''
+        fig = plt.figure(figsize=figsize)
+        ax = plt.subplot(121, polar=True)
+        strike, dip = numpy.meshgrid(self.strike_edges,
+                90.0 - self.dip_edges[::-1], indexing='ij')
+        cs = ax.pcolormesh(strike, dip, self.orientation[:, ::-1],
+                cmap='afmhot_r')
+        plt.colorbar(cs, ax=ax, label='Count $N$')
+        ax.set_rmax(90)
+        ax.set_rticks([])
+
+        ax = plt.subplot(122)
+        if self.force_edges is not None:
+            ax.bar(self.force_edges[:-1], self.force,
+                    width=numpy.diff(self.force_edges), align='edge',
+                    color='gray', alpha=0.75)
+        ax.set_yscale('log')
+        if self.relative:
+            ax.set_xlabel('Relative contact load $f_n/\\bar{f}_n$')
+        else:
+            ax.set_xlabel('Contact load [N]')
+        ax.set_ylabel('Count $N$')
+        plt.tight_layout()
+        plt.savefig(filename)
+        plt.close(fig)
+
 def convert(graphics_format = 'png', folder = '../img_out'):
     '''
     Converts all PPM images in img_out to graphics_format using Imagemagick. All
@@ -7752,6 +10324,11 @@ def cleanup(sim):
     subprocess.call("rm -f ../output/" + sim.sid + ".*.bin", shell=True)
     subprocess.call("rm -f ../img_out/" + sim.sid + ".*", shell=True)
     subprocess.call("rm -f ../output/" + sim.sid + ".status.dat", shell=True)
+    subprocess.call("rm -f ../output/" + sim.sid + ".index.npz", shell=True)
+    subprocess.call("rm -f ../output/" + sim.sid + ".*.cache.npz", shell=True)
+    subprocess.call("rm -f ../output/" + sim.sid + ".outputs.zip", shell=True)
+    subprocess.call("rm -f ../output/" + sim.sid + ".parquet", shell=True)
+    subprocess.call("rm -rf ../output/" + sim.sid + ".series", shell=True)
     subprocess.call("rm -f ../output/" + sim.sid + ".*.vtu", shell=True)
     subprocess.call("rm -f ../output/fluid-" + sim.sid + ".*.vti", shell=True)
     subprocess.call("rm -f ../output/" + sim.sid + "-conv.png", shell=True)
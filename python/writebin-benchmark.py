@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+'''
+Benchmark of the binary writer in :func:`sphere.sim.writebin()`.
+
+Simulation objects with random particle, wall, bond and fluid data are written
+with the bulk writer in ``sphere.py`` and with a copy of the previous
+per-element writer. The files are checked to be byte-identical, and the write
+times and throughputs are reported.
+
+Usage: python writebin-benchmark.py [np] [nx] [repetitions]
+'''
+import os
+import sys
+import time
+import tempfile
+import numpy
+import sphere
+
+def writebin_legacy(self, folder = "../input/", verbose = True):
+    '''
+    Reference copy of the per-element writer that preceded the bulk writer in
+    :func:`sphere.sim.writebin()`. Only used for comparison.
+    '''
+    fh = None
+    try :
+        targetbin = folder + "/" + self.sid + ".bin"
+        if verbose:
+            print("Output file: {0}".format(targetbin))
+
+        fh = open(targetbin, "wb")
+
+        # Write the current version number
+        fh.write(self.version.astype(numpy.float64))
+
+        # Write the number of dimensions and particles
+        fh.write(self.nd.astype(numpy.int32))
+        fh.write(self.np.astype(numpy.uint32))
+
+        # Write the time variables
+        fh.write(self.time_dt.astype(numpy.float64))
+        fh.write(self.time_current.astype(numpy.float64))
+        fh.write(self.time_total.astype(numpy.float64))
+        fh.write(self.time_file_dt.astype(numpy.float64))
+        fh.write(self.time_step_count.astype(numpy.uint32))
+
+        # Read remaining data from binary
+        fh.write(self.origo.astype(numpy.float64))
+        fh.write(self.L.astype(numpy.float64))
+        fh.write(self.num.astype(numpy.uint32))
+        fh.write(self.periodic.astype(numpy.uint32))
+        fh.write(self.adaptive.astype(numpy.uint32))
+
+        # Per-particle vectors
+        for i in numpy.arange(self.np):
+            fh.write(self.x[i,:].astype(numpy.float64))
+            fh.write(self.radius[i].astype(numpy.float64))
+
+        if self.np[0] > 0:
+            fh.write(self.xyzsum.astype(numpy.float64))
+
+        for i in numpy.arange(self.np):
+            fh.write(self.vel[i,:].astype(numpy.float64))
+            fh.write(self.fixvel[i].astype(numpy.float64))
+
+        if self.np[0] > 0:
+            fh.write(self.force.astype(numpy.float64))
+
+            fh.write(self.angpos.astype(numpy.float64))
+            fh.write(self.angvel.astype(numpy.float64))
+            fh.write(self.torque.astype(numpy.float64))
+
+            # Per-particle single-value parameters
+            fh.write(self.es_dot.astype(numpy.float64))
+            fh.write(self.es.astype(numpy.float64))
+            fh.write(self.ev_dot.astype(numpy.float64))
+            fh.write(self.ev.astype(numpy.float64))
+            fh.write(self.p.astype(numpy.float64))
+
+        fh.write(self.g.astype(numpy.float64))
+        fh.write(self.k_n.astype(numpy.float64))
+        fh.write(self.k_t.astype(numpy.float64))
+        fh.write(self.k_r.astype(numpy.float64))
+        fh.write(self.E.astype(numpy.float64))
+        fh.write(self.gamma_n.astype(numpy.float64))
+        fh.write(self.gamma_t.astype(numpy.float64))
+        fh.write(self.gamma_r.astype(numpy.float64))
+        fh.write(self.mu_s.astype(numpy.float64))
+        fh.write(self.mu_d.astype(numpy.float64))
+        fh.write(self.mu_r.astype(numpy.float64))
+        fh.write(self.gamma_wn.astype(numpy.float64))
+        fh.write(self.gamma_wt.astype(numpy.float64))
+        fh.write(self.mu_ws.astype(numpy.float64))
+        fh.write(self.mu_wd.astype(numpy.float64))
+        fh.write(self.rho.astype(numpy.float64))
+        fh.write(self.contactmodel.astype(numpy.uint32))
+        fh.write(self.kappa.astype(numpy.float64))
+        fh.write(self.db.astype(numpy.float64))
+        fh.write(self.V_b.astype(numpy.float64))
+
+        fh.write(self.nw.astype(numpy.uint32))
+        for i in numpy.arange(self.nw[0]):
+            fh.write(self.wmode[i].astype(numpy.int32))
+        for i in numpy.arange(self.nw[0]):
+            fh.write(self.w_n[i,:].astype(numpy.float64))
+            fh.write(self.w_x[i].astype(numpy.float64))
+
+        for i in numpy.arange(self.nw[0]):
+            fh.write(self.w_m[i].astype(numpy.float64))
+            fh.write(self.w_vel[i].astype(numpy.float64))
+            fh.write(self.w_force[i].astype(numpy.float64))
+            fh.write(self.w_sigma0[i].astype(numpy.float64))
+        fh.write(self.w_sigma0_A.astype(numpy.float64))
+        fh.write(self.w_sigma0_f.astype(numpy.float64))
+        fh.write(self.w_tau_x.astype(numpy.float64))
+
+        fh.write(self.lambda_bar.astype(numpy.float64))
+        fh.write(self.nb0.astype(numpy.uint32))
+        fh.write(self.sigma_b.astype(numpy.float64))
+        fh.write(self.tau_b.astype(numpy.float64))
+        for i in numpy.arange(self.nb0[0]):
+            fh.write(self.bonds[i,0].astype(numpy.uint32))
+            fh.write(self.bonds[i,1].astype(numpy.uint32))
+        fh.write(self.bonds_delta_n.astype(numpy.float64))
+        fh.write(self.bonds_delta_t.astype(numpy.float64))
+        fh.write(self.bonds_omega_n.astype(numpy.float64))
+        fh.write(self.bonds_omega_t.astype(numpy.float64))
+
+        if self.fluid:
+
+            fh.write(self.cfd_solver.astype(numpy.int32))
+            fh.write(self.mu.astype(numpy.float64))
+            for z in numpy.arange(self.num[2]):
+                for y in numpy.arange(self.num[1]):
+                    for x in numpy.arange(self.num[0]):
+                        fh.write(self.v_f[x,y,z,0].astype(numpy.float64))
+                        fh.write(self.v_f[x,y,z,1].astype(numpy.float64))
+                        fh.write(self.v_f[x,y,z,2].astype(numpy.float64))
+                        fh.write(self.p_f[x,y,z].astype(numpy.float64))
+                        fh.write(self.phi[x,y,z].astype(numpy.float64))
+                        fh.write(self.dphi[x,y,z].astype(numpy.float64)*
+                                self.time_dt*self.ndem)
+
+            fh.write(self.rho_f.astype(numpy.float64))
+            fh.write(self.p_mod_A.astype(numpy.float64))
+            fh.write(self.p_mod_f.astype(numpy.float64))
+            fh.write(self.p_mod_phi.astype(numpy.float64))
+
+            if self.cfd_solver[0] == 1:  # Sides only adjustable with Darcy
+                fh.write(self.bc_xn.astype(numpy.int32))
+                fh.write(self.bc_xp.astype(numpy.int32))
+                fh.write(self.bc_yn.astype(numpy.int32))
+                fh.write(self.bc_yp.astype(numpy.int32))
+
+            fh.write(self.bc_bot.astype(numpy.int32))
+            fh.write(self.bc_top.astype(numpy.int32))
+            fh.write(self.free_slip_bot.astype(numpy.int32))
+            fh.write(self.free_slip_top.astype(numpy.int32))
+            fh.write(self.bc_bot_flux.astype(numpy.float64))
+            fh.write(self.bc_top_flux.astype(numpy.float64))
+
+            for z in numpy.arange(self.num[2]):
+                for y in numpy.arange(self.num[1]):
+                    for x in numpy.arange(self.num[0]):
+                        fh.write(self.p_f_constant[x,y,z].astype(
+                            numpy.int32))
+
+            # Navier Stokes
+            if self.cfd_solver[0] == 0:
+                fh.write(self.gamma.astype(numpy.float64))
+                fh.write(self.theta.astype(numpy.float64))
+                fh.write(self.beta.astype(numpy.float64))
+                fh.write(self.tolerance.astype(numpy.float64))
+                fh.write(self.maxiter.astype(numpy.uint32))
+                fh.write(self.ndem.astype(numpy.uint32))
+
+                fh.write(self.c_phi.astype(numpy.float64))
+                fh.write(self.c_v.astype(numpy.float64))
+                fh.write(self.dt_dem_fac.astype(numpy.float64))
+
+                for i in numpy.arange(self.np):
+                    fh.write(self.f_d[i,:].astype(numpy.float64))
+                for i in numpy.arange(self.np):
+                    fh.write(self.f_p[i,:].astype(numpy.float64))
+                for i in numpy.arange(self.np):
+                    fh.write(self.f_v[i,:].astype(numpy.float64))
+                for i in numpy.arange(self.np):
+                    fh.write(self.f_sum[i,:].astype(numpy.float64))
+
+            # Darcy
+            elif self.cfd_solver[0] == 1:
+
+                fh.write(self.tolerance.astype(numpy.float64))
+                fh.write(self.maxiter.astype(numpy.uint32))
+                fh.write(self.ndem.astype(numpy.uint32))
+                fh.write(self.c_phi.astype(numpy.float64))
+                for i in numpy.arange(self.np):
+                    fh.write(self.f_p[i,:].astype(numpy.float64))
+                fh.write(self.beta_f.astype(numpy.float64))
+                fh.write(self.k_c.astype(numpy.float64))
+
+            else:
+                raise Exception('Value of cfd_solver not understood (' + \
+                        str(self.cfd_solver[0]) + ')')
+
+
+        fh.write(self.color.astype(numpy.int32))
+
+    finally:
+        if fh is not None:
+            fh.close()
+
+def randomSim(np, nx, fluid=False, cfd_solver=0):
+    '''
+    Create a simulation object with random particle, wall, bond and fluid
+    values.
+    '''
+    sb = sphere.sim(sid='writebin-benchmark', np=np, nw=1, fluid=fluid)
+    sb.defaultParams()
+    sb.radius[:] = numpy.random.rand(np)*1.0e-3 + 1.0e-3
+    sb.x[:,:] = numpy.random.rand(np, 3)
+    sb.vel[:,:] = numpy.random.rand(np, 3)
+    sb.force[:,:] = numpy.random.rand(np, 3)
+    sb.defineWorldBoundaries(L=[1.0, 1.0, 1.0], dx=1.0/nx)
+    sb.w_x[:] = numpy.random.rand(sb.nw[0])
+    for i in range(np//10):
+        sb.bond(i, i + 1)
+    if fluid:
+        sb.initFluid(cfd_solver=cfd_solver)
+        sb.p_f[:,:,:] = numpy.random.rand(nx, nx, nx)
+        sb.v_f[:,:,:,:] = numpy.random.rand(nx, nx, nx, 3)
+        sb.phi[:,:,:] = numpy.random.rand(nx, nx, nx)
+        sb.dphi[:,:,:] = numpy.random.rand(nx, nx, nx)
+    return sb
+
+def timeWrite(write, sb, folder, repetitions):
+    best = numpy.inf
+    for i in range(repetitions):
+        t0 = time.time()
+        write(sb, folder, verbose=False)
+        best = min(best, time.time() - t0)
+    with open(os.path.join(folder, sb.sid + '.bin'), 'rb') as fh:
+        data = fh.read()
+    return data, best
+
+if __name__ == '__main__':
+    np = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    nx = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    repetitions = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    folder = tempfile.mkdtemp()
+    print('{0:>6s} {1:>7s} {2:>10s} {3:>12s} {4:>12s} {5:>10s} {6:>8s}  {7}'
+            .format('fluid', 'solver', 'size [MB]', 'legacy [s]', 'bulk [s]',
+                'bulk MB/s', 'speedup', 'identical'))
+    failed = False
+    for fluid, cfd_solver in [(False, 0), (True, 0), (True, 1)]:
+        sb = randomSim(np, nx, fluid, cfd_solver)
+        data_legacy, t_legacy = timeWrite(writebin_legacy, sb, folder,
+                repetitions)
+        data_bulk, t_bulk = timeWrite(sphere.sim.writebin, sb, folder,
+                repetitions)
+        identical = data_legacy == data_bulk
+        failed = failed or not identical
+        size = len(data_bulk)/1.0e6
+        print('{0:6d} {1:7d} {2:10.2f} {3:12.4f} {4:12.4f} {5:10.1f} {6:8.1f}'
+                '  {7}'.format(int(fluid), cfd_solver, size, t_legacy, t_bulk,
+                    size/t_bulk, t_legacy/t_bulk,
+                    'yes' if identical else 'NO'))
+    os.remove(os.path.join(folder, sb.sid + '.bin'))
+    os.rmdir(folder)
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+from pytestutils import *
+import sphere
+import os
+
+#### Output archive tests ####
+print("### Output archive tests ###")
+
+# Write output files where only the particle positions and the time change
+orig = sphere.sim(np=100, nw=1, sid="test-archive")
+orig.defaultParams()
+orig.x = numpy.random.random_sample((100, 3))*0.01
+orig.radius[:] = 0.0005
+orig.defineWorldBoundaries(L=[0.01]*3)
+orig.bond(0, 1)
+originals = []
+for i in range(3):
+    orig.x[:, 2] += 0.001
+    orig.time_current[0] = i*0.1
+    orig.sid = "test-archive.output{0:0=5}".format(i)
+    orig.writebin(folder="../output/", verbose=False)
+    fh = open("../output/" + orig.sid + ".bin", "rb")
+    originals.append(fh.read())
+    fh.close()
+orig.sid = "test-archive"
+
+archive = sphere.OutputArchive(orig.sid)
+test(archive.pack(verbose=False) == 3, "Packed steps:")
+test(archive.steps() == [0, 1, 2], "Archived steps:")
+test(archive.pack(verbose=False) == 0, "Incremental packing:")
+test(archive.raw(1) == originals[1], "Archived contents:")
+manifest = archive.load(2)[0]
+test('radius' in manifest['static'] and 'x' not in manifest['static'],
+        "Static values stored once:")
+
+# Read archived steps after the output files are removed
+archive.pack(remove=True, verbose=False)
+test(not os.path.isfile("../output/test-archive.output00001.bin"),
+        "Removed output files:")
+py = sphere.sim(sid=orig.sid)
+py.readstep(2, verbose=False)
+compareNumpyArrays(orig.x, py.x, "Read archived step:")
+compareNumpyArrays(orig.radius, py.radius, "Read archived static values:")
+compareNumpyArrays(orig.bonds, py.bonds, "Read archived bonds:")
+py.readstep(1, verbose=False, fields=['time_current'])
+compareFloats(0.1, py.time_current[0], "Selective read from archive:")
+
+# Restore the output files
+archive.unpack(verbose=False)
+fh = open("../output/test-archive.output00002.bin", "rb")
+test(fh.read() == originals[2], "Unpacked output file:")
+fh.close()
+
+# Remove temporary files
+cleanup(orig)
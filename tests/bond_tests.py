@@ -186,3 +186,17 @@ for d in distances:
     #visualize(sb.sid, "energy")
     #'''
 
+
+# Batch bond creation
+sb = sphere.sim(np=6, sid='bondtest')
+sb.bond(0, 1)
+sb.bondPairs([2, 4], [3, 5])
+compareNumpyArrays(sb.bonds, numpy.array([[0, 1], [2, 3], [4, 5]]),
+        "Batch bonds:\t")
+test(sb.nb0[0] == 3 and sb.bonds_delta_t.shape == (3, 3) and
+        sb.bonds_omega_n.shape == (3,), "Batch bond arrays:")
+sb.x[:,:] = 5.0
+sb.L[:] = 10.0
+sb.createBondPairs([0, 2], [1, 3], spacing=0.0)
+distance = numpy.sqrt(numpy.sum((sb.x[[0, 2]] - sb.x[[1, 3]])**2, axis=1))
+test(sb.nb0[0] == 5 and numpy.all(distance <= 2.0), "Batch bond placement:")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+from pytestutils import *
+import sphere
+
+#### Contact detection tests ####
+print("### Contact detection tests ###")
+
+# Three particles in a row, where the first two overlap
+sb = sphere.sim(np=3, sid="test-contacts")
+sb.x = numpy.array([[1.0, 1.0, 1.0], [1.9, 1.0, 1.0], [3.5, 1.0, 1.0]])
+sb.radius = numpy.array([0.5, 0.5, 0.5])
+sb.fixvel = numpy.zeros(3)
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+sb.findOverlaps()
+compareNumpyArrays(sb.pairs, numpy.array([[0], [1]]), "Overlap pairs:")
+compareFloats(-0.1, sb.overlaps[0], "Overlap distance:")
+
+# The first and last particles overlap across a periodic boundary
+sb.x[2, 0] = 4.4
+sb.periodicBoundariesX()
+sb.findOverlaps()
+compareNumpyArrays(sb.pairs, numpy.array([[0, 0], [1, 2]]),
+        "Periodic overlap pairs:")
+compareFloats(-0.4, sb.overlaps[1], "Periodic overlap distance:")
+
+# Pairs with a fixed particle are skipped
+sb.fixvel[1] = 1.0
+sb.findOverlaps()
+compareNumpyArrays(sb.pairs, numpy.array([[0], [2]]), "Fixed particles:")
+
+# Comparison with a search over all pairs
+numpy.random.seed(1)
+sb = sphere.sim(np=400, sid="test-contacts")
+sb.x = numpy.random.random_sample((400, 3))*0.01
+sb.radius = numpy.random.uniform(0.0002, 0.0006, 400)
+sb.fixvel = numpy.zeros(400)
+sb.defineWorldBoundaries(L=[0.01, 0.01, 0.01])
+sb.periodicBoundariesXY()
+sb.findOverlaps()
+vector = sb.x[None, :, :] - sb.x[:, None, :]
+vector[:, :, :2] -= 0.01*numpy.round(vector[:, :, :2]/0.01)
+delta = numpy.sqrt(numpy.sum(vector**2, axis=2)) \
+        - (sb.radius[:, None] + sb.radius[None, :])
+i, j = numpy.nonzero(numpy.triu(delta < 0.0, 1))
+compareNumpyArrays(sb.pairs, numpy.array([i, j]), "Cell list pairs:")
+compareNumpyArrays(sb.overlaps, delta[i, j], "Cell list overlaps:")
+
+# Spatial index queries
+index = sb.spatialIndex()
+test(sb.spatialIndex() is index, "Cached spatial index:")
+q, j, found = index.within(sb.x[:5], 0.002)
+test(numpy.all(numpy.sum(found**2, axis=1) < 0.002**2) and q[0] == 0 and
+        j[0] == 0, "Radius query:")
+nearest, distance = index.nearest(sb.x[:5], 2)
+compareNumpyArrays(nearest[:, 0], numpy.arange(5), "Nearest particle:")
+length = numpy.sqrt(numpy.sum(vector**2, axis=2))
+compareNumpyArrays(distance[:, 1], numpy.sort(length[:5], axis=1)[:, 1],
+        "Second nearest distance:")
+sb.x[0, 2] += 0.001
+test(sb.spatialIndex() is not index, "Updated spatial index:")
+
+# Contact kinematics of two touching particles
+sb = sphere.sim(np=2, sid="test-contacts")
+sb.x = numpy.array([[1.0, 1.0, 1.0], [1.9, 1.0, 1.0]])
+sb.radius = numpy.array([0.5, 0.5])
+sb.fixvel = numpy.zeros(2)
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+sb.vel[0] = [-1.0, 0.0, 2.0]
+sb.angvel[1] = [0.0, -4.0, 0.0]
+kinematics = sb.contactKinematics()
+compareNumpyArrays(kinematics['normal'], numpy.array([[-1.0, 0.0, 0.0]]),
+        "Contact normal:")
+compareFloats(1.0, kinematics['vel_n'][0], "Normal velocity:")
+compareNumpyArrays(kinematics['vel_t'], numpy.array([[0.0, 0.0, 4.0]]),
+        "Tangential velocity:")
+compareFloats(numpy.pi/2.0, kinematics['slip_angle'][0], "Slip angle:")
+compareNumpyArrays(kinematics['angvel'], numpy.array([[0.0, 4.0, 0.0]]),
+        "Relative rotation:")
+
+# Force chain table with a contact across the periodic boundary
+sb = sphere.sim(np=3, sid="test-contacts")
+sb.x = numpy.array([[1.0, 1.0, 1.0], [1.5, 1.0, 1.0], [4.25, 1.0, 1.0]])
+sb.radius = numpy.array([0.5, 0.5, 0.5])
+sb.fixvel = numpy.zeros(3)
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+sb.periodicBoundariesX()
+sb.k_n[0] = 1.0e3
+x_i, x_j, f_n, i, j = sb.forcechainsTable()
+compareNumpyArrays(f_n, numpy.array([500.0, 250.0]), "Force chain forces:")
+compareNumpyArrays(x_j[1], numpy.array([0.25, 1.0, 1.0]),
+        "Force chain periodic end point:")
+x_i, x_j, f_n, i, j = sb.forcechainsTable(lc=300.0)
+compareNumpyArrays(j, numpy.array([1]), "Force chain cutoff:")
+sb.setYoungsModulus(1.0e3)
+x_i, x_j, f_n, i, j = sb.forcechainsTable()
+compareFloats(numpy.pi/2.0*1.0e3*0.5*0.5, f_n[0], "Young's modulus forces:")
+
+# Contact history through output files where the contacts change
+sb = sphere.sim(np=3, nw=0, sid="test-contact-history")
+sb.radius = numpy.array([0.5, 0.5, 0.5])
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+positions = [[1.0, 1.8, 3.0], [1.0, 1.8, 2.7], [1.0, 2.5, 2.7]]
+for step in range(len(positions)):
+    sb.x[:, 0] = positions[step]
+    sb.sid = "test-contact-history.output{0:0=5}".format(step)
+    sb.writebin(folder="../output/", verbose=False)
+sb.sid = "test-contact-history"
+history = sb.contactHistory()
+steps, ncontacts, nbirths, ndeaths = history.counts()
+compareNumpyArrays(ncontacts, numpy.array([1, 2, 1]), "Contacts per step:")
+compareNumpyArrays(nbirths, numpy.array([1, 1, 0]), "New contacts:")
+compareNumpyArrays(ndeaths, numpy.array([0, 0, 1]), "Ended contacts:")
+pairs, birth, death, lifetime = history.lifetimes()
+compareNumpyArrays(pairs, numpy.array([[0, 1], [1, 2]]), "History pairs:")
+compareNumpyArrays(birth, numpy.array([0, 1]), "Contact births:")
+compareNumpyArrays(death, numpy.array([2, -1]), "Contact deaths:")
+compareNumpyArrays(lifetime, numpy.array([1, 1]), "Contact lifetimes:")
+compareNumpyArrays(sphere.contactPairs(sphere.contactKeys(pairs[::-1])),
+        pairs, "Contact keys:")
+cleanup(sb)
+
+# Contact statistics of a chain of four particles and a rattler
+sb = sphere.sim(np=5, sid="test-contacts")
+sb.x = numpy.array([[1.0, 1.0, 1.0], [1.5, 1.0, 1.0], [2.0, 1.0, 1.0],
+    [2.5, 1.0, 1.0], [1.0, 3.0, 1.0]])
+sb.radius = numpy.array([0.5, 0.5, 0.5, 0.5, 0.5])
+sb.fixvel = numpy.zeros(5)
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+sb.k_n[0] = 1.0e3
+statistics = sb.contactStatistics()
+compareNumpyArrays(statistics['coordinationnumber'],
+        numpy.array([1, 2, 2, 1, 0]), "Contacts per particle:")
+compareNumpyArrays(statistics['rattlers'],
+        numpy.array([True, False, False, True, True]), "Rattlers:")
+compareFloats(1.0, statistics['mechanicalcoordinationnumber'],
+        "Mechanical coordination number:")
+compareNumpyArrays(statistics['f_n_sum'],
+        numpy.array([500.0, 1000.0, 1000.0, 500.0, 0.0]),
+        "Normal force sums:")
+test(sb.contactStatistics() is statistics, "Cached contact statistics:")
+sb.findOverlaps()
+sb.findCoordinationNumber()
+compareFloats(1.2, sb.findMeanCoordinationNumber(),
+        "Mean coordination number:")
+sb.x[4, 1] = 1.9
+test(sb.contactStatistics()['coordinationnumber'][4] == 1,
+        "Updated contact statistics:")
+
+# Fabric and stress tensors of a vertical contact
+sb = sphere.sim(np=2, nw=0, sid="test-contacts")
+sb.x = numpy.array([[1.0, 1.0, 1.0], [1.0, 1.0, 1.5]])
+sb.radius = numpy.array([0.5, 0.5])
+sb.fixvel = numpy.zeros(2)
+sb.defineWorldBoundaries(L=[4.0, 4.0, 4.0], dx=1.0)
+sb.k_n[0] = 1.0e3
+tensors = sb.contactTensors(slices=2)
+compareNumpyArrays(tensors['contacts'], numpy.array([1, 0]), "Slab contacts:")
+compareNumpyArrays(tensors['fabric'][0], numpy.diag([0.0, 0.0, 1.0]),
+        "Fabric tensor:")
+compareFloats(500.0*0.5/32.0, tensors['stress'][0, 2, 2], "Stress tensor:")
+test(numpy.count_nonzero(tensors['stress']) == 1, "Stress components:")
+
+# Contact orientations and histograms
+strike, dip = sphere.contactOrientations(
+        numpy.array([[0.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 0.0, 0.0]]),
+        numpy.array([[-1.0, 0.0, 1.0], [0.0, 1.0, 1.0], [0.0, 0.0, 1.0]]))
+compareNumpyArrays(strike, numpy.array([0.0, numpy.pi/2.0, 0.0]),
+        "Contact strike:")
+compareNumpyArrays(numpy.round(dip, 10), numpy.array([45.0, 0.0, 90.0]),
+        "Contact dip:")
+histogram = sphere.ContactHistogram(strike_bins=4, dip_bins=2)
+histogram.add(numpy.zeros((2, 3)), numpy.array([[-1.0, 0.0, 1.0],
+    [0.0, 0.0, 1.0]]), numpy.array([1.0, 3.0]))
+histogram.add(numpy.zeros((1, 3)), numpy.array([[0.0, 0.0, 1.0]]),
+        numpy.array([2.0]))
+compareNumpyArrays(histogram.orientation[0], numpy.array([0, 3]),
+        "Orientation histogram:")
+compareNumpyArrays(histogram.orientation_force[0], numpy.array([0.0, 6.0]),
+        "Orientation force sums:")
+compareNumpyArrays(histogram.force[[2, 5, 7]], numpy.array([1, 1, 1]),
+        "Relative force histogram:")
+test(histogram.steps == 2 and histogram.contacts == 3, "Histogram counts:")
+
+# Random sequential packing without overlaps
+numpy.random.seed(2)
+sb = sphere.sim(np=200, nw=0, sid="test-contacts")
+sb.radius = numpy.random.uniform(0.8, 1.0, 200)
+sb.fixvel = numpy.zeros(200)
+sb.periodicBoundariesXY()
+packing = sb.initRandomPos(numpy.array([6, 6, 8]), verbose=False)
+sb.findOverlaps()
+test(sb.overlaps.size == 0, "Random packing overlaps:")
+test(numpy.all(sb.x[:, 2] - sb.radius >= 0.0) and
+        numpy.all(sb.x[:, 2] + sb.radius <= sb.L[2]), "Random packing walls:")
+compareFloats(numpy.sum(sphere.V_sphere(sb.radius))/numpy.prod(sb.L),
+        packing, "Random packing fraction:")
+
+# Regular and randomized grid packings
+sb = sphere.sim(np=5, nw=0, sid="test-contacts")
+sb.radius = numpy.ones(5)
+sb.initGridPos(numpy.array([2, 2, 8]))
+compareNumpyArrays(numpy.round(sb.x[:, 0]/2.1, 10), numpy.array([0.5, 1.5, 0.5, 1.5, 0.5]),
+        "Grid x positions:")
+compareNumpyArrays(numpy.round(sb.x[:, 2]/2.1, 10), numpy.array([0.5, 0.5, 0.5, 0.5, 1.5]),
+        "Grid z positions:")
+sb.initRandomGridPos(numpy.array([6, 6, 8]))
+sb.findOverlaps()
+test(sb.overlaps.size == 0, "Random grid overlaps:")
+
+# Dense packing by collective rearrangement
+numpy.random.seed(3)
+sb = sphere.sim(np=300, nw=0, sid="test-contacts")
+sb.radius = numpy.random.uniform(0.8, 1.0, 300)
+sb.fixvel = numpy.zeros(300)
+sb.periodicBoundariesXY()
+packing = sb.initDensePos(0.55, numpy.array([5, 5]), tolerance=1e-3,
+        verbose=False)
+i, j, vector = sphere.CellList(sb.x, 2.0, sb.origo, sb.L, 1).pairs(2.0)
+overlap = sb.radius[i] + sb.radius[j] - numpy.sqrt(numpy.sum(vector**2,
+    axis=1))
+test(numpy.all(overlap < 1e-3*(sb.radius[i] + sb.radius[j])),
+        "Dense packing overlaps:")
+compareFloats(0.55, packing, "Dense packing fraction:")
+test(numpy.min(sb.x[:, 2] - sb.radius) >= 0.0 and
+        numpy.max(sb.x[:, 2] + sb.radius) <= sb.L[2] and
+        numpy.all(sb.L/sb.num >= 2.0), "Dense packing world:")
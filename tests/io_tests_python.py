@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+from pytestutils import *
+import sphere
+import os
+
+#### Python input/output tests ####
+print("### Python input/output tests ###")
+
+# Generate data in python
+orig = sphere.sim(np=100, nw=1, sid="test-readmodes", fluid=True)
+orig.generateRadii(histogram=False)
+orig.defaultParams()
+orig.x[:,:] = numpy.random.rand(orig.np[0], orig.nd[0])*0.01
+orig.defineWorldBoundaries(L=[0.01, 0.01, 0.01])
+orig.initFluid()
+orig.initTemporal(current=0.0, total=0.0)
+orig.p_f[:,:,:] = numpy.random.rand(orig.num[0], orig.num[1], orig.num[2])
+orig.v_f[:,:,:,:] = numpy.random.rand(orig.num[0], orig.num[1], orig.num[2], 3)
+orig.vel[:,:] = numpy.random.rand(orig.np[0], orig.nd[0])
+orig.fixvel[:10] = 1.0
+orig.w_x[0] = 0.01
+orig.bond(0, 1)
+orig.bond(2, 3)
+orig.writebin(verbose=False)
+
+# Round trip through writebin and readbin
+py = sphere.sim(fluid=True)
+py.readbin("../input/" + orig.sid + ".bin", verbose=False)
+compareNumpyArrays(orig.x, py.x, "Round trip x:")
+compareNumpyArrays(orig.radius, py.radius, "Round trip radius:")
+compareNumpyArrays(orig.vel, py.vel, "Round trip vel:")
+compareNumpyArrays(orig.fixvel, py.fixvel, "Round trip fixvel:")
+compareNumpyArrays(orig.w_x, py.w_x, "Round trip w_x:")
+compareNumpyArrays(orig.bonds, py.bonds, "Round trip bonds:")
+compareNumpyArrays(orig.v_f, py.v_f, "Round trip v_f:")
+compareNumpyArrays(orig.p_f, py.p_f, "Round trip p_f:")
+compareNumpyArrays(orig.p_f_constant, py.p_f_constant,
+        "Round trip p_f_constant:")
+compareNumpyArrays(orig.color, py.color, "Round trip color:")
+
+# Memory-mapped reading
+mm = sphere.sim(fluid=True)
+mm.readbin("../input/" + orig.sid + ".bin", verbose=False, mmap=True)
+test(isinstance(mm.x, numpy.memmap), "Memory map type:")
+compareNumpyArrays(py.x, mm.x, "Memory map x:")
+compareNumpyArrays(py.radius, mm.radius, "Memory map radius:")
+compareNumpyArrays(py.w_x, mm.w_x, "Memory map w_x:")
+compareNumpyArrays(py.p_f, mm.p_f, "Memory map p_f:")
+compareNumpyArrays(py.v_f, mm.v_f, "Memory map v_f:")
+compareNumpyArrays(py.color, mm.color, "Memory map color:")
+
+# Selective reading
+sel = sphere.sim(fluid=True)
+sel.readbin("../input/" + orig.sid + ".bin", verbose=False,
+        fields=['time_current', 'w_x', 'phi'])
+compareNumpyArrays(py.time_current, sel.time_current,
+        "Selective time_current:")
+compareNumpyArrays(py.w_x, sel.w_x, "Selective w_x:")
+compareNumpyArrays(py.phi, sel.phi, "Selective phi:")
+test(sel.x.shape == (0, 3), "Selective skipping:")
+
+# File size validation before reading
+layout = sphere.binaryLayout(sphere.VERSION, 3, orig.np[0], orig.nw[0],
+        orig.nb0[0], orig.num, True, orig.cfd_solver[0])
+test(sphere.binaryLayoutSize(layout) ==
+        os.path.getsize("../input/" + orig.sid + ".bin"), "Layout size:")
+test(layout is sphere.binaryLayout(sphere.VERSION, 3, orig.np[0],
+    orig.nw[0], orig.nb0[0], orig.num, True, orig.cfd_solver[0]),
+    "Layout cache:")
+fh = open("../input/" + orig.sid + ".bin", "rb")
+contents = fh.read()
+fh.close()
+fh = open("../input/" + orig.sid + ".bin", "wb")
+fh.write(contents[:-8])
+fh.close()
+for kwargs in [{}, {'mmap': True}, {'fields': ['x']}]:
+    try:
+        sphere.sim(fluid=True).readbin("../input/" + orig.sid + ".bin",
+                verbose=False, **kwargs)
+        truncated = False
+    except Exception as e:
+        truncated = 'file size' in str(e)
+    test(truncated, "Truncated file {}:".format(list(kwargs.keys())))
+
+# Particles added one at a time and in batches
+added = sphere.sim(np=0, nw=1, sid="test-readmodes", fluid=True)
+for i in range(orig.np[0] - 10):
+    added.addParticle(orig.x[i], orig.radius[i], vel=orig.vel[i],
+            fixvel=orig.fixvel[i])
+added.addParticles(orig.x[-10:], orig.radius[-10:], vel=orig.vel[-10:],
+        fixvel=orig.fixvel[-10:])
+compareNumpyArrays(orig.x, added.x, "Added particles x:")
+compareNumpyArrays(orig.vel, added.vel, "Added particles vel:")
+test(added.np[0] == orig.np[0] and added.f_sum.shape == orig.f_sum.shape,
+        "Added particles count:")
+added.writebin(verbose=False)
+py = sphere.sim(fluid=True)
+py.readbin("../input/" + added.sid + ".bin", verbose=False)
+compareNumpyArrays(added.radius, py.radius, "Added particles round trip:")
+
+# Remove temporary files
+cleanup(orig)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+from pytestutils import *
+import sphere
+import os
+
+#### Output series index tests ####
+print("### Output series index tests ###")
+
+# Write output files with unequally spaced times
+orig = sphere.sim(np=10, nw=1, sid="test-series")
+orig.defaultParams()
+times = [0.0, 0.1, 0.15, 0.4, 1.0]
+for i in range(len(times) - 1):
+    orig.time_current[0] = times[i]
+    orig.time_step_count[0] = i*10
+    orig.sid = "test-series.output{0:0=5}".format(i)
+    orig.writebin(folder="../output/", verbose=False)
+orig.sid = "test-series"
+
+series = sphere.SimSeries(orig.sid)
+test(len(series) == 4, "Index length:")
+test(os.path.isfile("../output/test-series.index.npz"), "Index sidecar:")
+test(series.step(0.0) == 0, "Step at first time:")
+test(series.step(0.12) == 1, "Nearest step below:")
+test(series.step(0.14) == 2, "Nearest step above:")
+test(series.step(0.4) == 3, "Step at last time:")
+
+# New output files are added to the stored index
+orig.time_current[0] = times[-1]
+orig.sid = "test-series.output00004"
+orig.writebin(folder="../output/", verbose=False)
+orig.sid = "test-series"
+series = sphere.SimSeries(orig.sid, update=False)
+test(len(series) == 4, "Stored index:")
+series.update()
+test(len(series) == 5, "Updated index:")
+test(series.step(0.9) == 4, "Step in new file:")
+
+py = sphere.sim(sid=orig.sid)
+py.readTime(0.16, verbose=False)
+compareFloats(0.15, py.time_current[0], "Read by time:")
+
+# Cached per-step values
+calls = []
+def wallPosition(sb):
+    calls.append(1)
+    return {'w_x': sb.w_x[0], 't': sb.time_current[0]}
+
+values = py.stepSeries('test', wallPosition, fields=['w_x', 'time_current'])
+compareNumpyArrays(values['t'], numpy.array(times), "Step values:")
+test(len(calls) == 5, "Step values read:")
+test(os.path.isfile("../output/test-series.test.cache.npz"), "Step cache:")
+values = py.stepSeries('test', wallPosition, fields=['w_x', 'time_current'])
+compareNumpyArrays(values['t'], numpy.array(times), "Cached step values:")
+test(len(calls) == 5, "Cached step values read:")
+
+# Parallel reduction over the output steps
+def currentTime(sb):
+    return sb.time_current[0]
+
+compareNumpyArrays(py.mapSteps(currentTime, workers=2), numpy.array(times),
+        "Parallel step values:")
+compareNumpyArrays(py.mapSteps(currentTime, 1, 3, workers=1),
+        numpy.array(times[1:4]), "Serial step values:")
+values = py.mapSteps(wallPosition, workers=2, chunksize=2,
+        fields=['w_x', 'time_current'])
+compareNumpyArrays(values['t'], numpy.array(times), "Parallel step dict:")
+
+# Streaming iteration reusing the arrays of the object
+py = sphere.sim(sid=orig.sid)
+steps = py.iterSteps(stride=2)
+first = next(steps)
+x = first.x
+test(first.time_current[0] == times[0], "Iterated step:")
+compareFloats(times[2], next(steps).time_current[0], "Iterated stride:")
+test(py.x is x and len(list(steps)) == 1, "Reused arrays:")
+compareNumpyArrays(numpy.array([sb.time_current[0]
+    for sb in py.iterSteps(prefetch=2)]), numpy.array(times),
+    "Prefetched steps:")
+compareNumpyArrays(numpy.array([sb.time_current[0]
+    for sb in py.iterSteps(prefetch=0)]), numpy.array(times),
+    "Steps without prefetching:")
+
+# Export of the particle values of all steps
+folder = py.exportSeries(format='npy', fields=['x', 'radius'], rows=25,
+        verbose=False)
+x = numpy.load(folder + "/x.00000.npy")
+step = numpy.load(folder + "/step.00000.npy")
+test(x.shape == (30, 3) and len(step) == 30, "Exported shard:")
+test(os.path.isfile(folder + "/radius.00001.npy"), "Exported shards:")
+compareNumpyArrays(x[step == 2], orig.x, "Exported values:")
+
+# Remove temporary files
+cleanup(orig)